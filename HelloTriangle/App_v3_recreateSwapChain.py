@@ -6,6 +6,33 @@ vulkan app to draw a 3D image
 Amended on: 2017-10-21
 Amendments: 1. Corrected py-sdl2 implementation of a resizable window.
             2. Require class VulkanApp to have the d"debug" keyword.  
+            3. Optional frame pacing of the main loop to a target frame rate.
+            4. Optional on-demand rendering: frames are only drawn when the
+               image is invalidated.
+            5. Window size changes are passed to the swapchain's resize
+               controller instead of recreating the swapchain immediately.
+            6. Moving the window to another display invalidates the cached
+               surface info and recreates the swapchain.
+            7. Presentation profile can be chosen on the command line and
+               switched at runtime with the P key.
+            8. Optional adaptive swapchain image count.
+            9. The on-disk pipeline cache can be disabled on the command line.
+           10. The R key rebuilds the graphics pipeline in the background.
+           11. The C key cycles the cull mode, i.e. switches between graphics
+               pipeline variants.
+           12. --build-shaders compiles changed GLSL shaders at startup.
+           13. --watch-shaders reloads changed shaders while running.
+           14. The V key toggles the vertex colours, a specialization
+               constant of the vertex shader.
+           15. --optimize-shaders optimises the shaders with spirv-opt.
+           16. --record-threads records the draws into secondary command
+               buffers on a pool of threads.
+           17. --dynamic-scene records the command buffer of every frame
+               anew.
+           18. The binds elided by sorting the draws are logged on exit;
+               --no-sort-draws records the draws in their given order.
+           19. --instances draws a grid of instances of the triangle with
+               one instanced draw call.
 
 """
 __author__ = 'sunbearc22'
@@ -13,12 +40,15 @@ __version__ = "0.1.0"
 __license__ = "MIT"
 
 # Python3 modules
+import argparse
 import logging
 import ctypes
 import sys
+import time
 
 # API
-from vulkan import vkDeviceWaitIdle
+from vulkan import vkDeviceWaitIdle, VK_CULL_MODE_BACK_BIT, \
+     VK_CULL_MODE_NONE, VK_CULL_MODE_FRONT_BIT, VK_SHADER_STAGE_VERTEX_BIT
 import sdl2
 import sdl2.ext
 
@@ -26,6 +56,9 @@ import sdl2.ext
 # Application Modules
 import sdl2window_v3_recreateSwapChain as sw
 import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+import framepacing as fp
+import surfaceinfo as si
+import instancing as inst
 
 ###############################################################################
 # Global variables
@@ -35,6 +68,8 @@ WIDTH = 600
 HEIGHT = 400
 #FLAGS = sdl2.SDL_WINDOW_RESIZABLE | sdl2.SDL_WINDOW_HIDDEN
 FLAGS = sdl2.SDL_WINDOW_RESIZABLE
+SHADER_WATCH_MS = 250
+CULL_MODES = [VK_CULL_MODE_BACK_BIT, VK_CULL_MODE_NONE, VK_CULL_MODE_FRONT_BIT]
 
 LOGFORMAT = '%(asctime)s [%(process)d] %(name)s %(module)s.%(funcName)-33s'\
             '+%(lineno)-5s: %(levelname)-8s %(message)s'
@@ -44,9 +79,35 @@ logging.basicConfig(level=logging.DEBUG, format=LOGFORMAT)
 
 class VulkanApp(object):
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, max_frames_in_flight=2, target_fps=None,
+                 pacing='hybrid', on_demand=False, resize_quiet_period=0.1,
+                 present_profile='low_latency', adaptive_image_count=False,
+                 use_pipeline_cache=True, build_shaders=False,
+                 watch_shaders=False, optimize_shaders=False,
+                 record_threads=0, dynamic_scene=False, sort_draws=True,
+                 instances=0):
         self.debug = debug
+        self.use_pipeline_cache = use_pipeline_cache
+        self.build_shaders = build_shaders
+        self.watch_shaders = watch_shaders
+        self.optimize_shaders = optimize_shaders
+        self.record_threads = record_threads
+        self.dynamic_scene = dynamic_scene
+        self.sort_draws = sort_draws
+        self.instances = instances
+        self.present_profile = present_profile
+        self.adaptive_image_count = adaptive_image_count
+        self.max_frames_in_flight = max_frames_in_flight
+        self.resize_quiet_period = resize_quiet_period
+        self.on_demand = on_demand
+        self.redraw_needed = True
+        self.redraw_event_type = None
+        self.vertex_colors = True
         self.vulkan_window = None
+        self.frame_pacer = None
+        if target_fps:
+            self.frame_pacer = fp.FramePacer(target_fps=target_fps,
+                                             policy=pacing)
         
         self._initWindow()
         self._initVulkan();
@@ -55,10 +116,84 @@ class VulkanApp(object):
     def _initWindow(self):
         self.vulkan_window = sw.SetWindow(title=TITLE, w=WIDTH, h=HEIGHT,
                                           flags=FLAGS)
+        # A user event lets request_redraw() wake up SDL_WaitEvent.
+        event_type = sdl2.SDL_RegisterEvents(1)
+        if event_type != 0xFFFFFFFF:
+            self.redraw_event_type = event_type
 
     def _initVulkan(self):
-        self.vulkan_base = vb.Setup(self.vulkan_window, debug=self.debug)
+        self.vulkan_base = vb.Setup(
+            self.vulkan_window, debug=self.debug,
+            max_frames_in_flight=self.max_frames_in_flight,
+            resize_quiet_period=self.resize_quiet_period,
+            present_profile=self.present_profile,
+            adaptive_image_count=self.adaptive_image_count,
+            use_pipeline_cache=self.use_pipeline_cache,
+            build_shaders=self.build_shaders,
+            watch_shaders=self.watch_shaders,
+            optimize_shaders=self.optimize_shaders,
+            record_threads=self.record_threads,
+            dynamic_scene=self.dynamic_scene,
+            sort_draws=self.sort_draws)
         print("self.vulkan_base =", self.vulkan_base)
+        if self.instances:
+            try:
+                self.vulkan_base.setInstances(inst.grid(self.instances))
+            except ValueError as e:
+                logging.warning('Instances are not drawn: {}'.format(e))
+
+    def setPresentProfile(self, profile):
+        '''Switch the presentation profile, see surfaceinfo.PRESENT_PROFILES.'''
+        self.vulkan_base.setPresentProfile(profile)
+        self.present_profile = profile
+        self.request_redraw()
+
+    def _nextPresentProfile(self):
+        '''Switch to the next presentation profile, in alphabetical order.'''
+        profiles = sorted(si.PRESENT_PROFILES)
+        i = profiles.index(self.present_profile)
+        self.setPresentProfile(profiles[(i + 1) % len(profiles)])
+
+    def rebuildPipeline(self):
+        '''Rebuild the graphics pipeline on a background thread. The frame
+           loop keeps drawing with the current pipeline until it is ready.'''
+        self._requestPipeline(rebuild=True)
+
+    def _nextCullMode(self):
+        '''Switch the graphics pipeline to the next cull mode of CULL_MODES.'''
+        i = CULL_MODES.index(self.vulkan_base.pipeline_key.cull_mode)
+        self._requestPipeline(cull_mode=CULL_MODES[(i + 1) % len(CULL_MODES)])
+
+    def _toggleVertexColors(self):
+        '''Switch the graphics pipeline to the variant with the vertex
+           shader's VERTEX_COLORS specialization constant toggled.'''
+        try:
+            self._requestPipeline(specialization={
+                VK_SHADER_STAGE_VERTEX_BIT: {
+                    'VERTEX_COLORS': not self.vertex_colors}})
+        except ValueError as e:
+            logging.warning('{} Rebuild vert.spv from shader.vert, e.g. with '
+                            '--build-shaders.'.format(e))
+            return
+        self.vertex_colors = not self.vertex_colors
+
+    def _requestPipeline(self, **kwargs):
+        future = self.vulkan_base.requestGraphicsPipeline(**kwargs)
+        # In on-demand mode, wake up the main loop to swap it in.
+        future.add_done_callback(lambda f: self.request_redraw())
+
+    def request_redraw(self):
+        '''Ask for a new frame, e.g. after the scene has changed.
+
+        Notes:
+        - Only needed in on-demand mode; otherwise every loop draws a frame.
+        - Safe to call from other threads: SDL_PushEvent is thread-safe and
+          wakes up the main loop if it is blocked in SDL_WaitEvent.'''
+        self.redraw_needed = True
+        if self.on_demand and self.redraw_event_type is not None:
+            event = sdl2.SDL_Event()
+            event.type = self.redraw_event_type
+            sdl2.SDL_PushEvent(ctypes.byref(event))
 
     def _mainLoop(self):
         # Main loop
@@ -68,6 +203,23 @@ class VulkanApp(object):
         #sdl2.SDL_ShowWindow(self.vulkan_window)
 
         while running:
+            # On-demand mode: when the presented image is still valid, block
+            # until an event arrives instead of polling in a busy loop.
+            # Passing None leaves the event in the queue for SDL_PollEvent.
+            # While a swapchain recreation is being debounced, wake up when it
+            # becomes due. While shaders are watched, wake up to look for
+            # changed shaders every SHADER_WATCH_MS.
+            if self.on_demand:
+                resize_delay = \
+                    self.vulkan_base.resize_controller.timeUntilDue()
+                if not self.redraw_needed and self.watch_shaders:
+                    sdl2.SDL_WaitEventTimeout(None, SHADER_WATCH_MS)
+                elif not self.redraw_needed:
+                    sdl2.SDL_WaitEvent(None)
+                elif resize_delay:
+                    sdl2.SDL_WaitEventTimeout(
+                        None, int(1000. * resize_delay) + 1)
+
             # Poll sdl2 window for currently pending events.
             while sdl2.SDL_PollEvent(ctypes.byref(event)) != 0:        
             
@@ -76,15 +228,78 @@ class VulkanApp(object):
                    running = False
                    break
 
+               if event.type == self.redraw_event_type:
+                   self.redraw_needed = True
+
+               if event.type == sdl2.SDL_KEYDOWN:
+                   if event.key.keysym.sym == sdl2.SDLK_p:
+                       self._nextPresentProfile()
+                   if event.key.keysym.sym == sdl2.SDLK_r:
+                       self.rebuildPipeline()
+                   if event.key.keysym.sym == sdl2.SDLK_c:
+                       self._nextCullMode()
+                   if event.key.keysym.sym == sdl2.SDLK_v:
+                       self._toggleVertexColors()
+
                if event.type == sdl2.SDL_WINDOWEVENT:
+                   if event.window.event == sdl2.SDL_WINDOWEVENT_EXPOSED:
+                       self.redraw_needed = True
                    if event.window.event == sdl2.SDL_WINDOWEVENT_SIZE_CHANGED:
-                       newWidth, newHeight = self.vulkan_window.getWindowSize()
-                       self.vulkan_base._recreateSwapChain()
-                       break
+                       # Coalesced with all other resize signals; the
+                       # swapchain is recreated by _drawFrame when due.
+                       self.vulkan_base.resize_controller.notify('window')
+                       self.redraw_needed = True
+                   # SDL_WINDOWEVENT_DISPLAY_CHANGED needs SDL >= 2.0.18.
+                   if event.window.event == getattr(
+                           sdl2, 'SDL_WINDOWEVENT_DISPLAY_CHANGED', None):
+                       self.vulkan_base.surface_info.invalidate()
+                       self.vulkan_base.resize_controller.notify('display')
+                       self.redraw_needed = True
+
+            if not running:
+                break
+
+            # Rebuild the pipelines of changed shaders in the background.
+            future = self.vulkan_base.reloadChangedShaders()
+            if future:
+                future.add_done_callback(lambda f: self.request_redraw())
+
+            if self.on_demand and not self.redraw_needed:
+                continue
+            self.redraw_needed = False
+
+            # Wait for the start of the next frame, if frames are paced.
+            if self.frame_pacer:
+                self.frame_pacer.wait()
 
             # Renderer: Present Vulkan images onto sdl2 window.
-            self.vulkan_base._drawFrame() 
+            t0 = time.perf_counter()
+            if not self.vulkan_base._drawFrame():
+                # Skipped, e.g. while a resize is debounced: try again.
+                self.redraw_needed = True
+            if self.frame_pacer:
+                self.frame_pacer.frameDrawn(time.perf_counter() - t0)
 
+        if self.frame_pacer:
+            logging.info(self.frame_pacer.report())
+        logging.info('Swapchain resizes: {}'.format(
+            self.vulkan_base.resize_controller.stats()))
+        logging.info('Swapchain metrics: {}'.format(
+            self.vulkan_base.swapchainMetrics()))
+        logging.info('Pipeline compiler: {}'.format(
+            self.vulkan_base.pipeline_compiler.stats()))
+        logging.info('Pipeline library: {}'.format(
+            self.vulkan_base.pipeline_library.stats()))
+        report = self.vulkan_base.pipelineCreationReport()
+        logging.info('Pipeline creation ({0}): {1:.3f} ms, {2} cache hits, '
+                     '{3} misses.'.format(report['source'],
+                                          report['total_ms'],
+                                          report['cache_hits'],
+                                          report['cache_misses']))
+        for p in report['pipelines']:
+            logging.info('  {0}: {1} ms, cache hit {2}, stages {3}'.format(
+                p['name'], p['duration_ms'], p['cache_hit'], p['stages']))
+        logging.info('Draws: {}'.format(self.vulkan_base.drawStats()))
 
         vkDeviceWaitIdle( self.vulkan_base.logical_device )
         logging.info('Checked all outstanding queue operations for all'
@@ -93,7 +308,51 @@ class VulkanApp(object):
 
 
 def main():
-    app = VulkanApp(debug=True)
+    parser = argparse.ArgumentParser(description=TITLE)
+    parser.add_argument('--frames-in-flight', type=int, default=2)
+    parser.add_argument('--fps', type=float, default=None,
+                        help='pace the main loop to this frame rate')
+    parser.add_argument('--pacing', choices=fp.POLICIES, default='hybrid')
+    parser.add_argument('--on-demand', action='store_true',
+                        help='only draw when the image is invalidated')
+    parser.add_argument('--present-profile', choices=sorted(si.PRESENT_PROFILES),
+                        default='low_latency')
+    parser.add_argument('--adaptive-image-count', action='store_true',
+                        help='size the swapchain from acquire wait times')
+    parser.add_argument('--no-pipeline-cache', action='store_true',
+                        help='do not load or save the on-disk pipeline cache')
+    parser.add_argument('--build-shaders', action='store_true',
+                        help='compile changed GLSL shaders to SPIR-V first')
+    parser.add_argument('--watch-shaders', action='store_true',
+                        help='reload shaders when their files change')
+    parser.add_argument('--optimize-shaders', action='store_true',
+                        help='optimise the SPIR-V shaders with spirv-opt')
+    parser.add_argument('--record-threads', type=int, default=0,
+                        help='record secondary command buffers on this many '
+                             'threads')
+    parser.add_argument('--dynamic-scene', action='store_true',
+                        help='record the command buffer of every frame anew')
+    parser.add_argument('--no-sort-draws', action='store_true',
+                        help='record the draws in order, without sorting '
+                             'them by state')
+    parser.add_argument('--instances', type=int, default=0,
+                        help='draw a grid of this many instances of the '
+                             'triangle')
+    args = parser.parse_args()
+
+    app = VulkanApp(debug=True, max_frames_in_flight=args.frames_in_flight,
+                    target_fps=args.fps, pacing=args.pacing,
+                    on_demand=args.on_demand,
+                    present_profile=args.present_profile,
+                    adaptive_image_count=args.adaptive_image_count,
+                    use_pipeline_cache=not args.no_pipeline_cache,
+                    build_shaders=args.build_shaders,
+                    watch_shaders=args.watch_shaders,
+                    optimize_shaders=args.optimize_shaders,
+                    record_threads=args.record_threads,
+                    dynamic_scene=args.dynamic_scene,
+                    sort_draws=not args.no_sort_draws,
+                    instances=args.instances)
     app.vulkan_base.cleanup1()
     app.vulkan_window.destroy()
     
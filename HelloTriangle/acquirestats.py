@@ -0,0 +1,136 @@
+#!/bin/env python3
+
+''' Measure how long vkAcquireNextImageKHR blocks, and suggest when the
+swapchain should have more or fewer images.
+
+Class & Functions:
+- AcquireWaitTuner
+  - record
+  - decision
+  - changed
+  - reset
+  - stats
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import collections
+import time
+
+
+class AcquireWaitTuner:
+    """ Class to collect acquire-wait times and decide on image count changes.
+
+    Input Parameters:
+     window       - number of frames per decision.
+     grow_above   - mean acquire wait (seconds) above which one more image
+                    is suggested.
+     shrink_below - longest acquire wait (seconds) below which one image
+                    fewer is suggested, i.e. acquire never really waited.
+     cooldown     - number of windows after a change, see changed(), in
+                    which no change is suggested.
+
+    Notes:
+    - A long wait in acquire means every image is still queued for
+      presentation or being drawn, so the CPU stalls. One more image lets
+      it run further ahead.
+    - With vsync, i.e. a FIFO present mode, acquire blocks for about one
+      refresh period whatever the image count, once frames keep up with the
+      display. More images then only add latency, so growing is suggested
+      only while the frame rate is below the refresh rate.
+    - If acquire never waits over a whole window, an image is sitting idle
+      and its memory can be given back.
+    - The cooldown keeps the count from flapping between grow and shrink.
+    - Samples are cleared after every decision and on reset(), e.g. after
+      the swapchain is recreated, so each decision is made on one swapchain.
+    """
+
+    def __init__(self, window=120, grow_above=0.002, shrink_below=0.0001,
+                 cooldown=3):
+        self.window = window
+        self.grow_above = grow_above
+        self.shrink_below = shrink_below
+        self.cooldown = cooldown
+        self.cooldown_left = 0
+        self.samples = collections.deque(maxlen=window)
+        self.times = collections.deque(maxlen=window) # perf_counter()
+        self.total_samples = 0
+        self.total_wait = 0.
+        self.grown = 0
+        self.shrunk = 0
+        self.last_stats = None
+
+
+    def record(self, wait, now=None):
+        '''Record an acquire that blocked for wait seconds, at the time now,
+           by default time.perf_counter().'''
+        self.samples.append(wait)
+        self.times.append(time.perf_counter() if now is None else now)
+        self.total_samples += 1
+        self.total_wait += wait
+
+
+    def decision(self, vsync=False, refresh_rate=0.):
+        '''Return +1 to grow the image count, -1 to shrink it, or 0.
+
+        vsync is True for a FIFO present mode, and refresh_rate the refresh
+        rate of the display in Hz, or 0 if unknown: then the count is only
+        grown while the frame rate is below 95% of the refresh rate.'''
+        if len(self.samples) < self.window:
+            return 0
+        self.last_stats = self._windowStats()
+        self.reset()
+        if self.cooldown_left:
+            self.cooldown_left -= 1
+            return 0
+        if self.last_stats['mean_ms'] > 1000. * self.grow_above and \
+           (not vsync or self.last_stats['fps'] < 0.95 * refresh_rate):
+            return 1
+        if self.last_stats['max_ms'] < 1000. * self.shrink_below:
+            return -1
+        return 0
+
+
+    def changed(self, delta):
+        '''Count a change of the image count by delta, and start the
+           cooldown.'''
+        if delta > 0:
+            self.grown += 1
+        else:
+            self.shrunk += 1
+        self.cooldown_left = self.cooldown
+
+
+    def reset(self):
+        '''Drop the samples of the current window.'''
+        self.samples.clear()
+        self.times.clear()
+
+
+    def _windowStats(self):
+        waits = sorted(self.samples)
+        n = len(waits)
+        if not n:
+            return {'mean_ms': 0., 'p95_ms': 0., 'max_ms': 0., 'fps': 0.}
+        span = self.times[-1] - self.times[0]
+        return {'mean_ms': 1000. * sum(waits) / n,
+                'p95_ms': 1000. * waits[min(n - 1, int(0.95 * n))],
+                'max_ms': 1000. * waits[-1],
+                'fps': (n - 1) / span if span > 0 else 0.}
+
+
+    def stats(self):
+        '''Return the acquire-wait statistics of the current window (or the
+           last full window, if the current one is empty) and the totals.'''
+        window = self._windowStats() if self.samples or \
+                 self.last_stats is None else self.last_stats
+        result = dict(window)
+        result.update({
+            'samples': self.total_samples,
+            'total_mean_ms': 1000. * self.total_wait / self.total_samples
+                             if self.total_samples else 0.,
+            'grown': self.grown,
+            'shrunk': self.shrunk})
+        return result
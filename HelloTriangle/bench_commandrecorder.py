@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+
+''' Benchmark the time to record the command buffers of a scene with many
+draws, inline on one thread and into secondary command buffers on 1 to 8
+threads.
+
+Usage: python3 bench_commandrecorder.py [draws] [repeats]
+
+Notes:
+- The scene draws the triangle the given number of times (default 10000)
+  per framebuffer. "threads 0" records it inline into the primary command
+  buffers, as Setup does without record_threads.
+- Each repeat records the command buffers of every swapchain image again,
+  i.e. what Setup does after a resize or a pipeline swap.
+- Python holds the GIL between Vulkan calls, so the speed-up depends on how
+  much of the recording time the driver spends.
+- See benchtools.py for running this headless on lavapipe.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import sys
+import time
+
+# API
+from vulkan import vkDeviceWaitIdle
+
+# Application Modules
+import benchtools as bt
+import commandrecorder as cr
+import drawbatcher as db
+import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+
+
+def main():
+    draws = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    bt.quietLogging()
+    window = bt.createWindow('bench - command recorder')
+    setup = vb.Setup(window)
+    vkDeviceWaitIdle(setup.logical_device)
+    setup.draws = [db.drawItem((3, 1, 0, 0))] * draws
+
+    print('{0:>8} {1:>10} {2:>10} {3:>9}'.format(
+        'threads', 'mean_ms', 'min_ms', 'speedup'))
+    baseline = None
+    for threads in (0, 1, 2, 4, 8):
+        if threads:
+            setup.command_recorder = cr.CommandRecorder(
+                setup.logical_device, setup.queue_families_graphics_index,
+                threads)
+        times = []
+        for i in range(repeats):
+            for destroy in setup._detachCommandBuffers():
+                destroy()
+            start = time.perf_counter()
+            setup._createCommandBuffer()
+            times.append(time.perf_counter() - start)
+        for destroy in setup._detachCommandBuffers():
+            destroy()
+        if setup.command_recorder:
+            setup.command_recorder.destroy()
+            setup.command_recorder = None
+        setup._createCommandBuffer()
+
+        mean = sum(times) / len(times)
+        baseline = baseline if baseline else mean
+        print('{0:>8} {1:>10.2f} {2:>10.2f} {3:>9.2f}'.format(
+            threads, 1000. * mean, 1000. * min(times), baseline / mean))
+
+    setup.cleanup1()
+    window.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+''' Benchmark the time to record the command buffers of a scene whose draws
+alternate between graphics pipelines, in their given order and sorted by
+state.
+
+Usage: python3 bench_drawbatcher.py [draws] [repeats]
+
+Notes:
+- The scene draws the triangle the given number of times (default 10000),
+  cycling through the pipeline variants of CULL_MODES, i.e. every draw
+  needs another pipeline than the one before it.
+- "binds" and "elided" are those of the command buffer of one swapchain
+  image, see drawbatcher.DrawBatcher.stats.
+- See benchtools.py for running this headless on lavapipe.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import sys
+import time
+
+# API
+from vulkan import vkDeviceWaitIdle, VK_CULL_MODE_BACK_BIT, \
+     VK_CULL_MODE_NONE, VK_CULL_MODE_FRONT_BIT
+
+# Application Modules
+import benchtools as bt
+import drawbatcher as db
+import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+
+CULL_MODES = (VK_CULL_MODE_NONE, VK_CULL_MODE_BACK_BIT,
+              VK_CULL_MODE_FRONT_BIT)
+
+
+def main():
+    draws = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    bt.quietLogging()
+    window = bt.createWindow('bench - draw batcher')
+    setup = vb.Setup(window)
+    vkDeviceWaitIdle(setup.logical_device)
+    pipelines = [setup.pipeline_library.get(setup._pipelineKey(cull_mode=c))
+                 for c in CULL_MODES]
+    setup.draws = [db.drawItem((3, 1, 0, 0),
+                               pipeline=pipelines[i % len(pipelines)])
+                   for i in range(draws)]
+
+    print('{0:>8} {1:>10} {2:>10} {3:>8} {4:>8} {5:>9}'.format(
+        'draws', 'mean_ms', 'min_ms', 'binds', 'elided', 'speedup'))
+    baseline = None
+    for name, sort_draws in (('given', False), ('sorted', True)):
+        setup.sort_draws = sort_draws
+        times = []
+        for i in range(repeats):
+            for destroy in setup._detachCommandBuffers():
+                destroy()
+            start = time.perf_counter()
+            setup._createCommandBuffer()
+            times.append(time.perf_counter() - start)
+        last = setup.drawStats()['last']
+
+        mean = sum(times) / len(times)
+        baseline = baseline if baseline else mean
+        print('{0:>8} {1:>10.2f} {2:>10.2f} {3:>8} {4:>8} {5:>9.2f}'.format(
+            name, 1000. * mean, 1000. * min(times), last['binds'],
+            last['elided'], baseline / mean))
+
+    setup.cleanup1()
+    window.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
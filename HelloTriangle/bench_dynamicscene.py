@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+
+''' Benchmark the frames/sec of a static scene, whose command buffers are
+recorded once, against the dynamic-scene mode, which records the command
+buffer of every frame anew.
+
+Usage: python3 bench_dynamicscene.py [draws] [seconds_per_run]
+
+Notes:
+- The scene draws the triangle the given number of times (default 1000).
+- The dynamic-scene mode resets a transient command pool per frame in
+  flight and records one command buffer, so its cost over the static scene
+  is the recording of the draws.
+- See benchtools.py for running this headless on lavapipe.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import sys
+
+# API
+from vulkan import vkDeviceWaitIdle
+
+# Application Modules
+import benchtools as bt
+import drawbatcher as db
+import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+
+
+def main():
+    draws = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    bt.quietLogging()
+    window = bt.createWindow('bench - dynamic scene')
+
+    print('{0:>8} {1:>10} {2:>10} {3:>10}'.format(
+        'scene', 'fps', 'mean_ms', 'p99_ms'))
+    for name, dynamic_scene in (('static', False), ('dynamic', True)):
+        setup = vb.Setup(window, dynamic_scene=dynamic_scene)
+        setup.draws = [db.drawItem((3, 1, 0, 0))] * draws
+        if not dynamic_scene:
+            # Record the static command buffers with the draws.
+            vkDeviceWaitIdle(setup.logical_device)
+            for destroy in setup._detachCommandBuffers():
+                destroy()
+            setup._createCommandBuffer()
+        result = bt.summary(bt.runFrames(setup._drawFrame, seconds))
+        setup.cleanup1()
+        print('{0:>8} {1:>10.1f} {2:>10.3f} {3:>10.3f}'.format(
+            name, result['fps'], result['mean_ms'], result['p99_ms']))
+
+    window.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
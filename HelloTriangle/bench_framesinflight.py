@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+
+''' Benchmark the frames/sec of Setup._drawFrame with 1, 2 and 3 frames in
+flight.
+
+Usage: python3 bench_framesinflight.py [seconds_per_run]
+
+Notes:
+- With 1 frame in flight the CPU waits for every frame to finish on the GPU
+  before it submits the next one, which is how the v3 example behaved when it
+  idled the present queue after every frame.
+- See benchtools.py for running this headless on lavapipe.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import sys
+
+# Application Modules
+import benchtools as bt
+import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    bt.quietLogging()
+    window = bt.createWindow('bench - frames in flight')
+
+    print('{0:>16} {1:>10} {2:>10} {3:>10}'.format(
+        'frames_in_flight', 'fps', 'mean_ms', 'p99_ms'))
+    for n in (1, 2, 3):
+        setup = vb.Setup(window, max_frames_in_flight=n)
+        result = bt.summary(bt.runFrames(setup._drawFrame, seconds))
+        setup.cleanup1()
+        print('{0:>16} {1:>10.1f} {2:>10.3f} {3:>10.3f}'.format(
+            n, result['fps'], result['mean_ms'], result['p99_ms']))
+
+    window.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
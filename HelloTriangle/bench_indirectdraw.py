@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+''' Benchmark the time to record, and draw, a scene of many draws as one
+vkCmdDraw call per draw, and as indirect draws written from a NumPy array.
+
+Usage: python3 bench_indirectdraw.py [draws] [seconds_per_run]
+
+Notes:
+- The scene draws the triangle the given number of times (default 10000).
+- "record_ms" is the time to record the command buffers of every swapchain
+  image, "write_ms" the time of setIndirectDraws, which includes waiting for
+  the device to be idle.
+- See benchtools.py for running this headless on lavapipe.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import sys
+import time
+
+# API
+from vulkan import vkDeviceWaitIdle
+
+# Application Modules
+import benchtools as bt
+import drawbatcher as db
+import indirectdraw as ind
+import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+
+
+def recordTime(setup):
+    '''Return the seconds to record the command buffers again.'''
+    vkDeviceWaitIdle(setup.logical_device)
+    for destroy in setup._detachCommandBuffers():
+        destroy()
+    start = time.perf_counter()
+    setup._createCommandBuffer()
+    return time.perf_counter() - start
+
+
+def main():
+    draws = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    bt.quietLogging()
+    window = bt.createWindow('bench - indirect draw')
+
+    print('{0:>9} {1:>10} {2:>10} {3:>10} {4:>10}'.format(
+        'draws', 'record_ms', 'write_ms', 'fps', 'mean_ms'))
+    for name in ('direct', 'indirect'):
+        setup = vb.Setup(window)
+        write = 0.
+        if name == 'direct':
+            setup.draws = [db.drawItem((3, 1, 0, 0))] * draws
+        else:
+            setup.draws = []
+            commands = ind.commands(draws)
+            commands['vertexCount'] = 3
+            commands['instanceCount'] = 1
+            start = time.perf_counter()
+            setup.setIndirectDraws(commands)
+            write = time.perf_counter() - start
+        record = recordTime(setup)
+        result = bt.summary(bt.runFrames(setup._drawFrame, seconds))
+        setup.cleanup1()
+        print('{0:>9} {1:>10.2f} {2:>10.2f} {3:>10.1f} {4:>10.3f}'.format(
+            name, 1000. * record, 1000. * write, result['fps'],
+            result['mean_ms']))
+
+    window.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
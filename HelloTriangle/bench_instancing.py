@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+
+''' Benchmark the instances/sec of one instanced draw, against the instance
+count, from 1 to a million triangles.
+
+Usage: python3 bench_instancing.py [seconds_per_run] [max_instances]
+
+Notes:
+- Each run draws only the instances, a grid of instancing.grid, for the
+  given number of seconds (default 3).
+- See benchtools.py for running this headless on lavapipe, though a
+  software rasterizer is fill-rate bound long before a GPU.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import sys
+
+# Application Modules
+import benchtools as bt
+import instancing as inst
+import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    max_instances = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    bt.quietLogging()
+    window = bt.createWindow('bench - instancing')
+    setup = vb.Setup(window)
+    setup.draws = []
+
+    print('{0:>10} {1:>10} {2:>10} {3:>10} {4:>14}'.format(
+        'instances', 'fps', 'mean_ms', 'p99_ms', 'instances/s'))
+    count = 1
+    while count <= max_instances:
+        try:
+            setup.setInstances(inst.grid(count))
+        except ValueError as e:
+            print(e)
+            break
+        result = bt.summary(bt.runFrames(setup._drawFrame, seconds))
+        print('{0:>10} {1:>10.1f} {2:>10.3f} {3:>10.3f} {4:>14.0f}'.format(
+            count, result['fps'], result['mean_ms'], result['p99_ms'],
+            count * result['fps']))
+        count *= 10
+
+    setup.cleanup1()
+    window.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
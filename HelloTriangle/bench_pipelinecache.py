@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+
+''' Benchmark graphics pipeline creation on a cold and a warm pipeline cache.
+
+Usage: python3 bench_pipelinecache.py [runs]
+
+Notes:
+- "none" creates the pipeline without a VkPipelineCache. "cold" starts from
+  an empty cache directory, and saves the cache on cleanup. "warm" loads the
+  cache saved by the previous run.
+- Each run creates a new Setup, so startup_ms is the whole Vulkan setup and
+  pipeline_ms only vkCreateGraphicsPipelines.
+- cache_hit is the driver's VK_EXT_pipeline_creation_feedback report for
+  the pipeline, or "-" if the device does not have the extension.
+- Mesa drivers keep their own on-disk shader cache, which hides most of the
+  difference. Disable it with MESA_SHADER_CACHE_DISABLE=true (or
+  MESA_GLSL_CACHE_DISABLE=true on older Mesa) to measure this cache alone.
+- See benchtools.py for running this headless on lavapipe.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import shutil
+import sys
+import tempfile
+import time
+
+# Application Modules
+import benchtools as bt
+import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+
+
+def run(window, use_pipeline_cache, cache_dir):
+    start = time.perf_counter()
+    setup = vb.Setup(window, use_pipeline_cache=use_pipeline_cache,
+                     pipeline_cache_dir=cache_dir)
+    startup = time.perf_counter() - start
+    loaded = setup.pipeline_cache.loaded_size if setup.pipeline_cache else 0
+    pipeline = setup.pipeline_create_time
+    hit = setup.pipelineCreationReport()['pipelines'][0]['cache_hit']
+    setup.cleanup1()
+    return {'startup_ms': 1000. * startup,
+            'pipeline_ms': 1000. * pipeline,
+            'loaded_bytes': loaded,
+            'cache_hit': hit}
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    bt.quietLogging()
+    window = bt.createWindow('bench - pipeline cache')
+
+    results = {'none': [], 'cold': [], 'warm': []}
+    for i in range(runs):
+        cache_dir = tempfile.mkdtemp(prefix='bench_pipelinecache')
+        try:
+            results['none'].append(run(window, False, cache_dir))
+            results['cold'].append(run(window, True, cache_dir))
+            results['warm'].append(run(window, True, cache_dir))
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print('{0:>6} {1:>12} {2:>12} {3:>13} {4:>10}'.format(
+        'cache', 'startup_ms', 'pipeline_ms', 'loaded_bytes', 'cache_hit'))
+    for name in ('none', 'cold', 'warm'):
+        r = results[name]
+        hits = [x['cache_hit'] for x in r]
+        print('{0:>6} {1:>12.3f} {2:>12.3f} {3:>13} {4:>10}'.format(
+            name, sum(x['startup_ms'] for x in r) / len(r),
+            sum(x['pipeline_ms'] for x in r) / len(r),
+            r[-1]['loaded_bytes'],
+            '-' if None in hits else '{0}/{1}'.format(hits.count(True),
+                                                      len(hits))))
+
+    window.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+
+''' Benchmark swapchain recreation during a scripted storm of window resizes.
+
+Usage: python3 bench_resizestorm.py [seconds_per_run]
+
+Notes:
+- The window is resized several times per frame in bursts that mimic an
+  interactive drag, separated by short pauses.
+- "immediate" recreates the swapchain on every SDL_WINDOWEVENT_SIZE_CHANGED,
+  as the v3 example originally did. "coalesced" recreates at most once per
+  frame, and "debounced" also waits for a quiet period of 0.1 s.
+- "+idle" modes idle the device before every recreation; "+deferred" modes
+  pass the old swapchain as oldSwapchain and retire it instead. Compare their
+  max_frame_ms, the worst-case frame time during the storm.
+- Stall time is the total time spent recreating the swapchain.
+- See benchtools.py for running this headless on lavapipe.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import sys
+import time
+
+# API
+import sdl2
+
+# Application Modules
+import benchtools as bt
+import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+
+SIZES = [(600, 400), (640, 420), (680, 450), (720, 480), (680, 450),
+         (640, 420)]
+RESIZES_PER_FRAME = 3
+BURST = 0.5  # seconds of dragging
+PAUSE = 0.25 # seconds without resizing
+
+
+MODES = [('immediate+idle', 'immediate', False),
+         ('coalesced+idle', 'coalesced', False),
+         ('coalesced+deferred', 'coalesced', True),
+         ('debounced+deferred', 'debounced', True)]
+
+
+def run(window, mode, deferred, seconds):
+    quiet_period = 0.1 if mode == 'debounced' else 0.
+    setup = vb.Setup(window, resize_quiet_period=quiet_period,
+                     deferred_retirement=deferred)
+    stall = [0., 0] # time, count of immediate recreations
+    start = time.perf_counter()
+
+    def on_frame(i):
+        t = (time.perf_counter() - start) % (BURST + PAUSE)
+        if t < BURST:
+            for j in range(RESIZES_PER_FRAME):
+                w, h = SIZES[(i * RESIZES_PER_FRAME + j) % len(SIZES)]
+                sdl2.SDL_SetWindowSize(window.window, w, h)
+
+    def on_event(event):
+        if event.type == sdl2.SDL_WINDOWEVENT and \
+           event.window.event == sdl2.SDL_WINDOWEVENT_SIZE_CHANGED:
+            if mode == 'immediate':
+                t0 = time.perf_counter()
+                setup._recreateSwapChain()
+                stall[0] += time.perf_counter() - t0
+                stall[1] += 1
+            else:
+                setup.resize_controller.notify('window')
+
+    frame_times = bt.runFrames(setup._drawFrame, seconds, warmup=0,
+                               on_frame=on_frame, on_event=on_event)
+    elapsed = time.perf_counter() - start
+    stats = setup.resize_controller.stats()
+    setup.cleanup1()
+
+    recreations = stats['recreations'] + stall[1]
+    return {'recreations_per_sec': recreations / elapsed,
+            'stall_ms': stats['stall_ms'] + 1000. * stall[0],
+            'skipped_frames': stats['skipped_frames'],
+            'max_frame_ms': bt.summary(frame_times)['max_ms'],
+            'fps': len(frame_times) / elapsed}
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    bt.quietLogging()
+    window = bt.createWindow('bench - resize storm',
+                             flags=sdl2.SDL_WINDOW_SHOWN |
+                                   sdl2.SDL_WINDOW_RESIZABLE)
+
+    print('{0:>20} {1:>14} {2:>10} {3:>8} {4:>13} {5:>8}'.format(
+        'mode', 'recreations/s', 'stall_ms', 'skipped', 'max_frame_ms',
+        'fps'))
+    for name, mode, deferred in MODES:
+        r = run(window, mode, deferred, seconds)
+        print('{0:>20} {1:>14.1f} {2:>10.1f} {3:>8} {4:>13.3f} {5:>8.1f}'
+              .format(name, r['recreations_per_sec'], r['stall_ms'],
+                      r['skipped_frames'], r['max_frame_ms'], r['fps']))
+
+    window.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+
+''' Benchmark the GPU time per frame of the shaders as compiled, and as
+optimised by spirv-opt.
+
+Usage: python3 bench_spirvopt.py [frames]
+
+Notes:
+- Each variant draws 30 warm-up frames and then the given number of frames
+  (default 1000). The GPU time of every frame is measured with timestamp
+  queries at the top and bottom of its command buffer.
+- Needs spirv-opt on the PATH, and a graphics queue with timestamps.
+- The HelloTriangle shaders are tiny, so expect little difference; the
+  benchmark is meant for fragment-heavy shaders.
+- See benchtools.py for running this headless on lavapipe, though a
+  software rasterizer does not reflect GPU times.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import sys
+
+# API
+from vulkan import vkDeviceWaitIdle
+
+# Application Modules
+import benchtools as bt
+import spirvopt as so
+import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+
+WARMUP = 30
+
+
+def run(window, optimize_shaders, frames):
+    setup = vb.Setup(window, optimize_shaders=optimize_shaders,
+                     gpu_timestamps=True)
+    for i in range(WARMUP):
+        bt.pumpEvents()
+        setup._drawFrame()
+    vkDeviceWaitIdle(setup.logical_device)
+    setup.gpuFrameTimes(reset=True)
+    for i in range(frames):
+        if not bt.pumpEvents():
+            break
+        setup._drawFrame()
+    vkDeviceWaitIdle(setup.logical_device)
+    # Collect the timestamps of the frames still in flight.
+    for frame in range(setup.max_frames_in_flight):
+        setup._frameCompleted(frame)
+    result = setup.gpuFrameTimes()
+    setup.cleanup1()
+    return result
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    if not so.findOptimizer():
+        print('spirv-opt not found.')
+        return 1
+    bt.quietLogging()
+    window = bt.createWindow('bench - spirv-opt')
+
+    print('{0:>10} {1:>8} {2:>12} {3:>12} {4:>12}'.format(
+        'shaders', 'frames', 'gpu_mean_ms', 'gpu_p99_ms', 'gpu_max_ms'))
+    for name, optimize_shaders in (('compiled', False), ('optimised', True)):
+        result = run(window, optimize_shaders, frames)
+        if result is None:
+            print('The graphics queue does not support timestamps.')
+            break
+        print('{0:>10} {1:>8} {2:>12.4f} {3:>12.4f} {4:>12.4f}'.format(
+            name, result['frames'], result['mean_ms'], result['p99_ms'],
+            result['max_ms']))
+
+    window.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+
+''' Benchmark SPIR-V reflection over a corpus of shaders.
+
+Usage: python3 bench_spirvreflect.py [directory ...] [--repeat N]
+
+Notes:
+- Reflects every .spv file under the given directories (default: this
+  directory), bypassing the reflection cache, and reports the time per
+  shader and for the whole corpus.
+- Needs no Vulkan device or display.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import os
+import sys
+import time
+
+# Application Modules
+import spirvreflect as sr
+
+
+def corpus(directories):
+    '''Return the contents of the .spv files under directories.'''
+    shaders = []
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            for f in sorted(files):
+                if f.endswith('.spv'):
+                    with open(os.path.join(root, f), 'rb') as spv:
+                        shaders.append(spv.read())
+    return shaders
+
+
+def main():
+    args = sys.argv[1:]
+    repeat = 20
+    if '--repeat' in args:
+        i = args.index('--repeat')
+        repeat = int(args[i + 1])
+        del args[i:i + 2]
+    directories = args if args else \
+                  [os.path.dirname(os.path.abspath(__file__))]
+    shaders = corpus(directories)
+    if not shaders:
+        print('No .spv files found.')
+        return 1
+
+    words = sum(len(s) // 4 for s in shaders)
+    start = time.perf_counter()
+    for i in range(repeat):
+        for data in shaders:
+            sr._reflect(sr._words(data))
+    elapsed = (time.perf_counter() - start) / repeat
+
+    print('{0} shaders, {1} words'.format(len(shaders), words))
+    print('corpus: {0:.3f} ms, per shader: {1:.3f} ms'.format(
+        1000. * elapsed, 1000. * elapsed / len(shaders)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
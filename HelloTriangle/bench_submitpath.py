@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+
+''' Micro-benchmark the Python cost of Setup._drawFrame, with and without the
+"prepared frame" submit path.
+
+Usage: python3 bench_submitpath.py [seconds_per_run]
+
+Notes:
+- The CPU time of the calling thread (time.thread_time) is measured, so the
+  time spent blocked in vkWaitForFences or vkAcquireNextImageKHR is not
+  counted. What remains is mostly Python and cffi overhead.
+- See benchtools.py for running this headless on lavapipe.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import sys
+import time
+
+# Application Modules
+import benchtools as bt
+import vulkanbase_v3_recreateSwapChain_noSwapDebugPrints as vb
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    bt.quietLogging()
+    window = bt.createWindow('bench - submit path')
+
+    print('{0:>16} {1:>12} {2:>12}'.format(
+        'submit_path', 'cpu_us/frame', 'wall_fps'))
+    for prepared in (False, True):
+        setup = vb.Setup(window, prepared_frames=prepared)
+        cpu = bt.summary(bt.runFrames(setup._drawFrame, seconds,
+                                      clock=time.thread_time))
+        wall = bt.summary(bt.runFrames(setup._drawFrame, seconds))
+        setup.cleanup1()
+        print('{0:>16} {1:>12.1f} {2:>12.1f}'.format(
+            'prepared' if prepared else 'per-frame', 1000. * cpu['mean_ms'],
+            wall['fps']))
+
+    window.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
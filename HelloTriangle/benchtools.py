@@ -0,0 +1,98 @@
+#!/bin/env python3
+
+''' Helpers shared by the bench_*.py benchmark scripts.
+
+Notes:
+- The benchmarks need a Vulkan implementation and a display. On a machine
+  without a GPU or a desktop, run them on Mesa's lavapipe software
+  rasterizer inside a virtual X server, e.g.
+
+    VK_ICD_FILENAMES=/usr/share/vulkan/icd.d/lvp_icd.x86_64.json \\
+        xvfb-run -a python3 bench_framesinflight.py
+
+- Logging is turned down to WARNING so that the per-object creation messages
+  of Setup do not distort the timings.
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import logging
+import ctypes
+import time
+
+# API
+import sdl2
+
+# Application Modules
+import sdl2window_v3_recreateSwapChain as sw
+
+WIDTH = 600
+HEIGHT = 400
+
+
+def quietLogging():
+    '''Only report warnings and errors while benchmarking.'''
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def createWindow(title, w=WIDTH, h=HEIGHT, flags=sdl2.SDL_WINDOW_SHOWN):
+    '''Create the SDL2 window that the benchmarked Setup presents to.'''
+    return sw.SetWindow(title=title, w=w, h=h, flags=flags)
+
+
+def pumpEvents(on_event=None):
+    '''Drain pending SDL2 events so that the window stays responsive.
+
+    on_event(event) is called for every event. Returns False when the window
+    has been asked to quit.'''
+    event = sdl2.SDL_Event()
+    while sdl2.SDL_PollEvent(ctypes.byref(event)) != 0:
+        if event.type == sdl2.SDL_QUIT:
+            return False
+        if on_event:
+            on_event(event)
+    return True
+
+
+def runFrames(draw, seconds=5.0, warmup=30, on_frame=None,
+              clock=time.perf_counter, on_event=None):
+    '''Call draw() repeatedly for a number of seconds.
+
+    Returns a list of the duration (in seconds) of every frame drawn after
+    the warm-up frames, as measured by clock. Use time.thread_time as clock
+    to measure the CPU time spent in Python instead of the wall-clock time.
+    on_frame(i) is called before each frame and may be used to script events,
+    e.g. window resizes. on_event is passed to pumpEvents.'''
+    for i in range(warmup):
+        pumpEvents(on_event)
+        draw()
+
+    frame_times = []
+    end = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < end:
+        if on_frame:
+            on_frame(i)
+        if not pumpEvents(on_event):
+            break
+        t0 = clock()
+        draw()
+        frame_times.append(clock() - t0)
+        i += 1
+    return frame_times
+
+
+def summary(frame_times):
+    '''Return frames/sec, mean, worst and 99th percentile frame time (ms).'''
+    if not frame_times:
+        return {'fps': 0., 'mean_ms': 0., 'max_ms': 0., 'p99_ms': 0.}
+    ordered = sorted(frame_times)
+    total = sum(frame_times)
+    return {
+        'fps': len(frame_times) / total if total else 0.,
+        'mean_ms': 1000. * total / len(frame_times),
+        'max_ms': 1000. * ordered[-1],
+        'p99_ms': 1000. * ordered[min(len(ordered) - 1,
+                                      int(0.99 * len(ordered)))] }
@@ -0,0 +1,172 @@
+#!/bin/env python3
+
+''' Record secondary command buffers on background threads, each with its own
+command pool.
+
+Class & Functions:
+- CommandRecorder
+  - record
+  - stats
+  - destroy
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import concurrent.futures
+import logging
+import threading
+import time
+from functools import partial
+
+# API
+from vulkan import *
+
+
+class CommandRecorder:
+    """ Class to split the draws of render passes into secondary command
+    buffers and record them on a thread pool.
+
+    Input Parameters:
+     logical_device     - VkDevice that the command pools are created on.
+     queue_family_index - queue family that the command buffers are
+                          submitted to.
+     threads            - number of recording threads.
+
+    Notes:
+    - A VkCommandPool must be externally synchronised, so each worker thread
+      allocates and records from a pool of its own, and the threads never
+      contend. Each pool has a lock, held while a worker records into it and
+      while its command buffers are freed.
+    - Secondary command buffers inherit the render pass, subpass and
+      framebuffer, but not the dynamic state: record_draws must bind the
+      pipeline and set the viewport and scissor in every one of them.
+    - Python only releases the GIL inside the Vulkan calls, so recording
+      scales with threads as far as the driver's share of the work allows.
+    """
+
+    def __init__(self, logical_device, queue_family_index, threads=2):
+        self.logical_device = logical_device
+        self.queue_family_index = queue_family_index
+        self.threads = threads
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='commandrecorder')
+        self.lock = threading.Lock()
+        self.pools = {} # thread identifier: (VkCommandPool, threading.Lock)
+        self.record_times = [] # seconds per record()
+        self.recorded = 0
+
+
+    def _threadPool(self):
+        '''Return the command pool, and its lock, of the calling thread.'''
+        ident = threading.get_ident()
+        with self.lock:
+            entry = self.pools.get(ident)
+            if entry is None:
+                createInfo = VkCommandPoolCreateInfo(
+                    queueFamilyIndex = self.queue_family_index)
+                try:
+                    pool = vkCreateCommandPool(self.logical_device,
+                                               createInfo, None)
+                except VkError:
+                    logging.error('Command Pool of a recording thread failed '
+                                  'to create.')
+                    raise
+                entry = (pool, threading.Lock())
+                self.pools[ident] = entry
+        return entry
+
+
+    def _recordChunk(self, render_pass, framebuffer, draws, record_draws):
+        '''Record draws into a new secondary command buffer. Runs on a worker
+           thread. Returns the command buffer and the function to free it.'''
+        pool, lock = self._threadPool()
+        allocateInfo = VkCommandBufferAllocateInfo(
+            commandPool = pool,
+            level = VK_COMMAND_BUFFER_LEVEL_SECONDARY,
+            commandBufferCount = 1)
+        inheritance = VkCommandBufferInheritanceInfo(
+            renderPass = render_pass,
+            subpass = 0,
+            framebuffer = framebuffer,
+            occlusionQueryEnable = VK_FALSE,
+            queryFlags = 0,
+            pipelineStatistics = 0)
+        beginInfo = VkCommandBufferBeginInfo(
+            flags = VK_COMMAND_BUFFER_USAGE_RENDER_PASS_CONTINUE_BIT |
+                    VK_COMMAND_BUFFER_USAGE_SIMULTANEOUS_USE_BIT,
+            pInheritanceInfo = inheritance)
+        with lock:
+            command_buffer = vkAllocateCommandBuffers(self.logical_device,
+                                                      allocateInfo)[0]
+            vkBeginCommandBuffer(command_buffer, beginInfo)
+            record_draws(command_buffer, draws)
+            vkEndCommandBuffer(command_buffer)
+        return command_buffer, partial(self._free, pool, lock,
+                                       command_buffer)
+
+
+    def _free(self, pool, lock, command_buffer):
+        with lock:
+            vkFreeCommandBuffers(self.logical_device, pool, 1,
+                                 [command_buffer])
+
+
+    def record(self, jobs, record_draws, chunks=None):
+        '''Record the secondary command buffers of jobs in parallel.
+
+        Input Parameters:
+         jobs         - [(render_pass, framebuffer, draws)], where draws is a
+                        sequence to be split into chunks.
+         record_draws - function(command_buffer, draws) that records a chunk
+                        of draws.
+         chunks       - number of secondary command buffers per job.
+                        Defaults to the number of threads.
+
+        Returns the secondary command buffers of each job, in order, to be
+        executed by vkCmdExecuteCommands, and the functions to free them once
+        no frame in flight uses them.'''
+        chunks = chunks if chunks else self.threads
+        start = time.perf_counter()
+        job_futures = []
+        for render_pass, framebuffer, draws in jobs:
+            size = max(1, -(-len(draws) // chunks))
+            job_futures.append([
+                self.executor.submit(self._recordChunk, render_pass,
+                                     framebuffer, draws[i:i + size],
+                                     record_draws)
+                for i in range(0, len(draws), size)])
+        secondaries = []
+        free_functions = []
+        for futures in job_futures:
+            results = [f.result() for f in futures]
+            secondaries.append([command_buffer
+                                for command_buffer, free in results])
+            free_functions.extend(free for command_buffer, free in results)
+        self.record_times.append(time.perf_counter() - start)
+        self.recorded += len(free_functions)
+        return secondaries, free_functions
+
+
+    def stats(self):
+        '''Return the number of secondary command buffers recorded, and the
+           mean and worst time of record().'''
+        times = self.record_times
+        return {'threads': self.threads,
+                'secondaries': self.recorded,
+                'records': len(times),
+                'mean_ms': 1000. * sum(times) / len(times) if times else 0.,
+                'max_ms': 1000. * max(times) if times else 0.}
+
+
+    def destroy(self):
+        '''Stop the threads and destroy their command pools, which frees the
+           command buffers recorded from them.'''
+        self.executor.shutdown(wait=True)
+        for pool, lock in self.pools.values():
+            vkDestroyCommandPool(self.logical_device, pool, None)
+        if self.pools:
+            logging.info('Destroyed {} Command Pools of recording '
+                         'threads.'.format(len(self.pools)))
+        self.pools = {}
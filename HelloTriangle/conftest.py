@@ -0,0 +1,148 @@
+''' pytest configuration of the HelloTriangle tests.
+
+The modules are imported as scripts, i.e. by their file names, so this
+directory is put on sys.path.
+
+The vulkan module needs a Vulkan loader. Without one, a stand-in module is
+installed that holds the names the tested modules use: the constants, with
+their values from the Vulkan specification, VkError, and Vulkan functions
+and structs that raise NotImplementedError. Tests replace the Vulkan
+functions they call with monkeypatch. The memory_properties fixture backs
+gpubuffer.MappedBuffer with host memory.
+'''
+# Python3 modules
+import os
+import sys
+import types
+
+# Third-party modules
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CONSTANTS = {
+    'VK_FALSE': 0,
+    'VK_TRUE': 1,
+    'VK_BLEND_FACTOR_ZERO': 0,
+    'VK_BLEND_FACTOR_ONE': 1,
+    'VK_BLEND_FACTOR_SRC_ALPHA': 6,
+    'VK_BLEND_FACTOR_ONE_MINUS_SRC_ALPHA': 7,
+    'VK_BLEND_OP_ADD': 0,
+    'VK_BUFFER_USAGE_VERTEX_BUFFER_BIT': 0x80,
+    'VK_BUFFER_USAGE_INDIRECT_BUFFER_BIT': 0x100,
+    'VK_CULL_MODE_NONE': 0,
+    'VK_CULL_MODE_FRONT_BIT': 1,
+    'VK_CULL_MODE_BACK_BIT': 2,
+    'VK_DESCRIPTOR_TYPE_SAMPLER': 0,
+    'VK_DESCRIPTOR_TYPE_COMBINED_IMAGE_SAMPLER': 1,
+    'VK_DESCRIPTOR_TYPE_SAMPLED_IMAGE': 2,
+    'VK_DESCRIPTOR_TYPE_STORAGE_IMAGE': 3,
+    'VK_DESCRIPTOR_TYPE_UNIFORM_TEXEL_BUFFER': 4,
+    'VK_DESCRIPTOR_TYPE_STORAGE_TEXEL_BUFFER': 5,
+    'VK_DESCRIPTOR_TYPE_UNIFORM_BUFFER': 6,
+    'VK_DESCRIPTOR_TYPE_STORAGE_BUFFER': 7,
+    'VK_DESCRIPTOR_TYPE_INPUT_ATTACHMENT': 10,
+    'VK_FORMAT_R32_UINT': 98,
+    'VK_FORMAT_R32_SINT': 99,
+    'VK_FORMAT_R32_SFLOAT': 100,
+    'VK_FORMAT_R32G32_UINT': 101,
+    'VK_FORMAT_R32G32_SINT': 102,
+    'VK_FORMAT_R32G32_SFLOAT': 103,
+    'VK_FORMAT_R32G32B32_UINT': 104,
+    'VK_FORMAT_R32G32B32_SINT': 105,
+    'VK_FORMAT_R32G32B32_SFLOAT': 106,
+    'VK_FORMAT_R32G32B32A32_UINT': 107,
+    'VK_FORMAT_R32G32B32A32_SINT': 108,
+    'VK_FORMAT_R32G32B32A32_SFLOAT': 109,
+    'VK_FRONT_FACE_COUNTER_CLOCKWISE': 0,
+    'VK_FRONT_FACE_CLOCKWISE': 1,
+    'VK_MEMORY_PROPERTY_DEVICE_LOCAL_BIT': 0x1,
+    'VK_MEMORY_PROPERTY_HOST_VISIBLE_BIT': 0x2,
+    'VK_MEMORY_PROPERTY_HOST_COHERENT_BIT': 0x4,
+    'VK_PIPELINE_BIND_POINT_GRAPHICS': 0,
+    'VK_PIPELINE_CREATION_FEEDBACK_VALID_BIT_EXT': 0x1,
+    'VK_PIPELINE_CREATION_FEEDBACK_APPLICATION_PIPELINE_CACHE_HIT_BIT_EXT':
+        0x2,
+    'VK_POLYGON_MODE_FILL': 0,
+    'VK_POLYGON_MODE_LINE': 1,
+    'VK_PRIMITIVE_TOPOLOGY_TRIANGLE_LIST': 3,
+    'VK_SHADER_STAGE_VERTEX_BIT': 0x1,
+    'VK_SHADER_STAGE_TESSELLATION_CONTROL_BIT': 0x2,
+    'VK_SHADER_STAGE_TESSELLATION_EVALUATION_BIT': 0x4,
+    'VK_SHADER_STAGE_GEOMETRY_BIT': 0x8,
+    'VK_SHADER_STAGE_FRAGMENT_BIT': 0x10,
+    'VK_SHADER_STAGE_COMPUTE_BIT': 0x20,
+    'VK_SHARING_MODE_EXCLUSIVE': 0,
+    'VK_VERTEX_INPUT_RATE_VERTEX': 0,
+    'VK_VERTEX_INPUT_RATE_INSTANCE': 1,
+    }
+
+FUNCTIONS = [
+    'vkAllocateMemory', 'vkBindBufferMemory', 'vkCmdBindDescriptorSets',
+    'vkCmdBindPipeline', 'vkCmdBindVertexBuffers', 'vkCmdDraw',
+    'vkCmdDrawIndexedIndirect', 'vkCmdDrawIndirect', 'vkCreateBuffer',
+    'vkCreateGraphicsPipelines', 'vkCreateShaderModule', 'vkDestroyBuffer',
+    'vkDestroyPipeline', 'vkDestroyShaderModule', 'vkFreeMemory',
+    'vkGetBufferMemoryRequirements', 'vkGetDeviceProcAddr', 'vkMapMemory',
+    'vkUnmapMemory',
+    'VkBufferCreateInfo', 'VkMemoryAllocateInfo',
+    'VkPipelineCreationFeedbackCreateInfoEXT', 'VkShaderModuleCreateInfo',
+    'VkSpecializationInfo', 'VkSpecializationMapEntry',
+    ]
+
+
+class VkError(Exception):
+    pass
+
+
+def _unavailable(name):
+    def function(*args, **kwargs):
+        raise NotImplementedError('{} needs a Vulkan loader.'.format(name))
+    function.__name__ = name
+    return function
+
+
+def _stubVulkan():
+    vulkan = types.ModuleType('vulkan')
+    vulkan.__dict__.update(CONSTANTS)
+    for name in FUNCTIONS:
+        setattr(vulkan, name, _unavailable(name))
+    vulkan.VkError = VkError
+    vulkan.ffi = types.SimpleNamespace(
+        new=_unavailable('ffi.new'), cast=_unavailable('ffi.cast'),
+        from_buffer=_unavailable('ffi.from_buffer'))
+    return vulkan
+
+
+try:
+    import vulkan
+except (ImportError, OSError):
+    sys.modules['vulkan'] = _stubVulkan()
+
+
+@pytest.fixture
+def memory_properties(monkeypatch):
+    '''Back gpubuffer.MappedBuffer with a bytearray, and return the
+       VkPhysicalDeviceMemoryProperties of one host-visible, host-coherent
+       memory type.'''
+    import gpubuffer as gb
+    monkeypatch.setattr(gb, 'VkBufferCreateInfo', lambda **kwargs: kwargs)
+    monkeypatch.setattr(gb, 'VkMemoryAllocateInfo', lambda **kwargs: kwargs)
+    monkeypatch.setattr(gb, 'vkCreateBuffer',
+                        lambda device, info, allocator:
+                        ('buffer', info['size']))
+    monkeypatch.setattr(gb, 'vkGetBufferMemoryRequirements',
+                        lambda device, buffer: types.SimpleNamespace(
+                            size=buffer[1], memoryTypeBits=0b1))
+    monkeypatch.setattr(gb, 'vkAllocateMemory',
+                        lambda device, info, allocator:
+                        bytearray(info['allocationSize']))
+    monkeypatch.setattr(gb, 'vkMapMemory',
+                        lambda device, memory, offset, size, flags:
+                        memoryview(memory)[offset:offset + size])
+    for name in ('vkBindBufferMemory', 'vkUnmapMemory', 'vkDestroyBuffer',
+                 'vkFreeMemory'):
+        monkeypatch.setattr(gb, name, lambda *args: None)
+    return types.SimpleNamespace(
+        memoryTypeCount=1,
+        memoryTypes=[types.SimpleNamespace(propertyFlags=gb.HOST_MEMORY)])
@@ -0,0 +1,111 @@
+#!/bin/env python3
+
+''' Record how long a graphics pipeline took to create, and whether the
+pipeline cache was hit, with VK_EXT_pipeline_creation_feedback if the device
+has it.
+
+Class & Functions:
+- EXTENSION_NAME
+- CreationFeedback
+  - attach
+  - report
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# API
+from vulkan import *
+from vulkan import ffi
+
+EXTENSION_NAME = 'VK_EXT_pipeline_creation_feedback'
+
+STAGE_NAMES = {VK_SHADER_STAGE_VERTEX_BIT: 'vertex',
+               VK_SHADER_STAGE_TESSELLATION_CONTROL_BIT: 'tess_control',
+               VK_SHADER_STAGE_TESSELLATION_EVALUATION_BIT: 'tess_evaluation',
+               VK_SHADER_STAGE_GEOMETRY_BIT: 'geometry',
+               VK_SHADER_STAGE_FRAGMENT_BIT: 'fragment',
+               VK_SHADER_STAGE_COMPUTE_BIT: 'compute'}
+
+
+class CreationFeedback:
+    """ Class to record the creation of one graphics pipeline.
+
+    Input Parameters:
+     key           - pipelinelibrary.PipelineKey of the pipeline.
+     name          - name of the pipeline in logs.
+     use_extension - True if VK_EXT_pipeline_creation_feedback is enabled on
+                     the logical device.
+
+    Notes:
+    - seconds is the wall-clock time of vkCreateGraphicsPipelines, set by
+      whoever calls it.
+    - With the extension, the driver also reports its own duration, whether
+      the VkPipelineCache was hit, and the duration of each shader stage.
+      Without it, the cache hit is unknown, i.e. None.
+    - The feedback structs are written by the driver, so this object must
+      live until vkCreateGraphicsPipelines has returned.
+    """
+
+    def __init__(self, key, name, use_extension):
+        self.key = key
+        self.name = name
+        self.seconds = None
+        self.info = None
+        if use_extension:
+            stage_count = len(key.shaders)
+            self.pipeline = ffi.new('VkPipelineCreationFeedbackEXT *')
+            self.stages = ffi.new('VkPipelineCreationFeedbackEXT[]',
+                                  stage_count)
+            self.info = VkPipelineCreationFeedbackCreateInfoEXT(
+                pPipelineCreationFeedback = self.pipeline,
+                pipelineStageCreationFeedbackCount = stage_count,
+                pPipelineStageCreationFeedbacks = self.stages)
+
+
+    def attach(self, createInfo):
+        '''Chain the feedback structs into a VkGraphicsPipelineCreateInfo.'''
+        if self.info is not None:
+            self.info.pNext = createInfo.pNext
+            createInfo.pNext = ffi.addressof(self.info)
+        return createInfo
+
+
+    def _feedback(self, feedback):
+        '''Return (duration ms, cache hit) of a VkPipelineCreationFeedbackEXT,
+           or (None, None) if the driver did not fill it in.'''
+        if not feedback.flags & VK_PIPELINE_CREATION_FEEDBACK_VALID_BIT_EXT:
+            return None, None
+        return (feedback.duration / 1e6, bool(
+            feedback.flags &
+            VK_PIPELINE_CREATION_FEEDBACK_APPLICATION_PIPELINE_CACHE_HIT_BIT_EXT))
+
+
+    def report(self):
+        '''Return a dict of the pipeline's name and key, its wall-clock and
+           driver durations in ms, whether the cache was hit, and the
+           durations of its stages.'''
+        report = {'name': self.name,
+                  'key': self.key,
+                  'wall_ms': None if self.seconds is None
+                             else 1000. * self.seconds,
+                  'source': 'wall-clock',
+                  'duration_ms': None,
+                  'cache_hit': None,
+                  'stages': []}
+        if self.info is None:
+            report['duration_ms'] = report['wall_ms']
+            return report
+        duration, hit = self._feedback(self.pipeline)
+        if duration is not None:
+            report['source'] = 'feedback'
+            report['duration_ms'] = duration
+            report['cache_hit'] = hit
+        else:
+            report['duration_ms'] = report['wall_ms']
+        for i, (stage, path) in enumerate(self.key.shaders):
+            duration, hit = self._feedback(self.stages[i])
+            report['stages'].append({'stage': STAGE_NAMES.get(stage, stage),
+                                     'duration_ms': duration,
+                                     'cache_hit': hit})
+        return report
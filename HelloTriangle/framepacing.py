@@ -0,0 +1,178 @@
+#!/bin/env python3
+
+''' Pace the frames of a Vulkan App's main loop to a target frame rate.
+
+Class & Functions:
+- FramePacer
+  - wait
+  - frameDrawn
+  - stats
+  - report
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import collections
+import logging
+import math
+import time
+
+POLICIES = ('hybrid', 'sleep', 'spin', 'none')
+
+
+class FramePacer:
+    """ Class to keep a main loop from drawing frames faster than needed.
+
+    Input Parameters:
+     target_fps  - frames per second to pace the main loop to.
+     frame_time  - frame-time budget in seconds. Overrides target_fps.
+     policy      - how to wait for the start of the next frame:
+       'hybrid'  -sleep until spin_margin before the deadline, then spin.
+                  Low CPU use and accurate.
+       'sleep'   -only sleep. Lowest CPU use, but as jittery as the OS
+                  scheduler.
+       'spin'    -only spin. Most accurate, but burns a whole core.
+       'none'    -do not wait; only measure.
+     spin_margin - seconds before the deadline at which 'hybrid' stops
+                   sleeping and starts spinning.
+     history     - number of frames kept for the statistics.
+
+    Notes:
+    - Frame deadlines are scheduled from the previous deadline, not from the
+      time the loop woke up. The error of each wait is therefore corrected on
+      the next frame instead of accumulating as drift. When the loop falls
+      more than a frame behind, the schedule is restarted from now so that
+      the missed frames are not drawn in a burst.
+    - When vsync (e.g. VK_PRESENT_MODE_FIFO_KHR) already throttles the loop,
+      the measured draw+present time of a frame approaches the budget.
+      Waiting on top of that makes frames miss vertical blanks, so the pacer
+      stops waiting while the draw time stays above vsync_high of the budget,
+      and resumes once it drops below vsync_low of the budget.
+    """
+
+    def __init__(self, target_fps=60., frame_time=None, policy='hybrid',
+                 spin_margin=0.002, history=240, vsync_high=0.75,
+                 vsync_low=0.25):
+        if policy not in POLICIES:
+            raise ValueError('Frame pacing policy must be one of {}'.format(
+                POLICIES))
+        self.frame_time = frame_time if frame_time else 1. / target_fps
+        self.policy = policy
+        self.spin_margin = spin_margin
+        self.vsync_high = vsync_high
+        self.vsync_low = vsync_low
+        self.vsync_throttled = False
+
+        self.deadline = None
+        self.frame_start = None
+        self.frame_times = collections.deque(maxlen=history)
+        self.draw_times = collections.deque(maxlen=history)
+        self.frames = 0
+        self.resyncs = 0
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        logging.info('Frame pacer: {0:.3f} ms budget, {1} policy.'.format(
+            1000. * self.frame_time, self.policy))
+
+
+    def wait(self):
+        '''Block until the next frame should start.'''
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now
+
+        if not self.vsync_throttled:
+            self._waitUntil(self.deadline)
+
+        start = time.perf_counter()
+        if self.frame_start is not None:
+            self.frame_times.append(start - self.frame_start)
+        self.frame_start = start
+        self.frames += 1
+
+        #Schedule next deadline from this one (drift correction), unless the
+        #loop is more than a frame behind schedule.
+        self.deadline += self.frame_time
+        if self.deadline < start:
+            self.deadline = start + self.frame_time
+            self.resyncs += 1
+
+
+    def _waitUntil(self, deadline):
+        '''Wait until deadline (a time.perf_counter value) using policy.'''
+        if self.policy == 'none':
+            return
+
+        remaining = deadline - time.perf_counter()
+        if self.policy == 'sleep':
+            if remaining > 0:
+                time.sleep(remaining)
+            return
+
+        if self.policy == 'hybrid' and remaining > self.spin_margin:
+            time.sleep(remaining - self.spin_margin)
+        while time.perf_counter() < deadline:
+            pass
+
+
+    def frameDrawn(self, draw_time):
+        '''Record how long (in seconds) drawing and presenting the frame took,
+           and detect whether vsync is throttling the main loop.'''
+        self.draw_times.append(draw_time)
+        if len(self.draw_times) < 8:
+            return
+
+        recent = sorted(list(self.draw_times)[-8:])
+        median = recent[len(recent) // 2]
+        if not self.vsync_throttled and \
+           median > self.vsync_high * self.frame_time:
+            self.vsync_throttled = True
+            logging.info('Frame pacer: present is throttled by vsync, '
+                         'stopped waiting.')
+        elif self.vsync_throttled and \
+             median < self.vsync_low * self.frame_time:
+            self.vsync_throttled = False
+            logging.info('Frame pacer: present is no longer throttled, '
+                         'resumed waiting.')
+
+
+    def stats(self):
+        '''Return the achieved frame rate, frame-time jitter and CPU use.
+
+        Notes:
+        - jitter_ms is the standard deviation of the frame times.
+        - cpu_percent is the process CPU time over wall-clock time since the
+          pacer was created, i.e. 100 means one whole core.'''
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        frame_times = sorted(self.frame_times)
+        n = len(frame_times)
+        if n:
+            mean = sum(frame_times) / n
+            jitter = math.sqrt(sum((t - mean)**2 for t in frame_times) / n)
+            p99 = frame_times[min(n - 1, int(0.99 * n))]
+            worst = frame_times[-1]
+        else:
+            mean = jitter = p99 = worst = 0.
+        return {'policy': self.policy,
+                'target_ms': 1000. * self.frame_time,
+                'frames': self.frames,
+                'fps': 1. / mean if mean else 0.,
+                'mean_ms': 1000. * mean,
+                'jitter_ms': 1000. * jitter,
+                'p99_ms': 1000. * p99,
+                'max_ms': 1000. * worst,
+                'resyncs': self.resyncs,
+                'vsync_throttled': self.vsync_throttled,
+                'cpu_percent': 100. * cpu / wall if wall else 0.}
+
+
+    def report(self):
+        '''Return the statistics as a one-line summary.'''
+        return ('{policy} pacing: target {target_ms:.3f} ms, achieved '
+                '{fps:.1f} fps, mean {mean_ms:.3f} ms, jitter {jitter_ms:.3f} '
+                'ms, p99 {p99_ms:.3f} ms, max {max_ms:.3f} ms, resyncs '
+                '{resyncs}, vsync throttled {vsync_throttled}, CPU '
+                '{cpu_percent:.1f}%').format(**self.stats())
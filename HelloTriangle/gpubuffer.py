@@ -0,0 +1,96 @@
+#!/bin/env python3
+
+''' Vulkan buffers in host-visible memory that stays mapped, for NumPy arrays
+to be written into directly.
+
+Class & Functions:
+- findMemoryType
+- MappedBuffer
+  - array
+  - destroy
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import logging
+
+# Third-party modules
+import numpy as np
+
+# API
+from vulkan import *
+
+HOST_MEMORY = VK_MEMORY_PROPERTY_HOST_VISIBLE_BIT | \
+              VK_MEMORY_PROPERTY_HOST_COHERENT_BIT
+
+
+def findMemoryType(memory_properties, type_bits, flags):
+    '''Return the index of the first memory type, of the memoryTypeBits
+       type_bits, that has the VkMemoryPropertyFlags flags.'''
+    for i in range(memory_properties.memoryTypeCount):
+        if type_bits & (1 << i) and \
+           memory_properties.memoryTypes[i].propertyFlags & flags == flags:
+            return i
+    raise ValueError('No memory type has the property flags {}.'.format(
+        flags))
+
+
+class MappedBuffer:
+    """ Class of a VkBuffer bound to host-visible, host-coherent memory that
+    is mapped for the life of the buffer.
+
+    Input Parameters:
+     logical_device    - VkDevice that the buffer is created on.
+     memory_properties - VkPhysicalDeviceMemoryProperties of its physical
+                         device.
+     size              - size of the buffer in bytes.
+     usage             - VkBufferUsageFlags of the buffer.
+
+    Notes:
+    - The memory is coherent, so writes need no flush, but the GPU reads them
+      when it executes the commands that use the buffer: a region must not be
+      written while a frame in flight may still read it.
+    - array() returns NumPy views of the mapped memory. They are invalid after
+      destroy().
+    """
+
+    def __init__(self, logical_device, memory_properties, size, usage):
+        self.logical_device = logical_device
+        self.size = size
+        createInfo = VkBufferCreateInfo(
+            size = size,
+            usage = usage,
+            sharingMode = VK_SHARING_MODE_EXCLUSIVE)
+        try:
+            self.buffer = vkCreateBuffer(logical_device, createInfo, None)
+            requirements = vkGetBufferMemoryRequirements(logical_device,
+                                                         self.buffer)
+            allocateInfo = VkMemoryAllocateInfo(
+                allocationSize = requirements.size,
+                memoryTypeIndex = findMemoryType(
+                    memory_properties, requirements.memoryTypeBits,
+                    HOST_MEMORY))
+            self.memory = vkAllocateMemory(logical_device, allocateInfo, None)
+            vkBindBufferMemory(logical_device, self.buffer, self.memory, 0)
+            self.mapped = vkMapMemory(logical_device, self.memory, 0, size, 0)
+            logging.info('Created mapped buffer of {} bytes.'.format(size))
+        except VkError:
+            logging.error('Mapped buffer failed to create.')
+            raise
+
+
+    def array(self, dtype, count, offset=0):
+        '''Return a NumPy array of count elements of dtype, that is a view of
+           the mapped memory at offset.'''
+        return np.frombuffer(self.mapped, dtype=dtype, count=count,
+                             offset=offset)
+
+
+    def destroy(self):
+        '''Unmap and destroy the buffer, and free its memory.'''
+        vkUnmapMemory(self.logical_device, self.memory)
+        vkDestroyBuffer(self.logical_device, self.buffer, None)
+        vkFreeMemory(self.logical_device, self.memory, None)
+        self.mapped = None
@@ -0,0 +1,116 @@
+#!/bin/env python3
+
+''' Time command buffers on the GPU with timestamp queries.
+
+Class & Functions:
+- GpuTimer
+  - begin
+  - end
+  - collect
+  - reset
+  - stats
+  - destroy
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import logging
+
+# API
+from vulkan import *
+from vulkan import ffi
+
+
+class GpuTimer:
+    """ Class to measure the GPU time of command buffers.
+
+    Input Parameters:
+     logical_device   - VkDevice that the query pool is created on.
+     timestamp_period - nanoseconds per timestamp tick, i.e.
+                        VkPhysicalDeviceLimits.timestampPeriod.
+     valid_bits       - timestampValidBits of the queue family.
+     slots            - number of command buffers that can be timed, e.g.
+                        one per swapchain image.
+
+    Notes:
+    - begin() and end() record a pair of timestamps, at the top and bottom
+      of the pipeline, into a slot. begin() also resets the slot's queries,
+      so a command buffer can be submitted again and again.
+    - collect(slot) reads the slot once its command buffer has finished,
+      i.e. after the fence of its submit has signaled, without waiting.
+    """
+
+    def __init__(self, logical_device, timestamp_period, valid_bits=64,
+                 slots=16):
+        self.logical_device = logical_device
+        self.timestamp_period = timestamp_period
+        self.mask = (1 << valid_bits) - 1
+        self.slots = slots
+        self.results = ffi.new('uint64_t[2]')
+        self.samples = [] # seconds
+        query_pool_createInfo = VkQueryPoolCreateInfo(
+            queryType = VK_QUERY_TYPE_TIMESTAMP,
+            queryCount = 2 * slots,
+            pipelineStatistics = 0)
+        try:
+            self.query_pool = vkCreateQueryPool(self.logical_device,
+                                                query_pool_createInfo, None)
+            logging.info('Created timestamp query pool.')
+        except VkError:
+            logging.error('Timestamp query pool failed to create.')
+            exit()
+
+
+    def begin(self, command_buffer, slot):
+        '''Record the start timestamp of slot, outside a render pass.'''
+        vkCmdResetQueryPool(command_buffer, self.query_pool, 2 * slot, 2)
+        vkCmdWriteTimestamp(command_buffer, VK_PIPELINE_STAGE_TOP_OF_PIPE_BIT,
+                            self.query_pool, 2 * slot)
+
+
+    def end(self, command_buffer, slot):
+        '''Record the end timestamp of slot.'''
+        vkCmdWriteTimestamp(command_buffer,
+                            VK_PIPELINE_STAGE_BOTTOM_OF_PIPE_BIT,
+                            self.query_pool, 2 * slot + 1)
+
+
+    def collect(self, slot):
+        '''Add the GPU time of slot to samples and return it in seconds, or
+           None if its timestamps are not available.'''
+        try:
+            vkGetQueryPoolResults(self.logical_device, self.query_pool,
+                                  2 * slot, 2, ffi.sizeof(self.results),
+                                  self.results, 8, VK_QUERY_RESULT_64_BIT)
+        except VkNotReady:
+            return None
+        ticks = (self.results[1] - self.results[0]) & self.mask
+        seconds = ticks * self.timestamp_period / 1e9
+        self.samples.append(seconds)
+        return seconds
+
+
+    def reset(self):
+        '''Forget the samples, e.g. after warm-up frames.'''
+        self.samples = []
+
+
+    def stats(self):
+        '''Return the number of samples and their mean, 99th percentile and
+           worst GPU time in ms.'''
+        if not self.samples:
+            return {'frames': 0, 'mean_ms': 0., 'p99_ms': 0., 'max_ms': 0.}
+        ordered = sorted(self.samples)
+        return {'frames': len(ordered),
+                'mean_ms': 1000. * sum(ordered) / len(ordered),
+                'p99_ms': 1000. * ordered[min(len(ordered) - 1,
+                                              int(0.99 * len(ordered)))],
+                'max_ms': 1000. * ordered[-1]}
+
+
+    def destroy(self):
+        '''Destroy the query pool.'''
+        vkDestroyQueryPool(self.logical_device, self.query_pool, None)
+        logging.info('Destroyed timestamp query pool.')
@@ -0,0 +1,161 @@
+#!/bin/env python3
+
+''' Indirect draws: the commands of many draws, written from NumPy structured
+arrays into a mapped buffer, and recorded with one vkCmdDrawIndirect call.
+
+Class & Functions:
+- DRAW_INDIRECT_COMMAND
+- DRAW_INDEXED_INDIRECT_COMMAND
+- commands
+- IndirectDrawBuffer
+  - commands
+  - write
+  - record
+  - destroy
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Third-party modules
+import numpy as np
+
+# API
+from vulkan import *
+
+# Application Modules
+import gpubuffer as gb
+
+# The layouts of VkDrawIndirectCommand and VkDrawIndexedIndirectCommand.
+DRAW_INDIRECT_COMMAND = np.dtype([
+    ('vertexCount', '<u4'), ('instanceCount', '<u4'),
+    ('firstVertex', '<u4'), ('firstInstance', '<u4')])
+DRAW_INDEXED_INDIRECT_COMMAND = np.dtype([
+    ('indexCount', '<u4'), ('instanceCount', '<u4'), ('firstIndex', '<u4'),
+    ('vertexOffset', '<i4'), ('firstInstance', '<u4')])
+
+# Device extension of the draws whose count is read from a buffer, and its
+# functions for vkGetDeviceProcAddr.
+EXTENSION_NAME = 'VK_KHR_draw_indirect_count'
+COUNT_FUNCTIONS = {False: 'vkCmdDrawIndirectCountKHR',
+                   True: 'vkCmdDrawIndexedIndirectCountKHR'}
+
+# Bytes before the commands of a copy: the draw count, a uint32, padded.
+COUNT_SIZE = 16
+
+
+def commands(count, indexed=False):
+    '''Return a zeroed NumPy array of count indirect draw commands.'''
+    return np.zeros(count, DRAW_INDEXED_INDIRECT_COMMAND if indexed
+                    else DRAW_INDIRECT_COMMAND)
+
+
+class IndirectDrawBuffer:
+    """ Class of a mapped buffer of indirect draw commands.
+
+    Input Parameters:
+     logical_device    - VkDevice that the buffer is created on.
+     memory_properties - VkPhysicalDeviceMemoryProperties of its physical
+                         device.
+     max_draws         - number of commands the buffer holds.
+     indexed           - True for VkDrawIndexedIndirectCommand, drawn with
+                         the index buffer the caller has bound.
+     copies            - number of copies of the commands, e.g. one per frame
+                         in flight, so that one is written while the GPU
+                         reads another.
+     max_draw_count    - maxDrawIndirectCount if the device has the
+                         multiDrawIndirect feature, else 1.
+     count_function    - vkCmdDraw[Indexed]IndirectCountKHR, if the device
+                         has VK_KHR_draw_indirect_count, see COUNT_FUNCTIONS.
+
+    Notes:
+    - Each copy holds the draw count, followed by the commands.
+    - With count_function, the GPU reads the draw count from the buffer, so
+      a recorded command buffer draws whatever number of commands was last
+      written. Otherwise the count is recorded, and command buffers must be
+      recorded again when it changes, see reads_count.
+    - Without multiDrawIndirect, record() calls vkCmdDrawIndirect once per
+      command, which still saves building the arguments of each draw in
+      Python.
+    """
+
+    def __init__(self, logical_device, memory_properties, max_draws,
+                 indexed=False, copies=1, max_draw_count=1,
+                 count_function=None):
+        self.indexed = indexed
+        self.dtype = DRAW_INDEXED_INDIRECT_COMMAND if indexed \
+                     else DRAW_INDIRECT_COMMAND
+        self.stride = self.dtype.itemsize
+        self.max_draws = max_draws
+        self.max_draw_count = max(1, max_draw_count)
+        self.count_function = count_function \
+            if max_draws <= self.max_draw_count else None
+        self.draw = vkCmdDrawIndexedIndirect if indexed else vkCmdDrawIndirect
+        # Keep every copy 16-byte aligned.
+        self.copy_size = -(-(COUNT_SIZE + max_draws * self.stride) // 16) * 16
+        self.buffer = gb.MappedBuffer(logical_device, memory_properties,
+                                      copies * self.copy_size,
+                                      VK_BUFFER_USAGE_INDIRECT_BUFFER_BIT)
+        self.counts = [0] * copies
+        self.copy = 0 # the copy record() draws, by default
+
+
+    @property
+    def reads_count(self):
+        '''True if the GPU reads the draw count from the buffer.'''
+        return self.count_function is not None
+
+
+    def commands(self, copy=0):
+        '''Return the commands of copy as a NumPy view of the mapped buffer,
+           for the caller to fill in place before calling write(None).'''
+        return self.buffer.array(self.dtype, self.max_draws,
+                                 copy * self.copy_size + COUNT_SIZE)
+
+
+    def write(self, commands, copy=0, count=None):
+        '''Write commands into copy, and set its draw count.
+
+        commands is a NumPy array of the dtype of the buffer, or an array of
+        its fields in columns, or None if they were filled in place. count
+        defaults to the number of commands. Returns the draw count.'''
+        view = self.commands(copy)
+        if commands is not None:
+            commands = np.asarray(commands)
+            if len(commands) > self.max_draws:
+                raise ValueError('{} draws do not fit in a buffer of '
+                                 '{}.'.format(len(commands), self.max_draws))
+            if commands.dtype == self.dtype:
+                view[:len(commands)] = commands
+            elif commands.dtype.names:
+                for name in self.dtype.names:
+                    view[name][:len(commands)] = commands[name]
+            else:
+                for i, name in enumerate(self.dtype.names):
+                    view[name][:len(commands)] = commands[:, i]
+            count = len(commands) if count is None else count
+        count = self.max_draws if count is None else min(count, self.max_draws)
+        self.buffer.array('<u4', 1, copy * self.copy_size)[0] = count
+        self.counts[copy] = count
+        return count
+
+
+    def record(self, command_buffer, copy=None):
+        '''Record the draws of copy, by default self.copy, into
+           command_buffer.'''
+        copy = self.copy if copy is None else copy
+        buffer = self.buffer.buffer
+        offset = copy * self.copy_size
+        if self.count_function:
+            self.count_function(command_buffer, buffer, offset + COUNT_SIZE,
+                                buffer, offset, self.max_draws, self.stride)
+            return
+        count = self.counts[copy]
+        for first in range(0, count, self.max_draw_count):
+            self.draw(command_buffer, buffer,
+                      offset + COUNT_SIZE + first * self.stride,
+                      min(self.max_draw_count, count - first), self.stride)
+
+
+    def destroy(self):
+        self.buffer.destroy()
@@ -0,0 +1,25 @@
+#version 450
+#extension GL_ARB_separate_shader_objects : enable
+
+out gl_PerVertex {
+    vec4 gl_Position;
+};
+
+// Per-instance attributes, see instancing.INSTANCE.
+layout(location = 0) in vec2 inOffset;
+layout(location = 1) in float inScale;
+layout(location = 2) in vec3 inColor;
+
+layout(location = 0) out vec3 fragColor;
+
+vec2 positions[3] = vec2[](
+    vec2(0.0, -0.5),
+    vec2(0.5, 0.5),
+    vec2(-0.5, 0.5)
+);
+
+void main() {
+    gl_Position = vec4(inScale * positions[gl_VertexIndex] + inOffset, 0.0,
+                       1.0);
+    fragColor = inColor;
+}
@@ -0,0 +1,140 @@
+#!/bin/env python3
+
+''' Instanced draws: per-instance attributes, written from NumPy structured
+arrays into a mapped vertex buffer that advances per instance.
+
+Class & Functions:
+- INSTANCE
+- instances
+- grid
+- checkInputs
+- InstanceBuffer
+  - array
+  - write
+  - vertexBuffers
+  - destroy
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Third-party modules
+import numpy as np
+
+# API
+from vulkan import *
+
+# Application Modules
+import gpubuffer as gb
+import spirvreflect as sr
+
+# The SPIR-V of instanced.vert, built by shaderbuild.
+SHADER = 'instanced.vert.spv'
+
+# The per-instance attributes of instanced.vert, interleaved in the order of
+# their locations: the offset of the triangle in normalized device
+# coordinates, its scale and its colour.
+INSTANCE = np.dtype([('offset', '<f4', (2,)), ('scale', '<f4'),
+                     ('color', '<f4', (3,))])
+
+
+def instances(count):
+    '''Return count instances at the centre, of scale 1 and in white.'''
+    result = np.zeros(count, INSTANCE)
+    result['scale'] = 1.
+    result['color'] = 1.
+    return result
+
+
+def grid(count):
+    '''Return count instances tiled over the viewport, row by row, each
+       scaled to its cell and coloured by its position.'''
+    side = max(1, int(np.ceil(np.sqrt(count))))
+    index = np.arange(count)
+    u = (index % side + 0.5) / side
+    v = (index // side + 0.5) / side
+    result = np.empty(count, INSTANCE)
+    result['offset'][:, 0] = 2. * u - 1.
+    result['offset'][:, 1] = 2. * v - 1.
+    result['scale'] = 2. / side
+    result['color'][:, 0] = u
+    result['color'][:, 1] = v
+    result['color'][:, 2] = 1. - u
+    return result
+
+
+def checkInputs(reflection):
+    '''Raise ValueError unless the inputs of a vertex shader's Reflection
+       match INSTANCE.'''
+    bindings, attributes = sr.vertexInputDescription(
+        reflection, input_rate=VK_VERTEX_INPUT_RATE_INSTANCE)
+    offsets = tuple(offset for location, binding, attribute_format, offset
+                    in attributes)
+    expected = tuple(INSTANCE.fields[name][1] for name in INSTANCE.names)
+    if not bindings or bindings[0][1] != INSTANCE.itemsize or \
+       offsets != expected:
+        raise ValueError('The vertex shader inputs do not match '
+                         'instancing.INSTANCE.')
+
+
+class InstanceBuffer:
+    """ Class of a mapped vertex buffer of per-instance attributes.
+
+    Input Parameters:
+     logical_device    - VkDevice that the buffer is created on.
+     memory_properties - VkPhysicalDeviceMemoryProperties of its physical
+                         device.
+     max_instances     - number of instances the buffer holds.
+     copies            - number of copies of the instances, e.g. one per
+                         frame in flight, so that one is written while the
+                         GPU reads another.
+
+    Notes:
+    - A pipeline whose vertex input advances per instance, i.e. with
+      VK_VERTEX_INPUT_RATE_INSTANCE, draws every instance of a copy with one
+      vkCmdDraw whose instanceCount is the count of the copy.
+    """
+
+    def __init__(self, logical_device, memory_properties, max_instances,
+                 copies=1):
+        self.max_instances = max_instances
+        # Keep every copy 16-byte aligned.
+        self.copy_size = -(-max_instances * INSTANCE.itemsize // 16) * 16
+        self.buffer = gb.MappedBuffer(logical_device, memory_properties,
+                                      copies * self.copy_size,
+                                      VK_BUFFER_USAGE_VERTEX_BUFFER_BIT)
+        self.counts = [0] * copies
+
+
+    def array(self, copy=0):
+        '''Return the instances of copy as a NumPy view of the mapped buffer,
+           for the caller to fill in place before calling write(None).'''
+        return self.buffer.array(INSTANCE, self.max_instances,
+                                 copy * self.copy_size)
+
+
+    def write(self, instances, copy=0, count=None):
+        '''Write instances, a NumPy array of INSTANCE, into copy, or None if
+           they were filled in place. count defaults to the number of
+           instances. Returns the instance count.'''
+        if instances is not None:
+            if len(instances) > self.max_instances:
+                raise ValueError('{} instances do not fit in a buffer of '
+                                 '{}.'.format(len(instances),
+                                              self.max_instances))
+            self.array(copy)[:len(instances)] = instances
+            count = len(instances) if count is None else count
+        count = self.max_instances if count is None \
+                else min(count, self.max_instances)
+        self.counts[copy] = count
+        return count
+
+
+    def vertexBuffers(self, copy=0):
+        '''Return the vertex buffer binding of copy, for
+           drawbatcher.drawItem.'''
+        return ((self.buffer.buffer, copy * self.copy_size),)
+
+
+    def destroy(self):
+        self.buffer.destroy()
@@ -0,0 +1,183 @@
+#!/bin/env python3
+
+''' Keep a Vulkan pipeline cache on disk between runs of a Vulkan App.
+
+Class & Functions:
+- defaultCacheDir
+- createPipelineCache
+- getPipelineCacheData
+- PipelineCache
+  - data
+  - save
+  - destroy
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import logging
+import os
+import struct
+import tempfile
+import zlib
+
+# API
+from vulkan import *
+from vulkan import ffi
+
+# File layout: our own header, then the data of vkGetPipelineCacheData.
+# The Vulkan data has its own header (VkPipelineCacheHeaderVersionOne), but
+# it does not hold the driver version, so the file header adds it, and a
+# CRC32 of the Vulkan data to detect truncated or corrupt files.
+FILE_MAGIC = b'VKPCACHE'
+FILE_HEADER = struct.Struct('<8sIII') # magic, driverVersion, size, crc32
+VK_HEADER = struct.Struct('<IIII16s') # headerSize, headerVersion, vendorID,
+                                      # deviceID, pipelineCacheUUID
+
+
+def defaultCacheDir():
+    '''Return the directory for pipeline cache files, i.e.
+       $XDG_CACHE_HOME/vulkan_examples or ~/.cache/vulkan_examples.'''
+    base = os.environ.get('XDG_CACHE_HOME') or \
+           os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'vulkan_examples')
+
+
+def createPipelineCache(logical_device, data=b''):
+    '''Return a new VkPipelineCache, filled with data if given.'''
+    createInfo = VkPipelineCacheCreateInfo(
+        flags = 0,
+        initialDataSize = len(data),
+        pInitialData = ffi.from_buffer(data) if data else None)
+    return vkCreatePipelineCache(logical_device, createInfo, None)
+
+
+def getPipelineCacheData(logical_device, pipeline_cache):
+    '''Return the data of a VkPipelineCache as bytes.'''
+    data = vkGetPipelineCacheData(logical_device, pipeline_cache)
+    if isinstance(data, ffi.CData):
+        data = ffi.buffer(data)
+    return bytes(data)
+
+
+class PipelineCache:
+    """ Class to load, create, save and destroy a VkPipelineCache.
+
+    Input Parameters:
+     logical_device             - VkDevice that the cache is created on.
+     physical_device_properties - VkPhysicalDeviceProperties of its physical
+                                  device.
+     cache_dir                  - directory of the cache file. Defaults to
+                                  defaultCacheDir().
+
+    Notes:
+    - The file name holds the vendorID, deviceID, driverVersion and
+      pipelineCacheUUID, so every device and driver has its own file.
+    - On loading, the file is still validated against those values and its
+      CRC32. A file that does not match is ignored and an empty cache is
+      created; drivers may misbehave when given another driver's data.
+    - save() writes a temporary file and renames it over the cache file, so
+      a crash while saving never leaves a half-written cache file.
+    """
+
+    def __init__(self, logical_device, physical_device_properties,
+                 cache_dir=None):
+        self.logical_device = logical_device
+        self.vendor_id = physical_device_properties.vendorID
+        self.device_id = physical_device_properties.deviceID
+        self.driver_version = physical_device_properties.driverVersion
+        self.uuid = bytes(list(physical_device_properties.pipelineCacheUUID))
+        self.cache_dir = cache_dir if cache_dir else defaultCacheDir()
+        self.path = os.path.join(
+            self.cache_dir, 'pipelinecache-{0:04x}-{1:04x}-{2:08x}-{3}.bin'
+            .format(self.vendor_id, self.device_id, self.driver_version,
+                    self.uuid.hex()))
+        self.loaded_size = 0
+        self.handle = None
+
+        data = self._load()
+        try:
+            self.handle = createPipelineCache(self.logical_device, data)
+            logging.info('Created pipeline cache from {0} bytes of {1}.'
+                         .format(len(data), self.path))
+        except VkError:
+            logging.error('Pipeline cache failed to create.')
+            exit()
+
+
+    def _load(self):
+        '''Return the validated Vulkan pipeline cache data of the cache file,
+           or b'' if there is no valid cache file.'''
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except OSError:
+            logging.info('No pipeline cache file: {}'.format(self.path))
+            return b''
+
+        if len(raw) < FILE_HEADER.size + VK_HEADER.size:
+            logging.warning('Ignored truncated pipeline cache file.')
+            return b''
+        magic, driver_version, size, crc = FILE_HEADER.unpack_from(raw)
+        data = raw[FILE_HEADER.size:]
+        if magic != FILE_MAGIC or size != len(data) or \
+           crc != zlib.crc32(data) & 0xFFFFFFFF:
+            logging.warning('Ignored corrupt pipeline cache file.')
+            return b''
+
+        header_size, header_version, vendor_id, device_id, uuid = \
+            VK_HEADER.unpack_from(data)
+        if driver_version != self.driver_version or \
+           header_version != VK_PIPELINE_CACHE_HEADER_VERSION_ONE or \
+           vendor_id != self.vendor_id or device_id != self.device_id or \
+           uuid != self.uuid:
+            logging.warning('Ignored pipeline cache file of another device '
+                            'or driver.')
+            return b''
+
+        self.loaded_size = len(data)
+        return data
+
+
+    def data(self):
+        '''Return the current data of the VkPipelineCache.'''
+        if not self.handle:
+            return b''
+        return getPipelineCacheData(self.logical_device, self.handle)
+
+
+    def save(self):
+        '''Write the pipeline cache data atomically to the cache file.'''
+        data = self.data()
+        if not data:
+            return
+
+        header = FILE_HEADER.pack(FILE_MAGIC, self.driver_version, len(data),
+                                  zlib.crc32(data) & 0xFFFFFFFF)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir,
+                                            suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(header)
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+            logging.info('Saved {0} bytes of pipeline cache to {1}.'.format(
+                len(data), self.path))
+        except OSError as e:
+            logging.error('Pipeline cache failed to save: {}'.format(e))
+
+
+    def destroy(self):
+        '''Destroy the VkPipelineCache. Call save() first to keep it.'''
+        if self.handle:
+            vkDestroyPipelineCache(self.logical_device, self.handle, None)
+            self.handle = None
+            logging.info('Destroyed Vulkan Pipeline Cache.')
@@ -0,0 +1,154 @@
+#!/bin/env python3
+
+''' Compile Vulkan graphics pipelines on background threads.
+
+Class & Functions:
+- PipelineCompiler
+  - submit
+  - queueDepth
+  - mergeCaches
+  - stats
+  - shutdown
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import concurrent.futures
+import logging
+import threading
+import time
+
+# API
+from vulkan import *
+
+# Application Modules
+import pipelinecache as pc
+
+
+class PipelineCompiler:
+    """ Class to create graphics pipelines on a thread pool.
+
+    Input Parameters:
+     logical_device - VkDevice that the pipelines are created on.
+     pipeline_cache - pipelinecache.PipelineCache to seed the worker caches
+                      from and to merge them into, or None.
+     max_workers    - number of compiler threads.
+
+    Notes:
+    - submit() returns a concurrent.futures.Future of the VkPipeline. The
+      frame loop keeps drawing with its current pipeline and swaps in the
+      new one once the future is done.
+    - Each worker thread compiles through its own VkPipelineCache, seeded
+      with the data of pipeline_cache, so the threads never contend for one
+      cache. mergeCaches() merges the worker caches into pipeline_cache;
+      vkMergePipelineCaches needs its destination cache to be externally
+      synchronised, so it and the seeding are done under one lock.
+    - A VkGraphicsPipelineCreateInfo keeps the structs it points to alive,
+      so it can be built on the render thread and compiled on a worker. The
+      render pass and pipeline layout it uses must live until the future is
+      done.
+    """
+
+    def __init__(self, logical_device, pipeline_cache=None, max_workers=2):
+        self.logical_device = logical_device
+        self.pipeline_cache = pipeline_cache
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='pipelinecompiler')
+        self.lock = threading.Lock()
+        self.thread_caches = {} # thread identifier: VkPipelineCache
+        self.queued = 0
+        self.max_queued = 0
+        self.compile_times = [] # (name, seconds)
+        self.failed = 0
+
+
+    def submit(self, createInfo, name='pipeline', feedback=None):
+        '''Queue a VkGraphicsPipelineCreateInfo for compilation and return the
+           Future of its VkPipeline. The compile time is also set on
+           feedback, a creationfeedback.CreationFeedback, if given.'''
+        with self.lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        return self.executor.submit(self._compile, createInfo, name, feedback)
+
+
+    def _compile(self, createInfo, name, feedback=None):
+        try:
+            cache = self._threadCache()
+            start = time.perf_counter()
+            pipeline = vkCreateGraphicsPipelines(
+                self.logical_device, cache, 1, [createInfo], None)
+            elapsed = time.perf_counter() - start
+        except VkError:
+            logging.error('Graphics pipeline {} failed to compile.'.format(
+                name))
+            with self.lock:
+                self.failed += 1
+            raise
+        finally:
+            with self.lock:
+                self.queued -= 1
+        with self.lock:
+            self.compile_times.append((name, elapsed))
+        if feedback is not None:
+            feedback.seconds = elapsed
+        logging.info('Compiled graphics pipeline {0} in {1:.3f} ms.'.format(
+            name, 1000. * elapsed))
+        return pipeline
+
+
+    def _threadCache(self):
+        '''Return the VkPipelineCache of the calling worker thread.'''
+        ident = threading.get_ident()
+        with self.lock:
+            cache = self.thread_caches.get(ident)
+            if cache is None and self.pipeline_cache:
+                cache = pc.createPipelineCache(self.logical_device,
+                                               self.pipeline_cache.data())
+                self.thread_caches[ident] = cache
+        return cache
+
+
+    def queueDepth(self):
+        '''Return the number of pipelines queued or being compiled.'''
+        with self.lock:
+            return self.queued
+
+
+    def mergeCaches(self):
+        '''Merge the worker caches into pipeline_cache, e.g. before it is
+           saved.'''
+        with self.lock:
+            caches = list(self.thread_caches.values())
+            if caches and self.pipeline_cache and self.pipeline_cache.handle:
+                vkMergePipelineCaches(self.logical_device,
+                                      self.pipeline_cache.handle,
+                                      len(caches), caches)
+
+
+    def stats(self):
+        '''Return the compile times and queue depths so far.'''
+        with self.lock:
+            times = [t for name, t in self.compile_times]
+            return {'compiled': len(times),
+                    'failed': self.failed,
+                    'mean_ms': 1000. * sum(times) / len(times) if times
+                               else 0.,
+                    'max_ms': 1000. * max(times) if times else 0.,
+                    'queue_depth': self.queued,
+                    'max_queue_depth': self.max_queued,
+                    'pipelines': [(name, 1000. * t)
+                                  for name, t in self.compile_times]}
+
+
+    def shutdown(self):
+        '''Wait for the queued compilations, merge the worker caches into
+           pipeline_cache and destroy them.'''
+        self.executor.shutdown(wait=True)
+        self.mergeCaches()
+        with self.lock:
+            for cache in self.thread_caches.values():
+                vkDestroyPipelineCache(self.logical_device, cache, None)
+            self.thread_caches = {}
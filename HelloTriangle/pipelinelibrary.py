@@ -0,0 +1,321 @@
+#!/bin/env python3
+
+''' Cache the variants of a graphics pipeline by their fixed-function state.
+
+Class & Functions:
+- BLEND_MODES
+- PipelineKey
+- pipelineKey
+- PipelineLibrary
+  - get
+  - request
+  - compiles
+  - collect
+  - pin
+  - unpin
+  - discard
+  - creationReport
+  - stats
+  - destroy
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import collections
+import concurrent.futures
+import logging
+import os
+import time
+from functools import partial
+
+# API
+from vulkan import *
+
+# Application Modules
+import creationfeedback as cf
+
+# Blend modes of the colour attachment:
+#   name: (blendEnable, srcColorBlendFactor, dstColorBlendFactor,
+#          srcAlphaBlendFactor, dstAlphaBlendFactor)
+# Both the colour and the alpha blend op are VK_BLEND_OP_ADD.
+BLEND_MODES = {
+    'opaque': (VK_FALSE, VK_BLEND_FACTOR_ONE, VK_BLEND_FACTOR_ZERO,
+               VK_BLEND_FACTOR_ONE, VK_BLEND_FACTOR_ZERO),
+    'alpha': (VK_TRUE, VK_BLEND_FACTOR_SRC_ALPHA,
+              VK_BLEND_FACTOR_ONE_MINUS_SRC_ALPHA,
+              VK_BLEND_FACTOR_ONE, VK_BLEND_FACTOR_ONE_MINUS_SRC_ALPHA),
+    'additive': (VK_TRUE, VK_BLEND_FACTOR_ONE, VK_BLEND_FACTOR_ONE,
+                 VK_BLEND_FACTOR_ONE, VK_BLEND_FACTOR_ONE),
+    }
+
+# The state that tells pipeline variants apart.
+# - shaders:           ((VkShaderStageFlagBits, SPIR-V path), ...)
+# - render_pass_class: the attachment formats of the render pass. Pipelines
+#                      can only be used with a compatible render pass.
+# - specialization:    ((VkShaderStageFlagBits, packed constants), ...), see
+#                      specialization.packConstants.
+# - vertex_input_rate: VkVertexInputRate of the vertex shader's inputs, see
+#                      spirvreflect.vertexInputDescription.
+PipelineKey = collections.namedtuple(
+    'PipelineKey', ['shaders', 'topology', 'polygon_mode', 'cull_mode',
+                    'front_face', 'blend', 'render_pass_class',
+                    'specialization', 'vertex_input_rate'])
+
+
+def pipelineKey(shaders, topology=VK_PRIMITIVE_TOPOLOGY_TRIANGLE_LIST,
+                polygon_mode=VK_POLYGON_MODE_FILL,
+                cull_mode=VK_CULL_MODE_BACK_BIT,
+                front_face=VK_FRONT_FACE_CLOCKWISE, blend='opaque',
+                render_pass_class=(), specialization=(),
+                vertex_input_rate=VK_VERTEX_INPUT_RATE_VERTEX):
+    '''Return the hashable PipelineKey of a pipeline variant.'''
+    if blend not in BLEND_MODES:
+        raise ValueError('Blend mode must be one of {}'.format(
+            sorted(BLEND_MODES)))
+    return PipelineKey(tuple(tuple(s) for s in shaders), topology,
+                       polygon_mode, cull_mode, front_face, blend,
+                       tuple(render_pass_class),
+                       tuple(sorted((stage, tuple(constants))
+                                    for stage, constants in specialization
+                                    if constants)),
+                       vertex_input_rate)
+
+
+class PipelineLibrary:
+    """ Class to create, share and evict the variants of a graphics pipeline.
+
+    Input Parameters:
+     logical_device - VkDevice that the pipelines are created on.
+     build          - function that returns the VkGraphicsPipelineCreateInfo
+                      of a PipelineKey.
+     compiler       - pipelinecompiler.PipelineCompiler for request().
+     pipeline_cache - pipelinecache.PipelineCache for get(), or None.
+     retire         - function that is given a list of functions to destroy
+                      pipelines once no frame in flight uses them. Defaults to
+                      destroying them at once.
+     max_pipelines  - handle budget: the number of pipelines kept.
+     creation_feedback - True if VK_EXT_pipeline_creation_feedback is enabled
+                      on logical_device, see creationReport().
+
+    Notes:
+    - Identical keys share one VkPipeline, and a key that is being compiled
+      is never compiled twice.
+    - Beyond max_pipelines, the least recently used pipelines are evicted,
+      except the pinned ones, i.e. those bound by recorded command buffers.
+    - Vulkan 1.0 does not report the memory used by a pipeline, so the
+      budget counts pipeline handles.
+    - All methods are called on the render thread. Compiled requests are
+      moved into the library by collect().
+    """
+
+    def __init__(self, logical_device, build, compiler, pipeline_cache=None,
+                 retire=None, max_pipelines=64, creation_feedback=False):
+        self.logical_device = logical_device
+        self.build = build
+        self.compiler = compiler
+        self.pipeline_cache = pipeline_cache
+        self.retire = retire if retire else self._destroyNow
+        self.max_pipelines = max_pipelines
+        self.creation_feedback = creation_feedback
+        self.pipelines = collections.OrderedDict() # PipelineKey: VkPipeline
+        self.pending = {}                          # PipelineKey: Future
+        self.pending_feedback = {}  # PipelineKey: cf.CreationFeedback
+        self.created = []           # cf.CreationFeedback of each compile
+        self.discarded = []                        # Futures to destroy
+        self.pins = collections.Counter()          # VkPipeline: pin count
+        self.orphans = set() # pinned pipelines that were discarded
+        self.compile_count = 0
+        self.hits = 0
+        self.deduped = 0
+        self.evictions = 0
+
+
+    def _destroyNow(self, destroy_functions):
+        for destroy in destroy_functions:
+            destroy()
+
+
+    def get(self, key):
+        '''Return the VkPipeline of key, compiling it on the calling thread if
+           it is neither cached nor being compiled.'''
+        self.collect()
+        if key in self.pipelines:
+            self.hits += 1
+            self.pipelines.move_to_end(key)
+            return self.pipelines[key]
+        if key in self.pending:
+            self.deduped += 1
+            self.pending[key].result()
+            self.collect()
+            return self.pipelines[key]
+
+        cache = self.pipeline_cache.handle if self.pipeline_cache else None
+        createInfo, feedback = self._build(key)
+        start = time.perf_counter()
+        pipeline = vkCreateGraphicsPipelines(
+            self.logical_device, cache, 1, [createInfo], None)
+        feedback.seconds = time.perf_counter() - start
+        self.created.append(feedback)
+        self.compile_count += 1
+        self._insert(key, pipeline)
+        return pipeline
+
+
+    def _build(self, key):
+        '''Return the VkGraphicsPipelineCreateInfo of key, with the
+           cf.CreationFeedback that records its creation.'''
+        feedback = cf.CreationFeedback(key, self._name(key),
+                                       self.creation_feedback)
+        return feedback.attach(self.build(key)), feedback
+
+
+    def request(self, key):
+        '''Return a Future of the VkPipeline of key, which is compiled in the
+           background if it is neither cached nor being compiled.'''
+        self.collect()
+        if key in self.pipelines:
+            self.hits += 1
+            self.pipelines.move_to_end(key)
+            future = concurrent.futures.Future()
+            future.set_result(self.pipelines[key])
+            return future
+        if key in self.pending:
+            self.deduped += 1
+            return self.pending[key]
+        createInfo, feedback = self._build(key)
+        future = self.compiler.submit(createInfo, self._name(key), feedback)
+        self.pending[key] = future
+        self.pending_feedback[key] = feedback
+        self.compile_count += 1
+        return future
+
+
+    def compiles(self):
+        '''Return the Futures of the compiles in flight, including those of
+           discarded pipelines.'''
+        return list(self.pending.values()) + self.discarded
+
+
+    def collect(self):
+        '''Move the compiled requests into the library, and destroy the
+           discarded ones.'''
+        for key in [k for k, f in self.pending.items() if f.done()]:
+            future = self.pending.pop(key)
+            feedback = self.pending_feedback.pop(key)
+            if future.exception() is None:
+                self.created.append(feedback)
+                self._insert(key, future.result())
+        for future in [f for f in self.discarded if f.done()]:
+            self.discarded.remove(future)
+            if future.exception() is None:
+                vkDestroyPipeline(self.logical_device, future.result(), None)
+
+
+    def _insert(self, key, pipeline):
+        self.pipelines[key] = pipeline
+        self._evict()
+
+
+    def _evict(self):
+        '''Evict least recently used, unpinned pipelines beyond the budget.'''
+        excess = len(self.pipelines) - self.max_pipelines
+        if excess <= 0:
+            return
+        for key in list(self.pipelines):
+            if excess <= 0:
+                break
+            pipeline = self.pipelines[key]
+            if self.pins[pipeline]:
+                continue
+            del self.pipelines[key]
+            self._retirePipeline(pipeline)
+            self.evictions += 1
+            excess -= 1
+        if excess > 0:
+            logging.warning('Pipeline library exceeds its budget of {0} by {1} '
+                            'pinned pipelines.'.format(self.max_pipelines,
+                                                       excess))
+
+
+    def _retirePipeline(self, pipeline):
+        self.retire([partial(vkDestroyPipeline, self.logical_device, pipeline,
+                             None)])
+
+
+    def pin(self, pipeline):
+        '''Keep pipeline from being evicted, e.g. while command buffers bind
+           it.'''
+        self.pins[pipeline] += 1
+
+
+    def unpin(self, pipeline):
+        '''Undo a pin(). A discarded pipeline is retired once unpinned.'''
+        self.pins[pipeline] -= 1
+        if self.pins[pipeline] <= 0:
+            del self.pins[pipeline]
+            if pipeline in self.orphans:
+                self.orphans.remove(pipeline)
+                self._retirePipeline(pipeline)
+            else:
+                self._evict()
+
+
+    def discard(self, predicate, wait=False):
+        '''Forget every pipeline whose key satisfies predicate(key), e.g. when
+           its shaders or render pass changed.
+
+        Notes:
+        - Unpinned pipelines are retired, pinned ones once they are unpinned.
+        - Pipelines still being compiled are destroyed once compiled. With
+          wait, this blocks until they are, e.g. before destroying the
+          render pass they are compiled against.'''
+        for key in [k for k in self.pending if predicate(k)]:
+            self.discarded.append(self.pending.pop(key))
+            self.pending_feedback.pop(key)
+        for key in [k for k in self.pipelines if predicate(k)]:
+            pipeline = self.pipelines.pop(key)
+            if self.pins[pipeline]:
+                self.orphans.add(pipeline)
+            else:
+                self._retirePipeline(pipeline)
+        if wait:
+            concurrent.futures.wait(self.discarded)
+        self.collect()
+
+
+    def _name(self, key):
+        return '+'.join(os.path.basename(path) for stage, path in key.shaders)
+
+
+    def creationReport(self):
+        '''Return the report of each pipeline compiled so far, in order, see
+           creationfeedback.CreationFeedback.report.'''
+        return [feedback.report() for feedback in self.created]
+
+
+    def stats(self):
+        '''Return the pipeline counts of the library.'''
+        return {'pipelines': len(self.pipelines),
+                'pending': len(self.pending),
+                'pinned': len(self.pins),
+                'compile_count': self.compile_count,
+                'hits': self.hits,
+                'deduped': self.deduped,
+                'evictions': self.evictions}
+
+
+    def destroy(self):
+        '''Destroy every pipeline at once. The device must be idle.'''
+        concurrent.futures.wait(list(self.pending.values()) + self.discarded)
+        self.collect()
+        pipelines = set(self.pipelines.values()) | self.orphans
+        for pipeline in pipelines:
+            vkDestroyPipeline(self.logical_device, pipeline, None)
+        if pipelines:
+            logging.info('Destroyed {} Vulkan Graphics Pipelines.'.format(
+                len(pipelines)))
+        self.pipelines.clear()
+        self.pins.clear()
+        self.orphans = set()
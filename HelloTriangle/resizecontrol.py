@@ -0,0 +1,105 @@
+#!/bin/env python3
+
+''' Coalesce and debounce the requests to recreate a Vulkan swapchain.
+
+Class & Functions:
+- ResizeController
+  - notify
+  - due
+  - timeUntilDue
+  - recreated
+  - frameSkipped
+  - stats
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import logging
+import time
+
+
+class ResizeController:
+    """ Class to decide when a swapchain should be recreated.
+
+    Input Parameters:
+     quiet_period - seconds without a new resize signal before the swapchain
+                    is recreated. 0 recreates on the next frame after a
+                    signal, but still at most once per frame.
+
+    Notes:
+    - Every source of a resize, i.e. SDL_WINDOWEVENT_SIZE_CHANGED,
+      VK_ERROR_OUT_OF_DATE_KHR and VK_SUBOPTIMAL_KHR, only calls notify().
+      The frame loop asks due() once per frame and recreates the swapchain
+      at most once, however many signals arrived in between.
+    - During an interactive drag-resize the window manager sends a stream of
+      size changes. Each signal restarts the quiet period, so the swapchain
+      is recreated once the drag pauses instead of on every event.
+    """
+
+    def __init__(self, quiet_period=0.1):
+        self.quiet_period = quiet_period
+        self.pending = False
+        self.reasons = set()
+        self.last_signal = None
+
+        self.signals = 0
+        self.recreations = 0
+        self.skipped_frames = 0
+        self.stall_time = 0.
+        self.max_stall = 0.
+        self.start = time.perf_counter()
+
+
+    def notify(self, reason):
+        '''Record that the swapchain no longer matches the surface.'''
+        self.pending = True
+        self.reasons.add(reason)
+        self.last_signal = time.perf_counter()
+        self.signals += 1
+
+
+    def due(self):
+        '''Return True if the swapchain should be recreated now.'''
+        return self.pending and \
+            time.perf_counter() - self.last_signal >= self.quiet_period
+
+
+    def timeUntilDue(self):
+        '''Return seconds until due() becomes True, or None if no resize is
+           pending.'''
+        if not self.pending:
+            return None
+        return max(0., self.quiet_period -
+                   (time.perf_counter() - self.last_signal))
+
+
+    def recreated(self, stall):
+        '''Record a swapchain recreation that stalled the frame loop for
+           stall seconds.'''
+        logging.info('Recreated swapchain after {0} signal(s) {1} in '
+                     '{2:.3f} ms.'.format(self.signals, sorted(self.reasons),
+                                          1000. * stall))
+        self.pending = False
+        self.reasons = set()
+        self.recreations += 1
+        self.stall_time += stall
+        self.max_stall = max(self.max_stall, stall)
+
+
+    def frameSkipped(self):
+        '''Record a frame that was skipped because the swapchain was unusable.'''
+        self.skipped_frames += 1
+
+
+    def stats(self):
+        '''Return the recreation count, rate and stall time so far.'''
+        elapsed = time.perf_counter() - self.start
+        return {'signals': self.signals,
+                'recreations': self.recreations,
+                'recreations_per_sec': self.recreations / elapsed if elapsed
+                                       else 0.,
+                'stall_ms': 1000. * self.stall_time,
+                'max_stall_ms': 1000. * self.max_stall,
+                'skipped_frames': self.skipped_frames}
@@ -9,6 +9,7 @@ Class & Functions:
   - _getVulkanSurfaceExtension
   - getWindowSize
   - getDrawableSize
+  - getRefreshRate
   - destroy 
 '''
 __author__ = 'sunbearc22'
@@ -195,6 +196,15 @@ class SetWindow:
         return dw, dh
 
 
+    def getRefreshRate(self):
+        '''Get the refresh rate (Hz) of the display of the SDL2 Window, or 0
+           if it is unknown.'''
+        mode = sdl2.SDL_DisplayMode()
+        if sdl2.SDL_GetWindowDisplayMode(self.window, ctypes.byref(mode)) != 0:
+            return 0
+        return mode.refresh_rate
+
+
     def destroy(self):
         '''Destroy and quit SDL2 window'''
         sdl2.SDL_DestroyWindow(self.window) # Close and destroy SDL2 window
@@ -7,6 +7,10 @@ out gl_PerVertex {
 
 layout(location = 0) out vec3 fragColor;
 
+// Specialization constants, set per graphics pipeline variant.
+layout(constant_id = 0) const float SCALE = 1.0;
+layout(constant_id = 1) const bool VERTEX_COLORS = true;
+
 vec2 positions[3] = vec2[](
     vec2(0.0, -0.5),
     vec2(0.5, 0.5),
@@ -20,6 +24,6 @@ vec3 colors[3] = vec3[](
 );
 
 void main() {
-    gl_Position = vec4(positions[gl_VertexIndex], 0.0, 1.0);
-    fragColor = colors[gl_VertexIndex];
+    gl_Position = vec4(SCALE * positions[gl_VertexIndex], 0.0, 1.0);
+    fragColor = VERTEX_COLORS ? colors[gl_VertexIndex] : vec3(1.0);
 }
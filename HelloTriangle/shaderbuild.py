@@ -0,0 +1,199 @@
+#!/bin/env python3
+
+''' Compile the GLSL shaders of a directory to SPIR-V, skipping those that
+have not changed since they were last compiled.
+
+Usage: python3 shaderbuild.py [directory] [--force]
+
+Class & Functions:
+- STAGES
+- findCompiler
+- outputPath
+- discover
+- buildShaders
+- report
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# File extensions of GLSL sources, as used by glslc and glslangValidator.
+STAGES = ['vert', 'tesc', 'tese', 'geom', 'frag', 'comp']
+MANIFEST = '.shaderbuild.json'
+
+
+def findCompiler():
+    '''Return the path of glslc or glslangValidator, or None.'''
+    for name in ('glslc', 'glslangValidator'):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def _command(compiler, source, output, flags):
+    if os.path.basename(compiler).startswith('glslc'):
+        return [compiler] + list(flags) + ['-o', output, source]
+    return [compiler, '-V'] + list(flags) + ['-o', output, source]
+
+
+def outputPath(source):
+    '''Return the SPIR-V file of a GLSL source.
+
+    Notes:
+    - shader.<stage> compiles to <stage>.spv, e.g. shader.vert to vert.spv,
+      as the HelloTriangle example expects.
+    - Any other <name>.<stage> compiles to <name>.<stage>.spv.'''
+    directory, filename = os.path.split(source)
+    stem, stage = os.path.splitext(filename)
+    if stem == 'shader':
+        return os.path.join(directory, stage[1:] + '.spv')
+    return source + '.spv'
+
+
+def discover(directory):
+    '''Return the GLSL sources of directory, sorted.'''
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                  if os.path.splitext(f)[1][1:] in STAGES)
+
+
+def _hash(source, compiler, flags):
+    '''Return the hash of a source's content, its compiler and flags.
+
+    #include-d files are not part of the hash; use force=True after
+    changing them.'''
+    h = hashlib.sha256()
+    with open(source, 'rb') as f:
+        h.update(f.read())
+    h.update(os.path.basename(compiler).encode())
+    for flag in flags:
+        h.update(b'\0' + flag.encode())
+    return h.hexdigest()
+
+
+def _compile(command):
+    '''Run one compiler command. Returns (seconds, returncode, output).
+       Runs in a worker process.'''
+    start = time.perf_counter()
+    result = subprocess.run(command, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT)
+    return (time.perf_counter() - start, result.returncode,
+            result.stdout.decode(errors='replace'))
+
+
+def _loadManifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _saveManifest(path, manifest):
+    '''Write the manifest atomically.'''
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def buildShaders(directory, flags=(), compiler=None, force=False,
+                 max_workers=None):
+    '''Compile the changed GLSL sources of directory to SPIR-V.
+
+    Returns a list with a dict per source: its source, output, status
+    ('compiled', 'failed', 'unchanged' or 'no compiler') and seconds.
+
+    Notes:
+    - A source is unchanged if the hash of its content, compiler and flags
+      matches the manifest, .shaderbuild.json in directory, and its output
+      exists.
+    - Changed sources are compiled in parallel in a process pool.
+    - Without glslc or glslangValidator, the existing SPIR-V files are kept.'''
+    directory = os.path.abspath(directory)
+    compiler = compiler if compiler else findCompiler()
+    manifest_path = os.path.join(directory, MANIFEST)
+    manifest = _loadManifest(manifest_path)
+    results = []
+    jobs = []
+    for source in discover(directory):
+        name = os.path.basename(source)
+        output = outputPath(source)
+        result = {'source': source, 'output': output, 'seconds': 0.}
+        results.append(result)
+        if compiler is None:
+            result['status'] = 'no compiler'
+            continue
+        digest = _hash(source, compiler, flags)
+        if not force and manifest.get(name) == digest and \
+           os.path.exists(output):
+            result['status'] = 'unchanged'
+            continue
+        jobs.append((result, digest,
+                     _command(compiler, source, output, flags)))
+
+    if compiler is None and results:
+        logging.warning('Neither glslc nor glslangValidator found: kept the '
+                        'existing SPIR-V files.')
+
+    if len(jobs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+            outcomes = list(executor.map(_compile, [j[2] for j in jobs]))
+    else:
+        outcomes = [_compile(j[2]) for j in jobs]
+
+    for (result, digest, command), (seconds, returncode, output) in \
+            zip(jobs, outcomes):
+        result['seconds'] = seconds
+        name = os.path.basename(result['source'])
+        if returncode == 0:
+            result['status'] = 'compiled'
+            manifest[name] = digest
+        else:
+            result['status'] = 'failed'
+            manifest.pop(name, None)
+            logging.error('{0} failed to compile:\n{1}'.format(name, output))
+
+    if jobs:
+        try:
+            _saveManifest(manifest_path, manifest)
+        except OSError as e:
+            logging.error('Shader build manifest failed to save: {}'.format(e))
+    return results
+
+
+def report(results):
+    '''Return the results of buildShaders as a table.'''
+    lines = ['{0:>24} {1:>12} {2:>10}'.format('shader', 'status', 'ms')]
+    for r in results:
+        lines.append('{0:>24} {1:>12} {2:>10.1f}'.format(
+            os.path.basename(r['source']), r['status'],
+            1000. * r['seconds']))
+    return '\n'.join(lines)
+
+
+def main():
+    args = [a for a in sys.argv[1:] if a != '--force']
+    directory = args[0] if args else \
+                os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    results = buildShaders(directory, force='--force' in sys.argv)
+    print(report(results))
+    print('Total: {:.1f} ms'.format(1000. * (time.perf_counter() - start)))
+    return 1 if any(r['status'] == 'failed' for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#!/bin/env python3
+
+''' Load SPIR-V shaders once and keep their Vulkan shader modules until
+they are reloaded, or for the lifetime of the logical device.
+
+Class & Functions:
+- ShaderModuleRegistry
+  - load
+  - forget
+  - refresh
+  - releaseStale
+  - reflection
+  - stats
+  - destroy
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import hashlib
+import logging
+import os
+from functools import partial
+
+# API
+from vulkan import *
+from vulkan import ffi
+
+# Application Modules
+import spirvreflect as sr
+
+
+class ShaderModuleRegistry:
+    """ Class to create and own the VkShaderModules of a logical device.
+
+    Input Parameters:
+     logical_device - VkDevice that the shader modules are created on.
+     optimizer      - spirvopt.SpirvOptimizer to optimise the SPIR-V with,
+                      or None.
+     retire         - function that is given a list of functions to destroy
+                      shader modules that were replaced by refresh().
+                      Defaults to destroying them at once.
+
+    Notes:
+    - A SPIR-V file is read into memory in one go, rather than mapped, as
+      an editor or compiler may be truncating it while it is reloaded.
+    - The SPIR-V is reflected, which checks that it is well formed, before
+      vkCreateShaderModule is given it. Invalid SPIR-V, or a module that
+      fails to create, raises ValueError, and nothing is cached.
+    - Modules are keyed by the SHA-256 of their SPIR-V, so identical shaders
+      under different file names share one VkShaderModule.
+    - A file that was loaded before is not read again, i.e. rebuilding a
+      pipeline does no file I/O and creates no shader modules. Call forget()
+      when a file has changed on disk.
+    - A module that refresh() replaced is stale: releaseStale() retires it
+      once the pipeline compiles that were in flight when it was replaced
+      are done, as a pipeline no longer needs its shader modules once
+      created. The other modules are destroyed by destroy(), before the
+      logical device.
+    - Each module is reflected when it is created, see reflection().
+    - With an optimizer, a module is created from the optimised binary of
+      its SPIR-V file, but keyed and reflected by the file itself, as the
+      optimiser may strip names.
+    """
+
+    def __init__(self, logical_device, optimizer=None, retire=None):
+        self.logical_device = logical_device
+        self.optimizer = optimizer
+        self.retire = retire if retire else self._destroyNow
+        self.modules = {} # SHA-256 hexdigest: VkShaderModule
+        self.paths = {}   # absolute path: SHA-256 hexdigest
+        self.stale = {}   # SHA-256 hexdigest: Futures it waits for, or None
+        self.files_read = 0
+        self.hits = 0
+        self.released = 0
+
+
+    def _destroyNow(self, destroy_functions):
+        for destroy in destroy_functions:
+            destroy()
+
+
+    def load(self, path):
+        '''Return the VkShaderModule of the SPIR-V file at path.'''
+        path = os.path.abspath(path)
+        digest = self.paths.get(path)
+        if digest is not None:
+            self.hits += 1
+            return self.modules[digest]
+
+        with open(path, 'rb') as f:
+            spirv = f.read()
+        if not spirv or len(spirv) % 4:
+            raise ValueError('{0} is not SPIR-V: its size, {1} bytes, '
+                             'is not a positive multiple of 4.'.format(
+                                 path, len(spirv)))
+        digest = hashlib.sha256(spirv).hexdigest()
+        if digest not in self.modules:
+            # Validate the SPIR-V before the driver sees it.
+            try:
+                reflection = sr.reflect(spirv, digest)
+            except ValueError as e:
+                raise ValueError('{0} is not valid SPIR-V: {1}'.format(path,
+                                                                      e))
+            if not reflection.entry_points:
+                raise ValueError('{} has no entry point.'.format(path))
+            optimized = None
+            if self.optimizer:
+                optimized = self.optimizer.optimize(
+                    spirv, digest, os.path.basename(path))
+            if optimized:
+                self.modules[digest] = self._loadModule(optimized, path)
+            else:
+                self.modules[digest] = self._createModule(spirv, path)
+        # A stale module is in use again, e.g. after an edit was undone.
+        self.stale.pop(digest, None)
+        self.files_read += 1
+        self.paths[path] = digest
+        return self.modules[digest]
+
+
+    def _loadModule(self, spirv_path, path):
+        '''Create the module of path from the SPIR-V file at spirv_path.'''
+        with open(spirv_path, 'rb') as f:
+            return self._createModule(f.read(), path)
+
+
+    def _createModule(self, spirv, path):
+        '''Create the module of path from spirv, its bytes. Raises ValueError
+           if it fails to create.'''
+        with ffi.from_buffer(spirv) as buf:
+            createInfo = VkShaderModuleCreateInfo(
+                codeSize = len(spirv),
+                pCode = ffi.cast('uint32_t *', buf))
+            try:
+                module = vkCreateShaderModule(self.logical_device,
+                                              createInfo, None)
+            except VkError as e:
+                raise ValueError('Shader module of {0} failed to create: '
+                                 '{1!r}'.format(path, e))
+        logging.info('Created shader module of {}.'.format(
+            os.path.basename(path)))
+        return module
+
+
+    def forget(self, path):
+        '''Read path again on its next load(), e.g. after it was rebuilt.
+           Its current module is kept, as pipelines may still use it.'''
+        self.paths.pop(os.path.abspath(path), None)
+
+
+    def refresh(self, path):
+        '''Read path again. Returns True if its content changed, i.e. the
+           pipelines that use it must be rebuilt. Its old module is then
+           stale, unless another file has the same content.'''
+        path = os.path.abspath(path)
+        old = self.paths.get(path)
+        self.forget(path)
+        try:
+            self.load(path)
+        except (OSError, ValueError):
+            # Keep the current module, e.g. of a file that is being written.
+            if old is not None:
+                self.paths[path] = old
+            raise
+        changed = self.paths[path] != old
+        if changed and old is not None and old not in self.paths.values():
+            self.stale[old] = None
+        return changed
+
+
+    def releaseStale(self, compiles=()):
+        '''Retire the stale modules whose compiles are done.
+
+        compiles are the Futures of the pipeline compiles in flight. A module
+        that became stale since the last call waits for those; the modules
+        of the compiles started after it became stale are not stale.
+        Returns the number of modules retired.'''
+        destroy_functions = []
+        for digest, waits in list(self.stale.items()):
+            if waits is None:
+                waits = self.stale[digest] = [f for f in compiles
+                                              if not f.done()]
+            if all(f.done() for f in waits):
+                del self.stale[digest]
+                destroy_functions.append(partial(
+                    vkDestroyShaderModule, self.logical_device,
+                    self.modules.pop(digest), None))
+        if destroy_functions:
+            self.retire(destroy_functions)
+            self.released += len(destroy_functions)
+            logging.info('Retired {} stale shader modules.'.format(
+                len(destroy_functions)))
+        return len(destroy_functions)
+
+
+    def reflection(self, path):
+        '''Return the spirvreflect.Reflection of a loaded SPIR-V file.'''
+        return sr.reflect(None, self.paths[os.path.abspath(path)])
+
+
+    def stats(self):
+        '''Return the number of modules, files read, cache hits and stale
+           modules released.'''
+        return {'modules': len(self.modules),
+                'files_read': self.files_read,
+                'hits': self.hits,
+                'stale': len(self.stale),
+                'released': self.released}
+
+
+    def destroy(self):
+        '''Destroy every shader module.'''
+        for module in self.modules.values():
+            vkDestroyShaderModule(self.logical_device, module, None)
+        if self.modules:
+            logging.info('Destroyed {} Vulkan Shader Modules.'.format(
+                len(self.modules)))
+        self.modules = {}
+        self.paths = {}
+        self.stale = {}
@@ -0,0 +1,149 @@
+#!/bin/env python3
+
+''' Notice changed shader files, with inotify on Linux or by polling their
+modification times elsewhere.
+
+Class & Functions:
+- ShaderWatcher
+  - changes
+  - close
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import time
+
+# Application Modules
+import shaderbuild as sb
+
+EXTENSIONS = ['.spv'] + ['.' + stage for stage in sb.STAGES]
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII') # wd, mask, cookie, len
+
+
+def _inotify():
+    '''Return libc if it has inotify, or None.'''
+    name = ctypes.util.find_library('c')
+    if not name:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class ShaderWatcher:
+    """ Class to report the shader files of a directory that were written.
+
+    Input Parameters:
+     directory     - directory of the shaders.
+     poll_interval - seconds between scans when polling.
+     use_inotify   - use inotify if available; False forces polling.
+
+    Notes:
+    - changes() never blocks, so the frame loop can call it every frame.
+    - inotify reports a file once it is closed after writing, or renamed
+      into the directory, as editors and compilers do when they save. So a
+      half-written file is not reported.
+    - Polling compares modification times and sizes, at most every
+      poll_interval seconds.
+    """
+
+    def __init__(self, directory, poll_interval=0.5, use_inotify=True):
+        self.directory = os.path.abspath(directory)
+        self.poll_interval = poll_interval
+        self.fd = None
+        self.closed = False
+        self.libc = _inotify() if use_inotify else None
+        if self.libc:
+            fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0 and self.libc.inotify_add_watch(
+                    fd, self.directory.encode(),
+                    IN_CLOSE_WRITE | IN_MOVED_TO) >= 0:
+                self.fd = fd
+            elif fd >= 0:
+                os.close(fd)
+        if self.fd is None:
+            self.last_poll = time.perf_counter()
+            self.stamps = self._scan()
+        logging.info('Watching shaders in {0} by {1}.'.format(
+            self.directory, 'inotify' if self.fd is not None else 'polling'))
+
+
+    def _watched(self, name):
+        return os.path.splitext(name)[1] in EXTENSIONS
+
+
+    def _scan(self):
+        stamps = {}
+        for name in os.listdir(self.directory):
+            if self._watched(name):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                stamps[name] = (st.st_mtime_ns, st.st_size)
+        return stamps
+
+
+    def changes(self):
+        '''Return the set of paths of shader files written since the last
+           call.'''
+        if self.closed:
+            return set()
+        if self.fd is not None:
+            return self._readEvents()
+        now = time.perf_counter()
+        if now - self.last_poll < self.poll_interval:
+            return set()
+        self.last_poll = now
+        stamps = self._scan()
+        changed = {os.path.join(self.directory, name)
+                   for name, stamp in stamps.items()
+                   if self.stamps.get(name) != stamp}
+        self.stamps = stamps
+        return changed
+
+
+    def _readEvents(self):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(
+                    data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0').decode(
+                    errors='replace')
+                offset += length
+                if name and self._watched(name):
+                    changed.add(os.path.join(self.directory, name))
+        return changed
+
+
+    def close(self):
+        '''Stop watching.'''
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.closed = True
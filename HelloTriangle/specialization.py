@@ -0,0 +1,99 @@
+#!/bin/env python3
+
+''' Pack the specialization constants of a shader stage, so that pipeline
+variants can share one SPIR-V file.
+
+Class & Functions:
+- packConstants
+- specializationInfo
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Third-party modules
+import numpy as np
+
+# API
+from vulkan import *
+from vulkan import ffi
+
+# Little-endian NumPy type of a reflected (base_type, width). A bool
+# specialization constant is a VkBool32.
+DTYPES = {('bool', 32): '<u4',
+          ('int', 32): '<i4', ('int', 64): '<i8',
+          ('uint', 32): '<u4', ('uint', 64): '<u8',
+          ('float', 32): '<f4', ('float', 64): '<f8'}
+
+
+def _items(values):
+    '''Return the (name or constant ID, value) pairs of a dict or of a NumPy
+       structured record.'''
+    if isinstance(values, np.ndarray):
+        if values.size != 1:
+            raise ValueError('A NumPy record of specialization constants '
+                             'must hold one element, not {}.'.format(
+                                 values.size))
+        values = values.reshape(())[()]
+    if isinstance(values, np.void):
+        if values.dtype.names is None:
+            raise ValueError('A NumPy record of specialization constants '
+                             'must have a structured dtype.')
+        return [(name, values[name]) for name in values.dtype.names]
+    return list(dict(values).items())
+
+
+def packConstants(values, reflection):
+    '''Return the hashable specialization of a shader stage: a sorted tuple
+       of (constant ID, bytes) pairs.
+
+    Input Parameters:
+     values     - dict, or NumPy structured record, of the constants' values
+                  by name or constant ID.
+     reflection - spirvreflect.Reflection of the stage's shader.
+
+    Notes:
+    - Each value is converted to the type the shader declares, so equal
+      values given as, e.g., 1 or 1.0, by name or by ID, pack alike and
+      hence share one pipeline variant.
+    - Raises ValueError for a constant the shader does not declare.'''
+    constants = {}
+    for c in reflection.spec_constants:
+        constants[c.spec_id] = c
+        if c.name:
+            constants[c.name] = c
+    packed = {}
+    for name, value in _items(values):
+        c = constants.get(name)
+        if c is None:
+            raise ValueError('The shader has no specialization constant {0}; '
+                             'it has {1}.'.format(
+                                 repr(name), sorted(
+                                     (s.spec_id, s.name)
+                                     for s in reflection.spec_constants)))
+        dtype = DTYPES[(c.base_type, c.width)]
+        if c.base_type == 'bool':
+            value = VK_TRUE if value else VK_FALSE
+        packed[c.spec_id] = np.array(value, dtype=dtype).tobytes()
+    return tuple(sorted(packed.items()))
+
+
+def specializationInfo(constants):
+    '''Return the VkSpecializationInfo of packed constants, see
+       packConstants, or None if there are none.'''
+    if not constants:
+        return None
+    map_entries = []
+    offset = 0
+    for spec_id, value in constants:
+        map_entries.append(VkSpecializationMapEntry(
+            constantID = spec_id,
+            offset = offset,
+            size = len(value)))
+        offset += len(value)
+    data = b''.join(value for spec_id, value in constants)
+    return VkSpecializationInfo(
+        mapEntryCount = len(map_entries),
+        pMapEntries = map_entries,
+        dataSize = len(data),
+        pData = ffi.new('char[]', data))
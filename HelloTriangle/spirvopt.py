@@ -0,0 +1,124 @@
+#!/bin/env python3
+
+''' Optimise SPIR-V with spirv-opt, if it is installed, and cache the
+optimised binaries on disk by the hash of their input.
+
+Class & Functions:
+- FLAGS
+- findOptimizer
+- SpirvOptimizer
+  - optimize
+  - stats
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+# Application Modules
+import pipelinecache as pc
+
+# spirv-opt's performance passes.
+FLAGS = ('-O',)
+
+
+def findOptimizer():
+    '''Return the path of spirv-opt, or None.'''
+    return shutil.which('spirv-opt')
+
+
+class SpirvOptimizer:
+    """ Class to optimise SPIR-V modules, once per input.
+
+    Input Parameters:
+     tool      - path of spirv-opt.
+     flags     - spirv-opt passes, e.g. FLAGS.
+     cache_dir - directory of the optimised binaries. Defaults to spirv-opt
+                 in pipelinecache.defaultCacheDir().
+
+    Notes:
+    - An optimised binary is named by the hash of its input SPIR-V, the
+      flags and the version of spirv-opt, so a changed shader, or another
+      spirv-opt, is optimised again, and an unchanged one never is.
+    - The input is piped to spirv-opt, so the file that was hashed is the
+      one that is optimised even if it is being rewritten.
+    - optimize() returns None if spirv-opt fails; the caller then uses the
+      unoptimised SPIR-V.
+    """
+
+    def __init__(self, tool, flags=FLAGS, cache_dir=None):
+        self.tool = tool
+        self.flags = tuple(flags)
+        self.cache_dir = cache_dir if cache_dir else \
+                         os.path.join(pc.defaultCacheDir(), 'spirv-opt')
+        self.version = subprocess.run(
+            [tool, '--version'], stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT).stdout.split(b'\n')[0]
+        self.optimized = 0
+        self.hits = 0
+        self.failed = 0
+        self.seconds = 0.
+
+
+    def _cachePath(self, digest):
+        h = hashlib.sha256(digest.encode())
+        h.update(self.version)
+        for flag in self.flags:
+            h.update(b'\0' + flag.encode())
+        return os.path.join(self.cache_dir, h.hexdigest() + '.spv')
+
+
+    def optimize(self, spirv, digest, name='shader'):
+        '''Return the path of the optimised binary of spirv, a bytes-like
+           object whose SHA-256 hexdigest is digest, or None if spirv-opt
+           failed.'''
+        path = self._cachePath(digest)
+        if os.path.exists(path):
+            self.hits += 1
+            return path
+
+        start = time.perf_counter()
+        result = subprocess.run([self.tool] + list(self.flags) +
+                                ['-', '-o', '-'], input=bytes(spirv),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0 or not result.stdout:
+            self.failed += 1
+            logging.error('spirv-opt failed to optimise {0}:\n{1}'.format(
+                name, result.stderr.decode(errors='replace')))
+            return None
+        self.seconds += elapsed
+
+        # Write the binary atomically, so that a crash never leaves a
+        # truncated one in the cache.
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(result.stdout)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.failed += 1
+            logging.error('Optimised {0} failed to save: {1}'.format(name, e))
+            return None
+        self.optimized += 1
+        logging.info('Optimised {0} from {1} to {2} bytes in {3:.1f} ms.'.format(
+            name, len(spirv), len(result.stdout), 1000. * elapsed))
+        return path
+
+
+    def stats(self):
+        '''Return the number of shaders optimised, cache hits and failures.'''
+        return {'optimized': self.optimized,
+                'hits': self.hits,
+                'failed': self.failed,
+                'optimize_ms': 1000. * self.seconds}
@@ -0,0 +1,426 @@
+#!/bin/env python3
+
+''' Reflect SPIR-V modules, i.e. find their entry points, interface
+variables, descriptor bindings, push constants and specialization constants,
+to derive pipeline layouts and vertex input descriptions from them.
+
+Class & Functions:
+- Reflection
+- reflect
+- layoutDescription
+- vertexInputDescription
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import collections
+import hashlib
+
+# Third-party modules
+import numpy as np
+
+# API
+from vulkan import *
+
+SPIRV_MAGIC = 0x07230203
+HEADER_WORDS = 5
+
+# Opcodes
+OP_NAME = 5
+OP_ENTRY_POINT = 15
+OP_TYPE_BOOL = 20
+OP_TYPE_INT = 21
+OP_TYPE_FLOAT = 22
+OP_TYPE_VECTOR = 23
+OP_TYPE_MATRIX = 24
+OP_TYPE_IMAGE = 25
+OP_TYPE_SAMPLER = 26
+OP_TYPE_SAMPLED_IMAGE = 27
+OP_TYPE_ARRAY = 28
+OP_TYPE_RUNTIME_ARRAY = 29
+OP_TYPE_STRUCT = 30
+OP_TYPE_POINTER = 32
+OP_CONSTANT = 43
+OP_SPEC_CONSTANT_TRUE = 48
+OP_SPEC_CONSTANT_FALSE = 49
+OP_SPEC_CONSTANT = 50
+OP_VARIABLE = 59
+OP_DECORATE = 71
+OP_MEMBER_DECORATE = 72
+
+# Decorations
+DECORATION_SPEC_ID = 1
+DECORATION_BUFFER_BLOCK = 3
+DECORATION_ARRAY_STRIDE = 6
+DECORATION_MATRIX_STRIDE = 7
+DECORATION_LOCATION = 30
+DECORATION_BINDING = 33
+DECORATION_DESCRIPTOR_SET = 34
+DECORATION_OFFSET = 35
+
+# Storage classes
+STORAGE_UNIFORM_CONSTANT = 0
+STORAGE_INPUT = 1
+STORAGE_UNIFORM = 2
+STORAGE_OUTPUT = 3
+STORAGE_PUSH_CONSTANT = 9
+STORAGE_STORAGE_BUFFER = 12
+
+# Image dimensions
+DIM_BUFFER = 5
+DIM_SUBPASS_DATA = 6
+
+EXECUTION_MODELS = {0: VK_SHADER_STAGE_VERTEX_BIT,
+                    1: VK_SHADER_STAGE_TESSELLATION_CONTROL_BIT,
+                    2: VK_SHADER_STAGE_TESSELLATION_EVALUATION_BIT,
+                    3: VK_SHADER_STAGE_GEOMETRY_BIT,
+                    4: VK_SHADER_STAGE_FRAGMENT_BIT,
+                    5: VK_SHADER_STAGE_COMPUTE_BIT}
+
+# Vertex attribute formats: (base_type, components): VkFormat, of 32-bit
+# scalars.
+VERTEX_FORMATS = {
+    ('float', 1): VK_FORMAT_R32_SFLOAT,
+    ('float', 2): VK_FORMAT_R32G32_SFLOAT,
+    ('float', 3): VK_FORMAT_R32G32B32_SFLOAT,
+    ('float', 4): VK_FORMAT_R32G32B32A32_SFLOAT,
+    ('int', 1): VK_FORMAT_R32_SINT,
+    ('int', 2): VK_FORMAT_R32G32_SINT,
+    ('int', 3): VK_FORMAT_R32G32B32_SINT,
+    ('int', 4): VK_FORMAT_R32G32B32A32_SINT,
+    ('uint', 1): VK_FORMAT_R32_UINT,
+    ('uint', 2): VK_FORMAT_R32G32_UINT,
+    ('uint', 3): VK_FORMAT_R32G32B32_UINT,
+    ('uint', 4): VK_FORMAT_R32G32B32A32_UINT,
+    }
+
+# - entry_points:        [(name, VkShaderStageFlagBits)]
+# - inputs, outputs:     [Variable] with a Location, sorted by location
+# - descriptor_bindings: [DescriptorBinding], sorted by set and binding
+# - push_constant_size:  bytes of the push constant block, 0 if none
+# - spec_constants:      [SpecConstant], sorted by constant ID
+Reflection = collections.namedtuple(
+    'Reflection', ['entry_points', 'inputs', 'outputs', 'descriptor_bindings',
+                   'push_constant_size', 'spec_constants'])
+Variable = collections.namedtuple(
+    'Variable', ['location', 'name', 'base_type', 'width', 'components',
+                 'columns'])
+DescriptorBinding = collections.namedtuple(
+    'DescriptorBinding', ['set', 'binding', 'descriptor_type', 'count',
+                          'name'])
+SpecConstant = collections.namedtuple(
+    'SpecConstant', ['spec_id', 'name', 'base_type', 'width', 'default'])
+
+_cache = {} # SHA-256 hexdigest: Reflection
+
+
+def _words(data):
+    '''Return the SPIR-V words of data as a uint32 array in native order.'''
+    if len(data) % 4 or len(data) < 4 * HEADER_WORDS:
+        raise ValueError('SPIR-V must be a whole number of words, with a '
+                         'header.')
+    words = np.frombuffer(data, dtype='<u4')
+    if words[0] == SPIRV_MAGIC:
+        return words
+    words = np.frombuffer(data, dtype='>u4')
+    if words[0] == SPIRV_MAGIC:
+        return words
+    raise ValueError('Not SPIR-V: wrong magic number.')
+
+
+def _instructionStarts(words):
+    '''Return the word index of every instruction.
+
+    Notes:
+    - The index of an instruction is only known from the word counts of all
+      instructions before it. Instead of following them one by one in
+      Python, next[i] = i + wordcount(i) is composed with itself, so
+      jumps[k][i] is the index 2**k instructions after i. Applying every
+      jump to the start of the stream gives all instruction starts in
+      O(log n) NumPy operations.'''
+    n = len(words)
+    counts = (words >> 16).astype(np.int64)
+    following = np.arange(n + 1, dtype=np.int64)
+    following[:n] = np.minimum(following[:n] + np.maximum(counts, 1), n)
+    jumps = [following]
+    while (1 << len(jumps)) < n:
+        jumps.append(jumps[-1][jumps[-1]])
+    starts = np.array([HEADER_WORDS], dtype=np.int64)
+    for jump in jumps:
+        starts = np.concatenate((starts, jump[starts]))
+    starts = np.unique(starts)
+    starts = starts[starts < n]
+    if (counts[starts] == 0).any() or (starts + counts[starts] > n).any():
+        raise ValueError('Malformed SPIR-V instruction stream.')
+    return starts
+
+
+def _string(words, start, end):
+    '''Return the nul-terminated literal string in words[start:end].'''
+    return words[start:end].astype('<u4').tobytes().split(b'\0', 1)[0] \
+        .decode(errors='replace')
+
+
+def reflect(data, digest=None):
+    '''Return the Reflection of a SPIR-V module.
+
+    data is its bytes (or any buffer), and digest its SHA-256 hexdigest if
+    already known. Results are cached by digest.'''
+    if digest is None:
+        digest = hashlib.sha256(data).hexdigest()
+    reflection = _cache.get(digest)
+    if reflection is None:
+        reflection = _reflect(_words(data))
+        _cache[digest] = reflection
+    return reflection
+
+
+def _reflect(words):
+    starts = _instructionStarts(words)
+    first = words[starts]
+    opcodes = first & 0xFFFF
+    lengths = (first >> 16).astype(np.int64)
+
+    def ops(opcode):
+        mask = opcodes == opcode
+        return starts[mask], lengths[mask]
+
+    def fields(opcode, *offsets):
+        '''Return the words at offsets of every opcode instruction, as lists,
+           with 0 where an instruction is too short.'''
+        idx, length = ops(opcode)
+        return [np.where(length > k, words[np.minimum(idx + k, len(words) - 1)],
+                         0).tolist() for k in offsets]
+
+    # Decorations
+    targets, decorations, literals = fields(OP_DECORATE, 1, 2, 3)
+    decorated = collections.defaultdict(dict) # id: {decoration: literal}
+    for target, decoration, literal in zip(targets, decorations, literals):
+        decorated[target][decoration] = literal
+    structs, members, decorations, literals = fields(OP_MEMBER_DECORATE,
+                                                     1, 2, 3, 4)
+    member_decorated = collections.defaultdict(dict)
+    for struct, member, decoration, literal in zip(structs, members,
+                                                   decorations, literals):
+        member_decorated[(struct, member)][decoration] = literal
+
+    # Names, decoded only when needed.
+    idx, length = ops(OP_NAME)
+    name_spans = dict(zip(words[idx + 1].tolist(),
+                          zip((idx + 2).tolist(), (idx + length).tolist())))
+
+    def name(target):
+        span = name_spans.get(target)
+        return _string(words, *span) if span else ''
+
+    # Types
+    types = {}
+    for tid in fields(OP_TYPE_BOOL, 1)[0]:
+        types[tid] = ('bool', 32)
+    for tid, width, signed in zip(*fields(OP_TYPE_INT, 1, 2, 3)):
+        types[tid] = ('int' if signed else 'uint', width)
+    for tid, width in zip(*fields(OP_TYPE_FLOAT, 1, 2)):
+        types[tid] = ('float', width)
+    for tid, component, count in zip(*fields(OP_TYPE_VECTOR, 1, 2, 3)):
+        types[tid] = ('vector', component, count)
+    for tid, column, count in zip(*fields(OP_TYPE_MATRIX, 1, 2, 3)):
+        types[tid] = ('matrix', column, count)
+    for tid, dim, sampled in zip(*fields(OP_TYPE_IMAGE, 1, 3, 7)):
+        types[tid] = ('image', dim, sampled)
+    for tid in fields(OP_TYPE_SAMPLER, 1)[0]:
+        types[tid] = ('sampler',)
+    for tid in fields(OP_TYPE_SAMPLED_IMAGE, 1)[0]:
+        types[tid] = ('sampled_image',)
+    for tid, element, length_id in zip(*fields(OP_TYPE_ARRAY, 1, 2, 3)):
+        types[tid] = ('array', element, length_id)
+    for tid, element in zip(*fields(OP_TYPE_RUNTIME_ARRAY, 1, 2)):
+        types[tid] = ('runtime_array', element)
+    idx, length = ops(OP_TYPE_STRUCT)
+    for i, n in zip(idx.tolist(), length.tolist()):
+        types[int(words[i + 1])] = ('struct',
+                                    tuple(words[i + 2:i + n].tolist()))
+    pointers = {}
+    for tid, storage, pointee in zip(*fields(OP_TYPE_POINTER, 1, 2, 3)):
+        pointers[tid] = (storage, pointee)
+    constants = dict(zip(*fields(OP_CONSTANT, 2, 3))) # id: value
+
+    def scalar(tid):
+        '''Return (base_type, width, components, columns) of a scalar,
+           vector or matrix type.'''
+        t = types[tid]
+        if t[0] == 'matrix':
+            base, width, components, _ = scalar(t[1])
+            return base, width, components, t[2]
+        if t[0] == 'vector':
+            base, width, _, _ = scalar(t[1])
+            return base, width, t[2], 1
+        if t[0] == 'array':
+            return scalar(t[1])
+        return t[0], t[1], 1, 1
+
+    def size(tid):
+        '''Return the size in bytes of a type, by its explicit layout.'''
+        t = types[tid]
+        if t[0] in ('bool', 'int', 'uint', 'float'):
+            return t[1] // 8
+        if t[0] == 'vector':
+            return size(t[1]) * t[2]
+        if t[0] == 'matrix':
+            return size(t[1]) * t[2]
+        if t[0] == 'array':
+            stride = decorated[tid].get(DECORATION_ARRAY_STRIDE, size(t[1]))
+            return stride * constants.get(t[2], 1)
+        if t[0] == 'struct':
+            end = 0
+            for member, mid in enumerate(t[1]):
+                decoration = member_decorated[(tid, member)]
+                msize = size(mid)
+                if types[mid][0] == 'matrix' and \
+                   DECORATION_MATRIX_STRIDE in decoration:
+                    msize = decoration[DECORATION_MATRIX_STRIDE] * \
+                            types[mid][2]
+                end = max(end, decoration.get(DECORATION_OFFSET, end) + msize)
+            return end
+        return 0
+
+    # Entry points
+    entry_points = []
+    idx, length = ops(OP_ENTRY_POINT)
+    for i, n in zip(idx.tolist(), length.tolist()):
+        stage = EXECUTION_MODELS.get(int(words[i + 1]))
+        if stage is not None:
+            entry_points.append((_string(words, i + 3, i + n), stage))
+
+    # Variables
+    inputs, outputs, bindings = [], [], []
+    push_constant_size = 0
+    for type_id, vid, storage in zip(*fields(OP_VARIABLE, 1, 2, 3)):
+        pointee = pointers.get(type_id, (storage, None))[1]
+        decoration = decorated[vid]
+        if storage in (STORAGE_INPUT, STORAGE_OUTPUT):
+            if DECORATION_LOCATION not in decoration or pointee not in types:
+                continue # built-in
+            variable = Variable(decoration[DECORATION_LOCATION], name(vid),
+                                *scalar(pointee))
+            (inputs if storage == STORAGE_INPUT else outputs).append(variable)
+        elif storage == STORAGE_PUSH_CONSTANT:
+            push_constant_size = max(push_constant_size, size(pointee))
+        elif storage in (STORAGE_UNIFORM_CONSTANT, STORAGE_UNIFORM,
+                         STORAGE_STORAGE_BUFFER):
+            if DECORATION_BINDING not in decoration:
+                continue
+            count = 1
+            while types[pointee][0] in ('array', 'runtime_array'):
+                if types[pointee][0] == 'array':
+                    count *= constants.get(types[pointee][2], 1)
+                pointee = types[pointee][1]
+            kind = types[pointee]
+            if kind[0] == 'sampled_image':
+                descriptor_type = VK_DESCRIPTOR_TYPE_COMBINED_IMAGE_SAMPLER
+            elif kind[0] == 'sampler':
+                descriptor_type = VK_DESCRIPTOR_TYPE_SAMPLER
+            elif kind[0] == 'image' and kind[1] == DIM_SUBPASS_DATA:
+                descriptor_type = VK_DESCRIPTOR_TYPE_INPUT_ATTACHMENT
+            elif kind[0] == 'image' and kind[1] == DIM_BUFFER:
+                descriptor_type = VK_DESCRIPTOR_TYPE_STORAGE_TEXEL_BUFFER \
+                    if kind[2] == 2 else VK_DESCRIPTOR_TYPE_UNIFORM_TEXEL_BUFFER
+            elif kind[0] == 'image':
+                descriptor_type = VK_DESCRIPTOR_TYPE_STORAGE_IMAGE \
+                    if kind[2] == 2 else VK_DESCRIPTOR_TYPE_SAMPLED_IMAGE
+            elif storage == STORAGE_STORAGE_BUFFER or \
+                 DECORATION_BUFFER_BLOCK in decorated[pointee]:
+                descriptor_type = VK_DESCRIPTOR_TYPE_STORAGE_BUFFER
+            else:
+                descriptor_type = VK_DESCRIPTOR_TYPE_UNIFORM_BUFFER
+            bindings.append(DescriptorBinding(
+                decoration.get(DECORATION_DESCRIPTOR_SET, 0),
+                decoration[DECORATION_BINDING], descriptor_type, count,
+                name(vid)))
+
+    # Specialization constants
+    spec_constants = []
+    for opcode in (OP_SPEC_CONSTANT_TRUE, OP_SPEC_CONSTANT_FALSE,
+                   OP_SPEC_CONSTANT):
+        idx, length = ops(opcode)
+        for i, n in zip(idx.tolist(), length.tolist()):
+            type_id, cid = int(words[i + 1]), int(words[i + 2])
+            if DECORATION_SPEC_ID not in decorated[cid]:
+                continue
+            base, width = types[type_id][:2]
+            if opcode != OP_SPEC_CONSTANT:
+                default = opcode == OP_SPEC_CONSTANT_TRUE
+            else:
+                value = words[i + 3:i + n].astype('<u4')
+                dtype = {'float': 'f', 'int': 'i', 'uint': 'u'}[base]
+                default = value.view('<{0}{1}'.format(
+                    dtype, len(value) * 4))[0].item()
+            spec_constants.append(SpecConstant(
+                decorated[cid][DECORATION_SPEC_ID], name(cid), base, width,
+                default))
+
+    return Reflection(entry_points, sorted(inputs), sorted(outputs),
+                      sorted(bindings), push_constant_size,
+                      sorted(spec_constants))
+
+
+def _stageFlags(reflection):
+    flags = 0
+    for name, stage in reflection.entry_points:
+        flags |= stage
+    return flags
+
+
+def layoutDescription(reflections):
+    '''Return the hashable description of the pipeline layout of a pipeline
+       whose shader stages have the given Reflections.
+
+    Returns (sets, push_constant_ranges) where
+    - sets is a tuple of descriptor sets 0, 1, ... up to the highest set
+      used, each a tuple of (binding, descriptor_type, count, stage_flags).
+    - push_constant_ranges is a tuple of (stage_flags, offset, size), with a
+      single range over every stage that uses push constants.'''
+    merged = {} # (set, binding): [descriptor_type, count, stage_flags]
+    push_flags, push_size = 0, 0
+    for reflection in reflections:
+        flags = _stageFlags(reflection)
+        for b in reflection.descriptor_bindings:
+            entry = merged.setdefault((b.set, b.binding),
+                                      [b.descriptor_type, b.count, 0])
+            entry[1] = max(entry[1], b.count)
+            entry[2] |= flags
+        if reflection.push_constant_size:
+            push_flags |= flags
+            push_size = max(push_size, reflection.push_constant_size)
+
+    set_count = max([s for s, b in merged] + [-1]) + 1
+    sets = tuple(tuple((binding,) + tuple(merged[(s, binding)])
+                       for ss, binding in sorted(merged) if ss == s)
+                 for s in range(set_count))
+    push_constant_ranges = ((push_flags, 0, push_size),) if push_size else ()
+    return sets, push_constant_ranges
+
+
+def vertexInputDescription(reflection, binding=0,
+                           input_rate=VK_VERTEX_INPUT_RATE_VERTEX):
+    '''Return the vertex input of a vertex shader's Reflection, with all of
+       its inputs interleaved in one vertex buffer binding, that advances per
+       vertex or, with VK_VERTEX_INPUT_RATE_INSTANCE, per instance.
+
+    Returns (bindings, attributes) where
+    - bindings is a tuple of (binding, stride, VkVertexInputRate), empty if
+      the shader has no inputs.
+    - attributes is a tuple of (location, binding, VkFormat, offset). A
+      matrix input takes one location per column.'''
+    attributes = []
+    offset = 0
+    for v in reflection.inputs:
+        vertex_format = VERTEX_FORMATS[(v.base_type, v.components)]
+        for column in range(v.columns):
+            attributes.append((v.location + column, binding, vertex_format,
+                               offset))
+            offset += v.width // 8 * v.components
+    if not attributes:
+        return (), ()
+    return ((binding, offset, input_rate),), tuple(attributes)
@@ -0,0 +1,174 @@
+#!/bin/env python3
+
+''' Cache the Vulkan surface queries needed to (re)create a swapchain.
+
+Class & Functions:
+- PRESENT_PROFILES
+- pickSurfaceFormat
+- pickPresentMode
+- pickImageCount
+- SurfaceInfoCache
+  - capabilities
+  - surfaceFormat
+  - presentMode
+  - invalidate
+'''
+__author__ = 'sunbearc22'
+__version__ = "0.1.0"
+__license__ = "MIT"
+
+# Python3 modules
+import logging
+
+# API
+from vulkan import *
+
+# Presentation profiles:
+#   name: (present modes in order of preference, images above minImageCount)
+# - low_latency:    MAILBOX shows the newest image at the next vertical blank
+#                   without tearing; one extra image keeps acquire from
+#                   blocking while the previous image waits for presentation.
+# - max_throughput: IMMEDIATE never waits for a vertical blank (may tear);
+#                   two extra images keep the GPU busy.
+# - power_saver:    FIFO caps the frame rate at the refresh rate, with the
+#                   fewest images, i.e. the least memory.
+# - tear_free:      FIFO only, i.e. vsync without dropped frames; one extra
+#                   image (triple buffering) smooths out slow frames.
+# VK_PRESENT_MODE_FIFO_KHR is always supported, so each profile ends with it.
+PRESENT_PROFILES = {
+    'low_latency': ([VK_PRESENT_MODE_MAILBOX_KHR,
+                     VK_PRESENT_MODE_IMMEDIATE_KHR,
+                     VK_PRESENT_MODE_FIFO_KHR], 1),
+    'max_throughput': ([VK_PRESENT_MODE_IMMEDIATE_KHR,
+                        VK_PRESENT_MODE_MAILBOX_KHR,
+                        VK_PRESENT_MODE_FIFO_RELAXED_KHR,
+                        VK_PRESENT_MODE_FIFO_KHR], 2),
+    'power_saver': ([VK_PRESENT_MODE_FIFO_KHR], 0),
+    'tear_free': ([VK_PRESENT_MODE_FIFO_KHR], 1),
+    }
+
+
+def pickSurfaceFormat(formats):
+    '''Algorithm to set swapchain's surface format's format and colorSpace values
+
+    Notes:
+    - If the surface has no preferred format, i.e. its only format is
+      VK_FORMAT_UNDEFINED, use VK_FORMAT_B8G8R8A8_UNORM with
+      VK_COLOR_SPACE_SRGB_NONLINEAR_KHR.
+    - If not, use the same combination if it is available, or else the 1st
+      combination of the surface.'''
+
+    if len(formats)==1 and formats[0].format==VK_FORMAT_UNDEFINED:
+        #Surface format is undefined.
+        return VkSurfaceFormatKHR(VK_FORMAT_B8G8R8A8_UNORM, 0)
+
+    #Surface format is defined. Use available format combination
+    for f in formats:
+        if f.format == VK_FORMAT_B8G8R8A8_UNORM and \
+           f.colorSpace == VK_COLOR_SPACE_SRGB_NONLINEAR_KHR:
+            return f
+
+    #Use 1st detected surface format combination.
+    return formats[0] # Last scenario: settle with using first surface format
+
+
+def pickPresentMode(availablePresentModes, profile='low_latency'):
+    '''Logic to set present mode: the first of the profile's present modes
+       that is available.'''
+    for p in PRESENT_PROFILES[profile][0]:
+        if p in availablePresentModes:
+            return p
+    # The FIFO present mode is guaranteed by VULKAN spec to be supported
+    return VK_PRESENT_MODE_FIFO_KHR
+
+
+def pickImageCount(capabilities, profile='low_latency'):
+    '''Return the profile's swapchain image count, within the surface's
+       minImageCount and maxImageCount (0 means no maximum).'''
+    count = capabilities.minImageCount + PRESENT_PROFILES[profile][1]
+    if capabilities.maxImageCount > 0:
+        count = min(count, capabilities.maxImageCount)
+    return count
+
+
+class SurfaceInfoCache:
+    """ Class to cache surface queries per (physical device, surface) pair.
+
+    Input Parameters:
+     fnp - Setup's dictionary of function pointers to the surface functions.
+
+    Notes:
+    - The formats and present modes a surface supports do not change while a
+      window is resized, so they are queried once, and the chosen format and
+      present mode are kept with them.
+    - The capabilities hold the current extent and transform of the surface,
+      which do change on a resize. They are queried again on every
+      capabilities() call unless refresh=False.
+    - Call invalidate() when the window moves to another display, as that
+      display may support other formats and present modes.
+    """
+
+    def __init__(self, fnp):
+        self.fnp = fnp
+        self.entries = {}
+
+
+    def _entry(self, physical_device, surface):
+        '''Return the cache entry of (physical_device, surface), querying the
+           formats and present modes the first time.'''
+        key = (physical_device, surface)
+        entry = self.entries.get(key)
+        if entry is None:
+            formats = self.fnp['vkGetPhysicalDeviceSurfaceFormatsKHR'](
+                physicalDevice=physical_device, surface=surface)
+            present_modes = self.fnp[
+                'vkGetPhysicalDeviceSurfacePresentModesKHR'](
+                    physicalDevice=physical_device, surface=surface)
+            entry = {'formats': list(formats),
+                     'present_modes': list(present_modes),
+                     'surface_format': None,
+                     'present_mode': {},
+                     'capabilities': None}
+            self.entries[key] = entry
+            logging.info('Cached {0} surface formats and {1} present '
+                         'modes.'.format(len(entry['formats']),
+                                         len(entry['present_modes'])))
+        return entry
+
+
+    def capabilities(self, physical_device, surface, refresh=True):
+        '''Return the surface capabilities, queried again if refresh.'''
+        entry = self._entry(physical_device, surface)
+        if refresh or entry['capabilities'] is None:
+            entry['capabilities'] = self.fnp[
+                'vkGetPhysicalDeviceSurfaceCapabilitiesKHR'](
+                    physicalDevice=physical_device, surface=surface)
+        return entry['capabilities']
+
+
+    def surfaceFormat(self, physical_device, surface):
+        '''Return the chosen VkSurfaceFormatKHR of the surface.'''
+        entry = self._entry(physical_device, surface)
+        if entry['surface_format'] is None:
+            entry['surface_format'] = pickSurfaceFormat(entry['formats'])
+        return entry['surface_format']
+
+
+    def presentMode(self, physical_device, surface, profile='low_latency'):
+        '''Return the VkPresentModeKHR chosen for the surface and a profile
+           of PRESENT_PROFILES.'''
+        entry = self._entry(physical_device, surface)
+        if profile not in entry['present_mode']:
+            entry['present_mode'][profile] = pickPresentMode(
+                entry['present_modes'], profile)
+        return entry['present_mode'][profile]
+
+
+    def invalidate(self, physical_device=None, surface=None):
+        '''Forget the cached queries and choices, e.g. after the display
+           changed. Without arguments, all entries are forgotten.'''
+        for key in list(self.entries):
+            if (physical_device is None or key[0] == physical_device) and \
+               (surface is None or key[1] == surface):
+                del self.entries[key]
+        logging.info('Invalidated cached surface info.')
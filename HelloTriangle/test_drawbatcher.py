@@ -0,0 +1,80 @@
+''' Tests of drawbatcher, with the Vulkan commands recorded into a list. '''
+# Third-party modules
+import pytest
+
+# Application Modules
+import drawbatcher as db
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(db, 'vkCmdBindPipeline',
+                        lambda cb, bind_point, pipeline:
+                        calls.append(('pipeline', pipeline)))
+    monkeypatch.setattr(db, 'vkCmdBindDescriptorSets',
+                        lambda cb, bind_point, layout, first, count, sets,
+                        dynamic_count, dynamic_offsets:
+                        calls.append(('sets', layout, tuple(sets))))
+    monkeypatch.setattr(db, 'vkCmdBindVertexBuffers',
+                        lambda cb, first, count, buffers, offsets:
+                        calls.append(('buffers', tuple(buffers),
+                                      tuple(offsets))))
+    monkeypatch.setattr(db, 'vkCmdDraw',
+                        lambda cb, *args: calls.append(('draw',) + args))
+    return calls
+
+
+def draw(first_vertex, **state):
+    return db.drawItem((3, 1, first_vertex, 0), **state)
+
+
+def test_sort_groups_states_by_first_appearance():
+    items = [draw(0, pipeline='b'), draw(1, pipeline='a'),
+             draw(2, pipeline='b', vertex_buffers=[('vb', 0)]),
+             draw(3, pipeline='a'), draw(4, pipeline='b')]
+    order = [item.args[2] for item in db.DrawBatcher().sort(items)]
+    assert order == [0, 4, 2, 1, 3]
+
+
+def test_record_binds_only_changed_state(calls):
+    batcher = db.DrawBatcher()
+    items = [draw(i, vertex_buffers=[('vb', 0)]) for i in range(3)]
+    assert batcher.record('cb', items, default_pipeline='default') == 4
+    assert calls == [('pipeline', 'default'),
+                     ('buffers', ('vb',), (0,)),
+                     ('draw', 3, 1, 0, 0),
+                     ('draw', 3, 1, 1, 0),
+                     ('draw', 3, 1, 2, 0)]
+    assert batcher.stats()['last'] == {'draws': 3, 'binds': 2, 'elided': 4}
+
+
+def test_sorting_elides_more_binds(calls):
+    items = [draw(i, pipeline='ab'[i % 2]) for i in range(4)]
+    batcher = db.DrawBatcher()
+    assert batcher.record('cb', items) == 0
+    assert batcher.record('cb', batcher.sort(items)) == 2
+    stats = batcher.stats()
+    assert (stats['records'], stats['draws'], stats['elided']) == (2, 8, 2)
+
+
+def test_descriptor_sets_are_bound_again_for_another_layout(calls):
+    items = [draw(0, pipeline='p1', layout='l1', descriptor_sets=['s']),
+             draw(1, pipeline='p2', layout='l2', descriptor_sets=['s']),
+             draw(2, pipeline='p3', layout='l2', descriptor_sets=['s'])]
+    db.DrawBatcher().record('cb', items)
+    assert [c for c in calls if c[0] == 'sets'] == [('sets', 'l1', ('s',)),
+                                                    ('sets', 'l2', ('s',))]
+
+
+def test_args_with_record_records_themselves(calls):
+    class Args:
+        def record(self, command_buffer):
+            calls.append(('recorded', command_buffer))
+    db.DrawBatcher().record('cb', [db.drawItem(Args(), pipeline='p')])
+    assert calls == [('pipeline', 'p'), ('recorded', 'cb')]
+
+
+def test_descriptor_sets_need_a_layout():
+    with pytest.raises(ValueError):
+        db.drawItem((3, 1, 0, 0), descriptor_sets=['s'])
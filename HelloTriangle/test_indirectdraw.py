@@ -0,0 +1,97 @@
+''' Tests of indirectdraw.IndirectDrawBuffer, with its mapped buffer in host
+memory, see conftest.memory_properties. '''
+# Third-party modules
+import numpy as np
+import pytest
+
+# Application Modules
+import indirectdraw as ind
+
+
+def drawCount(buffer, copy=0):
+    return int(buffer.buffer.array('<u4', 1, copy * buffer.copy_size)[0])
+
+
+def test_write_commands(memory_properties):
+    buffer = ind.IndirectDrawBuffer('device', memory_properties, 8, copies=2)
+    commands = ind.commands(3)
+    commands['vertexCount'] = 3
+    commands['instanceCount'] = [1, 2, 3]
+    assert buffer.write(commands, copy=1) == 3
+    assert (buffer.commands(1)[:3] == commands).all()
+    assert drawCount(buffer, 1) == 3
+    assert drawCount(buffer, 0) == 0
+    assert buffer.counts == [0, 3]
+
+
+def test_write_columns(memory_properties):
+    buffer = ind.IndirectDrawBuffer('device', memory_properties, 4)
+    columns = np.array([[3, 1, 0, 0], [6, 2, 3, 1]], dtype=np.uint32)
+    assert buffer.write(columns) == 2
+    view = buffer.commands()
+    assert view['vertexCount'][:2].tolist() == [3, 6]
+    assert view['instanceCount'][:2].tolist() == [1, 2]
+    assert view['firstVertex'][:2].tolist() == [0, 3]
+    assert view['firstInstance'][:2].tolist() == [0, 1]
+
+
+def test_write_structured_commands_of_another_dtype(memory_properties):
+    buffer = ind.IndirectDrawBuffer('device', memory_properties, 4,
+                                    indexed=True)
+    commands = np.zeros(2, dtype=[('firstInstance', '<i8'),
+                                  ('indexCount', '<i8'),
+                                  ('instanceCount', '<i8'),
+                                  ('firstIndex', '<i8'),
+                                  ('vertexOffset', '<i8')])
+    commands['indexCount'] = [6, 12]
+    commands['vertexOffset'] = [0, -4]
+    buffer.write(commands)
+    view = buffer.commands()
+    assert view['indexCount'][:2].tolist() == [6, 12]
+    assert view['vertexOffset'][:2].tolist() == [0, -4]
+
+
+def test_write_in_place_and_count(memory_properties):
+    buffer = ind.IndirectDrawBuffer('device', memory_properties, 4)
+    buffer.commands()['vertexCount'] = 3
+    assert buffer.write(None) == 4
+    assert buffer.write(None, count=2) == 2
+    assert buffer.write(None, count=9) == 4
+    assert drawCount(buffer) == 4
+
+
+def test_too_many_commands_raise(memory_properties):
+    buffer = ind.IndirectDrawBuffer('device', memory_properties, 2)
+    with pytest.raises(ValueError):
+        buffer.write(ind.commands(3))
+
+
+def test_record_splits_by_max_draw_count(memory_properties, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ind, 'vkCmdDrawIndirect',
+                        lambda cb, buffer, offset, count, stride:
+                        calls.append((offset, count, stride)))
+    buffer = ind.IndirectDrawBuffer('device', memory_properties, 8,
+                                    copies=2, max_draw_count=2)
+    buffer.write(ind.commands(5), copy=1)
+    buffer.record('cb', copy=1)
+    base = buffer.copy_size + ind.COUNT_SIZE
+    assert calls == [(base, 2, 16), (base + 32, 2, 16), (base + 64, 1, 16)]
+
+
+def test_record_reads_count_from_the_buffer(memory_properties):
+    calls = []
+    count_function = lambda *args: calls.append(args)
+    buffer = ind.IndirectDrawBuffer('device', memory_properties, 8,
+                                    max_draw_count=8,
+                                    count_function=count_function)
+    assert buffer.reads_count
+    buffer.record('cb')
+    assert calls == [('cb', buffer.buffer.buffer, ind.COUNT_SIZE,
+                      buffer.buffer.buffer, 0, 8, 16)]
+
+
+def test_count_function_needs_multi_draw(memory_properties):
+    buffer = ind.IndirectDrawBuffer('device', memory_properties, 8,
+                                    count_function=lambda *args: None)
+    assert not buffer.reads_count
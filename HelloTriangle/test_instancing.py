@@ -0,0 +1,61 @@
+''' Tests of instancing, against the shipped instanced.vert.spv. '''
+# Python3 modules
+import os
+
+# Third-party modules
+import numpy as np
+import pytest
+
+# Application Modules
+import instancing as inst
+import spirvreflect as sr
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def reflect(name):
+    with open(os.path.join(HERE, name), 'rb') as f:
+        return sr.reflect(f.read())
+
+
+def test_shader_inputs_match_instance():
+    inst.checkInputs(reflect(inst.SHADER))
+
+
+@pytest.mark.parametrize('name', ['vert.spv', 'frag.spv'])
+def test_other_shader_inputs_raise(name):
+    with pytest.raises(ValueError):
+        inst.checkInputs(reflect(name))
+
+
+def test_grid_tiles_the_viewport():
+    instances = inst.grid(10)
+    assert instances.dtype == inst.INSTANCE
+    assert len(instances) == 10
+    assert np.allclose(instances['scale'], 2. / 4)
+    assert (np.abs(instances['offset']) < 1.).all()
+    assert len(np.unique(instances['offset'], axis=0)) == 10
+
+
+def test_buffer_write(memory_properties):
+    buffer = inst.InstanceBuffer('device', memory_properties, 5, copies=2)
+    instances = inst.grid(3)
+    assert buffer.write(instances, copy=1) == 3
+    assert (buffer.array(1)[:3] == instances).all()
+    assert buffer.counts == [0, 3]
+    assert buffer.vertexBuffers(1) == ((buffer.buffer.buffer,
+                                        buffer.copy_size),)
+    assert buffer.copy_size % 16 == 0
+
+
+def test_buffer_write_in_place(memory_properties):
+    buffer = inst.InstanceBuffer('device', memory_properties, 4)
+    buffer.array()[:] = inst.instances(4)
+    assert buffer.write(None, count=2) == 2
+    assert buffer.write(None) == 4
+
+
+def test_too_many_instances_raise(memory_properties):
+    buffer = inst.InstanceBuffer('device', memory_properties, 2)
+    with pytest.raises(ValueError):
+        buffer.write(inst.instances(3))
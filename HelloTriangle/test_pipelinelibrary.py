@@ -0,0 +1,127 @@
+''' Tests of pipelinelibrary.PipelineLibrary, without a device. '''
+# Python3 modules
+import concurrent.futures
+import itertools
+
+# Third-party modules
+import pytest
+
+# API
+from vulkan import VK_SHADER_STAGE_VERTEX_BIT, VK_SHADER_STAGE_FRAGMENT_BIT
+
+# Application Modules
+import pipelinelibrary as pl
+
+
+class FakeCompiler:
+    '''Stands in for pipelinecompiler.PipelineCompiler: its Futures are
+       completed by the test.'''
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, createInfo, name, feedback):
+        future = concurrent.futures.Future()
+        self.submitted.append((createInfo, future))
+        return future
+
+
+@pytest.fixture
+def destroyed(monkeypatch):
+    handles = itertools.count(1)
+    destroyed = []
+    monkeypatch.setattr(pl, 'vkCreateGraphicsPipelines',
+                        lambda device, cache, count, infos, allocator:
+                        ('pipeline', next(handles)))
+    monkeypatch.setattr(pl, 'vkDestroyPipeline',
+                        lambda device, pipeline, allocator:
+                        destroyed.append(pipeline))
+    return destroyed
+
+
+def library(max_pipelines=64):
+    return pl.PipelineLibrary('device', lambda key: {'key': key},
+                              FakeCompiler(), max_pipelines=max_pipelines)
+
+
+def key(variant=0):
+    return pl.pipelineKey(((VK_SHADER_STAGE_VERTEX_BIT, 'vert.spv'),
+                           (VK_SHADER_STAGE_FRAGMENT_BIT, 'frag.spv')),
+                          render_pass_class=(variant,))
+
+
+def test_compile_count_does_not_hide_compiles(destroyed):
+    lib = library()
+    lib.get(key())
+    assert lib.compiles() == []
+    assert lib.stats()['compile_count'] == 1
+
+
+def test_get_shares_one_pipeline_per_key(destroyed):
+    lib = library()
+    pipeline = lib.get(key())
+    assert lib.get(key()) == pipeline
+    assert lib.get(key(1)) != pipeline
+    assert lib.stats()['hits'] == 1
+    assert lib.stats()['compile_count'] == 2
+
+
+def test_least_recently_used_is_evicted(destroyed):
+    lib = library(max_pipelines=2)
+    a, b = lib.get(key(0)), lib.get(key(1))
+    lib.get(key(0))
+    c = lib.get(key(2))
+    assert destroyed == [b]
+    assert set(lib.pipelines.values()) == {a, c}
+    assert lib.stats()['evictions'] == 1
+
+
+def test_pinned_pipeline_is_not_evicted(destroyed):
+    lib = library(max_pipelines=1)
+    a = lib.get(key(0))
+    lib.pin(a)
+    b = lib.get(key(1))
+    assert destroyed == [b]
+    assert list(lib.pipelines.values()) == [a]
+    lib.unpin(a)
+    assert lib.stats()['pinned'] == 0
+
+
+def test_discarded_pinned_pipeline_is_destroyed_when_unpinned(destroyed):
+    lib = library()
+    a = lib.get(key(0))
+    lib.pin(a)
+    lib.discard(lambda k: True)
+    assert destroyed == []
+    assert not lib.pipelines
+    lib.unpin(a)
+    assert destroyed == [a]
+
+
+def test_compiles_tracks_pending_and_discarded_requests(destroyed):
+    lib = library()
+    future = lib.request(key(0))
+    assert lib.request(key(0)) is future
+    assert lib.compiles() == [future]
+
+    lib.discard(lambda k: True)
+    assert lib.compiles() == [future]
+    future.set_result(('pipeline', 'late'))
+    lib.collect()
+    assert destroyed == [('pipeline', 'late')]
+    assert lib.compiles() == []
+    assert not lib.pipelines
+
+
+def test_completed_request_is_collected(destroyed):
+    lib = library()
+    future = lib.request(key(0))
+    future.set_result(('pipeline', 'compiled'))
+    assert lib.get(key(0)) == ('pipeline', 'compiled')
+    assert lib.stats()['compile_count'] == 1
+    assert lib.compiles() == []
+
+
+def test_unknown_blend_mode_raises():
+    with pytest.raises(ValueError):
+        pl.pipelineKey((), blend='subtract')
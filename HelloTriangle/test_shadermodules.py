@@ -0,0 +1,92 @@
+''' Tests of shadermodules.ShaderModuleRegistry, without a device. '''
+# Python3 modules
+import concurrent.futures
+import os
+import shutil
+
+# Third-party modules
+import pytest
+
+# Application Modules
+import shadermodules as sm
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    '''A registry whose modules are the SPIR-V paths they were created from,
+       and that records the modules it destroys.'''
+    destroyed = []
+    monkeypatch.setattr(sm.ShaderModuleRegistry, '_createModule',
+                        lambda self, spirv, path: ('module', path))
+    monkeypatch.setattr(sm, 'vkDestroyShaderModule',
+                        lambda device, module, allocator:
+                        destroyed.append(module))
+    registry = sm.ShaderModuleRegistry('device')
+    registry.destroyed = destroyed
+    return registry
+
+
+def copy(tmp_path, name, to=None):
+    path = tmp_path / (to or name)
+    shutil.copy(os.path.join(HERE, name), path)
+    return str(path)
+
+
+def test_load_reads_each_file_once(registry, tmp_path):
+    path = copy(tmp_path, 'vert.spv')
+    module = registry.load(path)
+    assert registry.load(path) is module
+    assert registry.files_read == 1
+    assert registry.hits == 1
+
+
+def test_identical_files_share_a_module(registry, tmp_path):
+    first = registry.load(copy(tmp_path, 'vert.spv'))
+    second = registry.load(copy(tmp_path, 'vert.spv', 'copy.spv'))
+    assert first is second
+    assert len(registry.modules) == 1
+
+
+@pytest.mark.parametrize('data', [b'', b'\x03\x02\x23', b'\0' * 40])
+def test_invalid_spirv_raises_and_caches_nothing(registry, tmp_path, data):
+    path = tmp_path / 'bad.spv'
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        registry.load(str(path))
+    assert not registry.modules
+    assert not registry.paths
+
+
+def test_refresh_retires_the_replaced_module_after_compiles(registry,
+                                                             tmp_path):
+    path = copy(tmp_path, 'vert.spv')
+    old = registry.load(path)
+    shutil.copy(os.path.join(HERE, 'frag.spv'), path)
+    compile_in_flight = concurrent.futures.Future()
+
+    assert registry.refresh(path)
+    assert registry.releaseStale([compile_in_flight]) == 0
+    assert registry.destroyed == []
+    compile_in_flight.set_result('pipeline')
+    assert registry.releaseStale() == 1
+    assert registry.destroyed == [old]
+
+
+def test_refresh_of_invalid_spirv_keeps_the_module(registry, tmp_path):
+    path = copy(tmp_path, 'vert.spv')
+    module = registry.load(path)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * 6)
+    with pytest.raises(ValueError):
+        registry.refresh(path)
+    assert registry.load(path) is module
+    assert not registry.stale
+
+
+def test_unchanged_refresh_is_not_stale(registry, tmp_path):
+    path = copy(tmp_path, 'vert.spv')
+    registry.load(path)
+    assert not registry.refresh(path)
+    assert registry.releaseStale() == 0
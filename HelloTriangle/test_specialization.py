@@ -0,0 +1,53 @@
+''' Tests of specialization.packConstants against vert.spv's constants. '''
+# Python3 modules
+import os
+
+# Third-party modules
+import numpy as np
+import pytest
+
+# API
+from vulkan import VK_TRUE, VK_FALSE
+
+# Application Modules
+import specialization as sp
+import spirvreflect as sr
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(scope='module')
+def vert():
+    with open(os.path.join(HERE, 'vert.spv'), 'rb') as f:
+        return sr.reflect(f.read())
+
+
+def test_values_are_packed_as_declared(vert):
+    assert sp.packConstants({'SCALE': 2, 'VERTEX_COLORS': False}, vert) == (
+        (0, np.float32(2.).tobytes()),
+        (1, np.uint32(VK_FALSE).tobytes()))
+    assert sp.packConstants({'VERTEX_COLORS': 1}, vert) == (
+        (1, np.uint32(VK_TRUE).tobytes()),)
+
+
+def test_equal_values_pack_alike(vert):
+    by_name = sp.packConstants({'SCALE': 0.5}, vert)
+    assert sp.packConstants({0: np.float64(0.5)}, vert) == by_name
+    record = np.array((0.5,), dtype=[('SCALE', '<f8')])
+    assert sp.packConstants(record, vert) == by_name
+
+
+def test_unknown_constant_raises(vert):
+    with pytest.raises(ValueError):
+        sp.packConstants({'ROTATION': 1.}, vert)
+    with pytest.raises(ValueError):
+        sp.packConstants({7: 1.}, vert)
+
+
+def test_record_of_several_elements_raises(vert):
+    with pytest.raises(ValueError):
+        sp.packConstants(np.zeros(2, dtype=[('SCALE', '<f4')]), vert)
+
+
+def test_no_constants_have_no_info():
+    assert sp.specializationInfo(()) is None
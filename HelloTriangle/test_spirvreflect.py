@@ -0,0 +1,81 @@
+''' Tests of spirvreflect on the SPIR-V shipped with HelloTriangle. '''
+# Python3 modules
+import os
+
+# Third-party modules
+import numpy as np
+import pytest
+
+# API
+from vulkan import *
+
+# Application Modules
+import spirvreflect as sr
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def spirv(name):
+    with open(os.path.join(HERE, name), 'rb') as f:
+        return f.read()
+
+
+def test_vert():
+    r = sr.reflect(spirv('vert.spv'))
+    assert r.entry_points == [('main', VK_SHADER_STAGE_VERTEX_BIT)]
+    assert r.inputs == []
+    assert [(v.location, v.name, v.components) for v in r.outputs] == \
+           [(0, 'fragColor', 3)]
+    assert [(c.spec_id, c.name, c.base_type, c.default)
+            for c in r.spec_constants] == \
+           [(0, 'SCALE', 'float', 1.0), (1, 'VERTEX_COLORS', 'bool', True)]
+    assert sr.vertexInputDescription(r) == ((), ())
+
+
+def test_frag():
+    r = sr.reflect(spirv('frag.spv'))
+    assert r.entry_points == [('main', VK_SHADER_STAGE_FRAGMENT_BIT)]
+    assert [(v.location, v.name, v.base_type, v.components)
+            for v in r.inputs] == [(0, 'fragColor', 'float', 3)]
+    assert [(v.location, v.name, v.components) for v in r.outputs] == \
+           [(0, 'outColor', 4)]
+    assert r.descriptor_bindings == []
+    assert r.push_constant_size == 0
+    assert r.spec_constants == []
+
+
+def test_instanced_vert():
+    r = sr.reflect(spirv('instanced.vert.spv'))
+    assert [(v.location, v.name) for v in r.inputs] == \
+           [(0, 'inOffset'), (1, 'inScale'), (2, 'inColor')]
+    assert sr.vertexInputDescription(
+        r, input_rate=VK_VERTEX_INPUT_RATE_INSTANCE) == (
+        ((0, 24, VK_VERTEX_INPUT_RATE_INSTANCE),),
+        ((0, 0, VK_FORMAT_R32G32_SFLOAT, 0),
+         (1, 0, VK_FORMAT_R32_SFLOAT, 8),
+         (2, 0, VK_FORMAT_R32G32B32_SFLOAT, 12)))
+
+
+def test_layout_of_shaders_without_resources_is_empty():
+    reflections = [sr.reflect(spirv(name)) for name in ('vert.spv',
+                                                       'frag.spv')]
+    assert sr.layoutDescription(reflections) == ((), ())
+
+
+def test_big_endian_spirv():
+    words = np.frombuffer(spirv('frag.spv'), dtype='<u4')
+    swapped = words.astype('>u4').tobytes()
+    assert sr.reflect(swapped) == sr.reflect(spirv('frag.spv'))
+
+
+@pytest.mark.parametrize('data', [b'', b'\0' * 22, b'\0' * 20])
+def test_invalid_spirv_raises(data):
+    with pytest.raises(ValueError):
+        sr.reflect(data)
+
+
+def test_instruction_past_the_end_raises():
+    # An OpNop that claims 5 words, of which only 1 is there.
+    data = spirv('frag.spv') + np.array([5 << 16], dtype='<u4').tobytes()
+    with pytest.raises(ValueError):
+        sr.reflect(data)
@@ -8,15 +8,100 @@ Amendments: 1. Revised v2 codes to now allow resizing of window according to
                Vulkan Tutorial.
             2. Removed Vulkan struct's stype, flag, and other parameters with 
                the "Count" word in their name.
+            3. Allow multiple frames in flight, synchronised with per-frame
+               semaphores and fences, instead of idling the present queue
+               after every frame.
+            4. Added a "prepared frame" mode that reuses per-frame submit and
+               present structs instead of rebuilding them every frame.
+            5. Swapchain recreation requests are coalesced and debounced by a
+               ResizeController, and a frame whose image cannot be acquired
+               is skipped.
+            6. The viewport and scissor are dynamic states, so a resize only
+               recreates the swapchain, image views, framebuffers and command
+               buffers. The render pass and graphics pipeline are recreated
+               only if the swapchain image format changes.
+            7. A new swapchain is created with the old one as oldSwapchain,
+               and the old swapchain and its dependants are destroyed once
+               the frames that used them have finished, instead of idling
+               the device.
+            8. Surface formats and present modes, and the choices made from
+               them, are cached instead of queried on every recreation.
+            9. The present mode and swapchain image count are chosen by a
+               presentation profile that can be switched at runtime.
+           10. The time vkAcquireNextImageKHR blocks is measured, and can be
+               used to adapt the swapchain image count, with a cooldown
+               between changes and without growing it under vsync once
+               frames keep up with the display.
+           11. Graphics pipelines are created through a VkPipelineCache that
+               is loaded from and saved to disk, keyed by the device's
+               pipelineCacheUUID and driver version.
+           12. Shader modules are created once, from validated SPIR-V, by a
+               ShaderModuleRegistry and kept until device teardown, or
+               retired once a reload replaced them.
+           13. Graphics pipelines can be compiled on background threads; the
+               frame loop keeps drawing with the current pipeline and swaps
+               in the new one at a frame boundary.
+           14. Graphics pipelines are variants of a PipelineLibrary, keyed by
+               their shaders, fixed-function state and render pass
+               compatibility class, and evicted least recently used.
+           15. Optionally, changed GLSL shaders are compiled to SPIR-V at
+               startup.
+           16. Optionally, shader files are watched, and the pipelines that
+               use a changed shader are rebuilt and swapped in without
+               recreating anything else.
+           17. The pipeline layout and vertex input state are derived from
+               the reflection of the shaders.
+           18. Shader stages can be given specialization constants, which
+               are part of the pipeline variant's key.
+           19. The creation time and pipeline cache hit of each graphics
+               pipeline are recorded, with VK_EXT_pipeline_creation_feedback
+               if the device has it, see pipelineCreationReport().
+           20. Optionally, shaders are optimised with spirv-opt, and the GPU
+               time of every frame is measured with timestamp queries.
+           21. Optionally, the draws are recorded into secondary command
+               buffers on a pool of threads, each with its own command pool.
+           22. A dynamic-scene mode records the command buffer of every
+               frame anew, from a transient command pool per frame in flight
+               that is reset as a whole.
+           23. The draws are draw items with their pipeline, descriptor sets
+               and vertex buffers, sorted by that state and recorded with
+               only the binds that change it, see drawStats().
+           24. Indirect draws: the commands of many draws are written from a
+               NumPy array into a mapped buffer, and drawn by one
+               vkCmdDrawIndirect call, see setIndirectDraws().
+           25. Instanced draws: per-instance attributes are written from a
+               NumPy array into a vertex buffer that advances per instance,
+               and drawn by one vkCmdDraw call, see setInstances().
 '''
 
 # Python3 modules
 import logging
 import os
 import ctypes
+import time
+from functools import partial
 
 from vulkan import *
+from vulkan import ffi
 import vtools as vts
+import resizecontrol as rc
+import surfaceinfo as si
+import acquirestats as acs
+import pipelinecache as pc
+import shadermodules as sm
+import shaderbuild as sb
+import shaderwatch as sw
+import spirvreflect as sr
+import specialization as sc
+import creationfeedback as cf
+import spirvopt as so
+import gputimer as gt
+import commandrecorder as cr
+import drawbatcher as db
+import indirectdraw as ind
+import instancing as inst
+import pipelinecompiler as pco
+import pipelinelibrary as pl
  
 __author__ = 'sunbear.c22'
 __version__ = '0.1.0'
@@ -25,9 +110,82 @@ __license__ = 'MIT'
 
 class Setup(object):
 
-    def __init__(self, window, debug=False):
+    def __init__(self, window, debug=False, max_frames_in_flight=2,
+                 prepared_frames=True, resize_quiet_period=0.1,
+                 deferred_retirement=True, present_profile='low_latency',
+                 adaptive_image_count=False, use_pipeline_cache=True,
+                 pipeline_cache_dir=None, pipeline_compile_threads=2,
+                 max_pipelines=64, build_shaders=False, watch_shaders=False,
+                 optimize_shaders=False, gpu_timestamps=False,
+                 record_threads=0, dynamic_scene=False, sort_draws=True):
+        if present_profile not in si.PRESENT_PROFILES:
+            raise ValueError('Presentation profile must be one of {}'.format(
+                sorted(si.PRESENT_PROFILES)))
+        if dynamic_scene and record_threads:
+            raise ValueError('record_threads records the static command '
+                             'buffers, so it cannot be combined with '
+                             'dynamic_scene.')
         self.window = window
         self.debug = debug
+        self.present_profile = present_profile
+        self.adaptive_image_count = adaptive_image_count
+        self.acquire_tuner = acs.AcquireWaitTuner()
+        self.swapchain_image_count = None     # requested, None for profile's
+        self.swapchain_requested_count = None # minImageCount of the swapchain
+        self.image_count_change = None        # state before the last one
+        self.image_count_blocked = set()      # deltas without effect
+        self.image_count_actual = None
+        self.max_frames_in_flight = max_frames_in_flight
+        self.prepared_frames = prepared_frames
+        self.resize_controller = rc.ResizeController(resize_quiet_period)
+        self.swapchain_out_of_date = False
+        self.retired_semaphores = []
+        self.deferred_retirement = deferred_retirement
+        self.retired_objects = []
+        self.frame_serial = 0
+        self.frame_serials = [0] * max_frames_in_flight
+        self.completed_serial = 0
+        self.use_pipeline_cache = use_pipeline_cache
+        self.pipeline_cache_dir = pipeline_cache_dir
+        self.pipeline_cache = None
+        self.pipeline_create_time = 0.
+        self.shader_modules = None
+        self.pipeline_compile_threads = pipeline_compile_threads
+        self.pipeline_compiler = None
+        self.pending_pipeline = None
+        self.max_pipelines = max_pipelines
+        self.pipeline_library = None
+        self.pipeline_key = None
+        self.creation_feedback = False
+        self.shader_dir = os.path.dirname(os.path.abspath(__file__))
+        self.build_shaders = build_shaders
+        self.watch_shaders = watch_shaders
+        self.shader_watcher = None
+        self.optimize_shaders = optimize_shaders
+        self.shader_optimizer = None
+        self.gpu_timestamps = gpu_timestamps
+        self.gpu_timer = None
+        self.frame_images = [None] * max_frames_in_flight
+        self.record_threads = record_threads
+        self.command_recorder = None
+        self.secondary_frees = []
+        self.dynamic_scene = dynamic_scene
+        self.frame_pools = []
+        self.frame_command_buffers = []
+        # The draws of the scene, see drawbatcher.drawItem. Those without a
+        # pipeline use graphics_pipeline.
+        self.draws = [db.drawItem((3, 1, 0, 0))]
+        self.sort_draws = sort_draws
+        self.draw_batcher = db.DrawBatcher()
+        self.memory_properties = None
+        self.draw_indirect_count = False
+        self.indirect_draws = None
+        self.indirect_item = None
+        self.indirect_commands = None
+        self.instance_pipeline = None
+        self.instance_buffer = None
+        self.instance_item = None
+        self.instances = None
 
         if self.debug:
             self.instance_extensions = ['VK_KHR_surface', 'VK_EXT_debug_report']
@@ -38,6 +196,7 @@ class Setup(object):
             
         self.instance = None
         self.fnp = {}
+        self.surface_info = si.SurfaceInfoCache(self.fnp)
         self.callback = None
         self.surface = None
         self.physical_device = None
@@ -56,13 +215,21 @@ class Setup(object):
         self.swapchain_imageExtent = None
         self.swapchain_imageFormat = None
         self.render_pass = None
-        self.pipeline_layout = None
+        self.pipeline_layouts = {} # layout description: (layout, set layouts)
         self.graphics_pipeline = None
         self.swapchain_framebuffers = []
         self.command_pool = None
         self.command_buffers = None
-        self.semaphore_image_available = None
-        self.semaphore_image_drawn = None            
+        self.semaphores_image_available = []
+        self.semaphores_image_drawn = []
+        self.fences_in_flight = []
+        self.images_in_flight = []
+        self.current_frame = 0
+        self.submit_infos = []
+        self.present_infos = []
+        self.fence_arrays = []
+        self.acquire_next_image = None
+        self.queue_present = None
         
         self._createInstance()
         self._getFnp()
@@ -73,14 +240,21 @@ class Setup(object):
         self._setLogicalDeviceExtensions()
         self._createLogicalDevice()
         self._getGraphicsPresentQueue()
+        self._createPipelineCache()
+        self._createShaderModuleRegistry()
+        self._createPipelineLibrary()
         self._createSwapChain()
         self._createImageviews()
         self._createRenderPass()
         self._createGraphicsPipeline()
         self._createFramebuffers()
         self._createCommandPool()
+        self._createGpuTimer()
+        self._createCommandRecorder()
+        self._createFramePools()
         self._createCommandBuffer()
-        self._createSemaphores()
+        self._createSyncObjects()
+        self._prepareFrameInfos()
 
     def _printlist(self, inputlist, msg):
         print('{0:3} {1}:'.format(len(inputlist), msg))
@@ -461,9 +635,19 @@ class Setup(object):
             logging.error('Required Logical Device Extensions are not all '
                           'detactable.')
             exit()
-        else:
-            logging.info('Set Logical Device Extension(s) = {0}'.format(
-                self.logical_device_extensions))
+
+        # Optional extension: pipeline creation feedback, used by
+        # pipelineCreationReport().
+        if cf.EXTENSION_NAME in extensionsNames:
+            self.logical_device_extensions.append(cf.EXTENSION_NAME)
+            self.creation_feedback = True
+        # Optional extension: indirect draws whose count is read from their
+        # buffer, see setIndirectDraws().
+        if ind.EXTENSION_NAME in extensionsNames:
+            self.logical_device_extensions.append(ind.EXTENSION_NAME)
+            self.draw_indirect_count = True
+        logging.info('Set Logical Device Extension(s) = {0}'.format(
+            self.logical_device_extensions))
 
 
     def _createLogicalDevice(self):
@@ -523,6 +707,49 @@ class Setup(object):
         logging.info('Retrieved present_queue handle of logical device.')
 
 
+    def _createPipelineCache(self):
+        '''Create the VkPipelineCache from the cache file of this physical
+           device and driver, if any, and the background pipeline compiler.'''
+        if self.use_pipeline_cache:
+            self.pipeline_cache = pc.PipelineCache(
+                self.logical_device, self.physical_device_properties,
+                self.pipeline_cache_dir)
+        self.pipeline_compiler = pco.PipelineCompiler(
+            self.logical_device, self.pipeline_cache,
+            self.pipeline_compile_threads)
+
+
+    def _createShaderModuleRegistry(self):
+        '''Create the registry that owns the shader modules of the logical
+           device, after compiling the changed GLSL shaders if build_shaders.
+           With optimize_shaders, the modules are created from SPIR-V
+           optimised by spirv-opt, if it is installed.'''
+        if self.build_shaders:
+            results = sb.buildShaders(self.shader_dir)
+            logging.info('Built shaders:\n{}'.format(sb.report(results)))
+        if self.watch_shaders:
+            self.shader_watcher = sw.ShaderWatcher(self.shader_dir)
+        if self.optimize_shaders:
+            tool = so.findOptimizer()
+            if tool:
+                self.shader_optimizer = so.SpirvOptimizer(tool)
+            else:
+                logging.warning('spirv-opt not found: shaders are not '
+                                'optimised.')
+        self.shader_modules = sm.ShaderModuleRegistry(self.logical_device,
+                                                      self.shader_optimizer,
+                                                      self._retire)
+
+
+    def _createPipelineLibrary(self):
+        '''Create the library of graphics pipeline variants. Evicted variants
+           are retired, as frames in flight may still use them.'''
+        self.pipeline_library = pl.PipelineLibrary(
+            self.logical_device, self._graphicsPipelineCreateInfo,
+            self.pipeline_compiler, self.pipeline_cache, self._retire,
+            self.max_pipelines, self.creation_feedback)
+
+
     def _createSwapChain(self):
         '''Create Swapchain object
 
@@ -557,6 +784,9 @@ class Setup(object):
                 VK_PRESENT_MODE_MAILBOX_KHR
                 VK_PRESENT_MODE_FIFO_KHR
                 VK_PRESENT_MODE_FIFO_RELAXED_KHR
+             2. REVISED: The order, and the number of images, now come from
+                the presentation profile, see surfaceinfo.PRESENT_PROFILES
+                and setPresentProfile().
         '''
         
         #### SETTING ASSOCIATED TO SURFACE CAPABILITES #### 
@@ -565,9 +795,10 @@ class Setup(object):
         # holding a drawn image is used to present the drawn image to the 
         # surface. As such, swapchain's imagecount must equal the minImageCount,
         # which has a value of 2.
-        surface_capabilities = self.fnp[
-            'vkGetPhysicalDeviceSurfaceCapabilitiesKHR'](
-                physicalDevice=self.physical_device, surface=self.surface)
+        # REVISED: Queries go through self.surface_info. Only the capabilities
+        # are queried again on recreation; see surfaceinfo.SurfaceInfoCache.
+        surface_capabilities = self.surface_info.capabilities(
+            self.physical_device, self.surface)
 
         #C1. Set swapchain's ImageCount.
         # Swapchain will use a Double Buffer configuration to draw and present 
@@ -575,7 +806,19 @@ class Setup(object):
         # having a drawn image is used to present the drawn image to the 
         # surface. As such, swapchain's imagecount is equal to the surface
         # capabilities minImageCount, which has a value of 2.
-        sc_minImageCount = surface_capabilities.minImageCount
+        # REVISED: With only minImageCount images, the CPU often stalls in
+        # vkAcquireNextImageKHR. The presentation profile adds images above
+        # minImageCount, within maxImageCount.
+        # REVISED: With adaptive_image_count, swapchain_image_count holds the
+        # count chosen from the measured acquire waits; see
+        # _adaptImageCount().
+        if self.swapchain_image_count is None:
+            sc_minImageCount = si.pickImageCount(surface_capabilities,
+                                                 self.present_profile)
+        else:
+            sc_minImageCount = self._clampImageCount(
+                surface_capabilities, self.swapchain_image_count)
+        self.swapchain_requested_count = sc_minImageCount
 
         #C2. Set swapchain's extent, i.e. size (in pixel).
         # The swap extent is the resolution of the swapchain images. If the 
@@ -642,50 +885,20 @@ class Setup(object):
         #                   spaces of a presentation engine.
         # 2. The size of surface_formats represents literally how many different
         #    format/colorspace pairs that can be used for the surface.
-        def _pickSurfaceFormat(formats):
-            '''Algorithm to set swapchain's surface format's format and colorSpace values '''
-            
-            if len(formats)==1 and formats[0].format==VK_FORMAT_UNDEFINED:
-                #Surface format is undefined.
-                return VkSurfaceFormatKHR(VK_FORMAT_B8G8R8A8_UNORM, 0)
-
-            #Surface format is defined. Use available format combination
-            for f in formats:
-                if f.format == VK_FORMAT_B8G8R8A8_UNORM and \
-                   f.colorSpace == VK_COLOR_SPACE_SRGB_NONLINEAR_KHR:
-                    return f
-
-            #Use 1st detected surface format combination.
-            return formats[0] # Last scenario: settle with using first surface format  
-        
-        #Get surface's formats.
-        surface_formats = self.fnp['vkGetPhysicalDeviceSurfaceFormatsKHR'](
-            physicalDevice = self.physical_device, surface = self.surface )
+        # 3. The format is picked by surfaceinfo.pickSurfaceFormat, once per
+        #    surface.
 
         #Set swapchain image_formats.
         try:
-            surfaceFormat = _pickSurfaceFormat(surface_formats)
+            surfaceFormat = self.surface_info.surfaceFormat(
+                self.physical_device, self.surface)
         except:
             logging.error('Swapchain image_format faill to set')
             exit()
-            
-        surface_presentModes = self.fnp[
-            'vkGetPhysicalDeviceSurfacePresentModesKHR'](
-            physicalDevice=self.physical_device, surface=self.surface)
-
 
-        def _get_surface_present_mode(availablePresentModes):
-            '''Logic to set present mode'''
-            bestMode = VK_PRESENT_MODE_FIFO_KHR
-            for p in availablePresentModes:
-                if p == VK_PRESENT_MODE_MAILBOX_KHR:
-                    return p
-                elif p == VK_PRESENT_MODE_IMMEDIATE_KHR:
-                    bestMode = p
-            # The FIFO present mode is guaranteed by VULKAN spec to be supported
-            return bestMode;
-
-        sc_presentMode = _get_surface_present_mode(surface_presentModes)
+        #Set swapchain present mode, picked by surfaceinfo.pickPresentMode.
+        sc_presentMode = self.surface_info.presentMode(
+            self.physical_device, self.surface, self.present_profile)
 
 
         ### OTHERS ###
@@ -762,9 +975,11 @@ class Setup(object):
             # indicates whether the Vulkan implementation is allowed to discard
             # rendering operations that affect regions of the surface which are not
             # visible.
-            oldSwapchain = VK_NULL_HANDLE
+            oldSwapchain = self.swapchain if self.swapchain else VK_NULL_HANDLE
             # if not VK_NULL_HANDLE, specifies the swapchain that will be replaced by
-            # the new swapchain being created.
+            # the new swapchain being created. Passing the swapchain that is
+            # being recreated lets the implementation reuse its resources and
+            # keep presenting its images while the new swapchain is built.
             )
 
         #2. Create Swapchain.
@@ -785,6 +1000,10 @@ class Setup(object):
         logging.info('set swapchain imageFormat: {}'.format(self.swapchain_imageFormat))
         logging.info('Set swapchain extent.width = {}'.format(self.swapchain_imageExtent.width))
         logging.info('Set swapchain extent.height = {}'.format(self.swapchain_imageExtent.height))
+        logging.info('Set swapchain present mode = {0} and {1} images for '
+                     'the {2} profile.'.format(sc_presentMode,
+                                              len(self.swapchain_images),
+                                              self.present_profile))
 
 
     def _createImageviews(self):
@@ -957,16 +1176,84 @@ class Setup(object):
             logging.error('Render pass failed to create.')
 
 
-    def _ShaderModuleCreateInfo(self, shader, shadertype):
-        shader_module_createInfo = VkShaderModuleCreateInfo(
-            codeSize = len(shader),
-            pCode = shader)
-        return shader_module_createInfo
+    def _createGraphicsPipeline(self):
+        '''Get the graphics pipeline of pipeline_key, for the current render
+           pass, from the pipeline library. It is compiled on the calling
+           thread if the library does not have it.'''
+        self.pipeline_key = self._pipelineKey()
+        try:
+            start = time.perf_counter()
+            pipeline = self.pipeline_library.get(self.pipeline_key)
+            self.pipeline_create_time = time.perf_counter() - start
+            logging.info('Created graphics pipeline in {:.3f} ms.'.format(
+                1000. * self.pipeline_create_time))
+        except ValueError as e:
+            logging.error('Graphics pipeline failed to create: {}'.format(e))
+            exit()
+        except VkError:
+            logging.error('Graphics pipeline failed to create.')
+            exit()
+        self._usePipeline(pipeline)
+
+
+    def _pipelineKey(self, specialization=None, **state):
+        '''Return pipeline_key, or the key of the default pipeline, for the
+           current render pass and with the given state changed. See
+           pipelinelibrary.pipelineKey for the state.
+
+        specialization is a dict of the specialization constants of shader
+        stages, {VkShaderStageFlagBits: values}, see
+        specialization.packConstants for the values. It replaces the
+        constants of the given stages only; values of None clear them.'''
+        if self.pipeline_key is None:
+            fields = {'shaders': (
+                (VK_SHADER_STAGE_VERTEX_BIT,
+                 os.path.join(self.shader_dir, "vert.spv")),
+                (VK_SHADER_STAGE_FRAGMENT_BIT,
+                 os.path.join(self.shader_dir, "frag.spv")))}
+        else:
+            fields = self.pipeline_key._asdict()
+        fields['render_pass_class'] = (self.swapchain_imageFormat,)
+        fields.update(state)
+        if specialization:
+            fields['specialization'] = self._packSpecialization(
+                fields['shaders'], fields.get('specialization', ()),
+                specialization)
+        return pl.pipelineKey(**fields)
+
+
+    def _packSpecialization(self, shaders, current, specialization):
+        '''Return the specialization of a PipelineKey with the constants of
+           the stages of specialization packed and replaced.'''
+        paths = dict(shaders)
+        packed = dict(current)
+        for stage, values in specialization.items():
+            if stage not in paths:
+                raise ValueError('The pipeline has no shader stage {}.'.format(
+                    stage))
+            if values is None:
+                packed.pop(stage, None)
+                continue
+            self.shader_modules.load(paths[stage])
+            packed[stage] = sc.packConstants(
+                values, self.shader_modules.reflection(paths[stage]))
+        return tuple(packed.items())
+
+
+    def _usePipeline(self, pipeline):
+        '''Make pipeline the graphics pipeline. It is pinned in the library
+           while command buffers bind it.'''
+        self.pipeline_library.pin(pipeline)
+        if self.graphics_pipeline:
+            self.pipeline_library.unpin(self.graphics_pipeline)
+        self.graphics_pipeline = pipeline
 
 
-    def _createGraphicsPipeline(self):
+    def _graphicsPipelineCreateInfo(self, key):
         ''' Method to load the Spir-V vertex and fragment shaders, create the 
-        shader modules and create the shader stages.
+        shader modules and create the shader stages. Returns the
+        VkGraphicsPipelineCreateInfo of the pipeline variant of key, a
+        pipelinelibrary.PipelineKey.
 
         Notes:
         - For this method to work, the vertex and fragment shaders need to be
@@ -978,91 +1265,82 @@ class Setup(object):
         #1. Create the vertex and fragment shaders as described in:
         #   https://vulkan-tutorial.com/Drawing_a_triangle/Graphics_pipeline_basics/Shader_modules')
 
-        #2. Load the Spir-V Vertex and Fragment Shaders.
-        path = os.path.dirname(os.path.abspath(__file__))
-
-        with open(os.path.join(path, "vert.spv"), 'rb') as f:
-            vert_shader_spirv = f.read()
-        with open(os.path.join(path, "frag.spv"), 'rb' ) as f:
-            frag_shader_spirv = f.read()
-
-        #3. CreateInfo on Vertex and Fragment Shader Modules.
-        ''' These modules are simply wrappers around the Spir-V bytecode buffers.'''
-        vert_shader_module = self._ShaderModuleCreateInfo(vert_shader_spirv,
-                                                          'vertex')
-        frag_shader_module = self._ShaderModuleCreateInfo(frag_shader_spirv,
-                                                          'fragment')
-
-        try:
-            vert_shader_module = vkCreateShaderModule(self.logical_device,
-                                                      vert_shader_module, None)
-            logging.info('Created vertex shader module.')
-            frag_shader_module = vkCreateShaderModule(self.logical_device,
-                                                      frag_shader_module, None)
-            logging.info('Created fragment shader module.')
-        except VkError:
-            logging.error('Vertex and/or Fragment Shader Modules fail to create.')
-
-        #4. Create the info to create the Vertex and Fragment shader stages.
-        vert_shader_stage = VkPipelineShaderStageCreateInfo(
-            stage = VK_SHADER_STAGE_VERTEX_BIT,
-            module = vert_shader_module,
-            pName = 'main',
-            pSpecializationInfo = None)
-
-        frag_shader_stage = VkPipelineShaderStageCreateInfo(
-            stage = VK_SHADER_STAGE_FRAGMENT_BIT,
-            module = frag_shader_module,
-            pName = 'main',
-            pSpecializationInfo = None)
- 
-        pipeline_shader_stages = [vert_shader_stage,frag_shader_stage]
+        #2. Get the Shader Modules of the key's Spir-V shaders, e.g. the
+        #   Vertex and Fragment shaders. The registry loads each file and
+        #   creates its module only once; the modules live until the logical
+        #   device is destroyed.
+        #3. Create the info to create the shader stages, with the values of
+        #   their specialization constants, if any.
+        specialization = dict(key.specialization)
+        pipeline_shader_stages = [
+            VkPipelineShaderStageCreateInfo(
+                stage = stage,
+                module = self.shader_modules.load(path),
+                pName = 'main',
+                pSpecializationInfo = sc.specializationInfo(
+                    specialization.get(stage)))
+            for stage, path in key.shaders]
 
 
         # SETUP FIXED FUNCTIONS IN GRAPHICS PIPELINE .
 
-        #5. Describes the format of the vertex data that will be passed to the
-        #   vertex shader. Because we are hard coding the vertex data directly
-        #   in the vertex shader, we have no vertex data to load so parameters
-        #   with "Count" has zero value.
+        reflections = {stage: self.shader_modules.reflection(path)
+                       for stage, path in key.shaders}
+
+        #4. Describes the format of the vertex data that will be passed to the
+        #   vertex shader, from the inputs of its reflection. The
+        #   HelloTriangle vertex shader hard codes the vertex data, i.e. has
+        #   no inputs, so parameters with "Count" have zero value.
+        #   REVISED: The inputs of the instanced vertex shader advance per
+        #   instance, see setInstances().
+        bindings, attributes = ((), ())
+        if VK_SHADER_STAGE_VERTEX_BIT in reflections:
+            bindings, attributes = sr.vertexInputDescription(
+                reflections[VK_SHADER_STAGE_VERTEX_BIT],
+                input_rate=key.vertex_input_rate)
+        vertex_bindings = [
+            VkVertexInputBindingDescription(
+                binding = binding,
+                stride = stride,
+                inputRate = input_rate)
+            for binding, stride, input_rate in bindings]
+        vertex_attributes = [
+            VkVertexInputAttributeDescription(
+                location = location,
+                binding = binding,
+                format = attribute_format,
+                offset = offset)
+            for location, binding, attribute_format, offset in attributes]
         vertex_input = VkPipelineVertexInputStateCreateInfo(
-            vertexBindingDescriptionCount = 0,
-            pVertexBindingDescriptions = None, # optional
-            vertexAttributeDescriptionCount = 0,
-            pVertexAttributeDescriptions = None) # optional
+            vertexBindingDescriptionCount = len(vertex_bindings),
+            pVertexBindingDescriptions = vertex_bindings or None,
+            vertexAttributeDescriptionCount = len(vertex_attributes),
+            pVertexAttributeDescriptions = vertex_attributes or None)
 
-        #6. Describe what kind of geometry will be drawn from the vertices and
+        #5. Describe what kind of geometry will be drawn from the vertices and
         #   if primitive restart should be enabled.
         input_assembly = VkPipelineInputAssemblyStateCreateInfo(
-            topology = VK_PRIMITIVE_TOPOLOGY_TRIANGLE_LIST,
+            topology = key.topology,
             primitiveRestartEnable = VK_FALSE)
 
-        #7. - A viewport describes the region of the framebuffer that the output
+        #6. - A viewport describes the region of the framebuffer that the output
         #     will be rendered to. Here, the viewport size equals swapchain image
         #     extent size.
         #   - A scissor rectangle definse in which regions pixels will actually 
         #     be stored. Any pixels outside the scissor rectangles will be 
         #     discarded by the rasterizer. They function like a filter.
         #   - Using multiple requires enabling a GPU feature in logical device.
-        viewport = VkViewport(
-            x = 0.,
-            y = 0.,
-            width = float(self.swapchain_imageExtent.width),
-            height = float(self.swapchain_imageExtent.height),
-            minDepth = 0.,
-            maxDepth = 1.)
-        
-        scissor_offset = VkOffset2D(x=0, y=0)
-        scissor = VkRect2D( offset = scissor_offset,
-                            extent = self.swapchain_imageExtent )
-
+        #   - REVISED: The viewport and scissor are dynamic states (see #11),
+        #     i.e. they are set when the command buffers are recorded. So the
+        #     pipeline does not depend on the swapchain extent and survives
+        #     window resizes. Only their count is given here.
         viewport_state = VkPipelineViewportStateCreateInfo(
             viewportCount = 1,
-            pViewports = [viewport],
+            pViewports = None,
             scissorCount = 1,
-            pScissors=[scissor] )
+            pScissors = None )
 
-        #8. - The rasterizer takes the geometry that is shaped by the vertices
+        #7. - The rasterizer takes the geometry that is shaped by the vertices
         #     from the vertex shader and turns it into fragments to be colored by
         #     the fragment shader. It also performs depth testing, face culling
         #     and the scissor test, and it can be configured to output fragments
@@ -1070,16 +1348,16 @@ class Setup(object):
         rasterizer = VkPipelineRasterizationStateCreateInfo(
             depthClampEnable = VK_FALSE,
             rasterizerDiscardEnable = VK_FALSE,
-            polygonMode = VK_POLYGON_MODE_FILL,
+            polygonMode = key.polygon_mode,
             lineWidth = 1.0,
-            cullMode = VK_CULL_MODE_BACK_BIT,
-            frontFace = VK_FRONT_FACE_CLOCKWISE,
+            cullMode = key.cull_mode,
+            frontFace = key.front_face,
             depthBiasEnable = VK_FALSE,
             depthBiasConstantFactor = 0.,
             depthBiasClamp = 0.,
             depthBiasSlopeFactor = 0.)
 
-        #9. Multisampling is one of the ways to perform anti-aliasing. It works
+        #8. Multisampling is one of the ways to perform anti-aliasing. It works
         #   by combining the fragment shader results of multiple polygons that
         #   rasterize to the same pixel. This mainly occurs along edges, which
         #   is also where the most noticeable aliasing artifacts occur. Because
@@ -1095,7 +1373,7 @@ class Setup(object):
             alphaToCoverageEnable = VK_FALSE,
             alphaToOneEnable = VK_FALSE)
 
-        #10. Colorblending
+        #9. Colorblending
         #    - After a fragment shader has returned a color, it needs to be
         #      combined with the color that is already in the framebuffer. This
         #      transformation is known as color blending and there are two ways
@@ -1107,15 +1385,18 @@ class Setup(object):
         #         per attached framebuffer.
         #      2. VkPipelineColorBlendStateCreateInfo contains the global color
         #         blending settings.
-        #    - In our case we only have one framebuffer:
+        #    - In our case we only have one framebuffer, blended according to
+        #      the key's mode of pipelinelibrary.BLEND_MODES:
+        blend_enable, src_color, dst_color, src_alpha, dst_alpha = \
+            pl.BLEND_MODES[key.blend]
         color_blend_attachement = VkPipelineColorBlendAttachmentState(
             colorWriteMask = VK_COLOR_COMPONENT_R_BIT | VK_COLOR_COMPONENT_G_BIT | VK_COLOR_COMPONENT_B_BIT | VK_COLOR_COMPONENT_A_BIT,
-            blendEnable = VK_FALSE,
-            srcColorBlendFactor = VK_BLEND_FACTOR_ONE,
-            dstColorBlendFactor = VK_BLEND_FACTOR_ZERO,
+            blendEnable = blend_enable,
+            srcColorBlendFactor = src_color,
+            dstColorBlendFactor = dst_color,
             colorBlendOp = VK_BLEND_OP_ADD,
-            srcAlphaBlendFactor = VK_BLEND_FACTOR_ONE,
-            dstAlphaBlendFactor = VK_BLEND_FACTOR_ZERO,
+            srcAlphaBlendFactor = src_alpha,
+            dstAlphaBlendFactor = dst_alpha,
             alphaBlendOp = VK_BLEND_OP_ADD)
 
         color_blend = VkPipelineColorBlendStateCreateInfo(
@@ -1125,34 +1406,28 @@ class Setup(object):
             pAttachments = [color_blend_attachement],
             blendConstants = [0, 0, 0, 0])
 
-        #11. Dynamic states
+        #10. Dynamic states
         #    - to dynamically change the size of the viewport, line width and blend
         #      constants w/o having to create a new pipelines
         #    - use VkPipelineDynamicStateCreateInfo, or
         #    - use VkPushConstantRange
-        push_constant_ranges = VkPushConstantRange(
-            stageFlags = 0,
-            offset = 0,
-            size = 0)
-
-        #12. Create Pipeline Layout Create Info
-        pipeline_layout_createInfo = VkPipelineLayoutCreateInfo(
-            setLayoutCount = 0,
-            pSetLayouts = None,
-            pushConstantRangeCount = 0,
-            pPushConstantRanges = [push_constant_ranges])
-
-        #13. Create Pipeline Layout
-        try:
-            self.pipeline_layout = vkCreatePipelineLayout(
-                self.logical_device, pipeline_layout_createInfo, None)
-            logging.info('Created pipeline layout.')
-        except VkError:
-            logging.error('Pipeline Layout failed to create.')
+        dynamic_states = [VK_DYNAMIC_STATE_VIEWPORT, VK_DYNAMIC_STATE_SCISSOR]
+        dynamic_state = VkPipelineDynamicStateCreateInfo(
+            dynamicStateCount = len(dynamic_states),
+            pDynamicStates = dynamic_states)
+
+        #11. Describe the Pipeline Layout, i.e. the descriptor sets and push
+        #    constants of the shaders, from their reflections.
+        layout_description = sr.layoutDescription(reflections.values())
+
+        #12. Get the Pipeline Layout. It does not depend on the render pass,
+        #    so it is kept when the pipeline is recreated, and shared by the
+        #    pipelines with the same layout.
+        pipeline_layout = self._pipelineLayout(layout_description)
 
-        #14. Create Pipeline CreateInfo
+        #13. Create Pipeline CreateInfo
         pipeline_createInfo = VkGraphicsPipelineCreateInfo(
-            stageCount = 2,
+            stageCount = len(pipeline_shader_stages),
             pStages = pipeline_shader_stages,
             pVertexInputState = vertex_input,
             pInputAssemblyState = input_assembly,
@@ -1162,27 +1437,62 @@ class Setup(object):
             pMultisampleState = multisample,
             pDepthStencilState = None,
             pColorBlendState = color_blend,
-            pDynamicState = None,
-            layout = self.pipeline_layout,
+            pDynamicState = dynamic_state,
+            layout = pipeline_layout,
             renderPass = self.render_pass,
             subpass = 0,
             basePipelineHandle = None,
             basePipelineIndex = -1)
+        return pipeline_createInfo
 
-        #15. Create Graphics Pipeline
+
+    def _pipelineLayout(self, description):
+        '''Return the VkPipelineLayout of a spirvreflect.layoutDescription,
+           creating it and its descriptor set layouts the first time.'''
+        if description in self.pipeline_layouts:
+            return self.pipeline_layouts[description][0]
+
+        sets, push_constants = description
+        set_layouts = []
         try:
-            self.graphics_pipeline = vkCreateGraphicsPipelines(
-                self.logical_device, None, 1, [pipeline_createInfo], None)
-            logging.info('Created graphics pipeline.')
+            for bindings in sets:
+                layout_bindings = [
+                    VkDescriptorSetLayoutBinding(
+                        binding = binding,
+                        descriptorType = descriptor_type,
+                        descriptorCount = count,
+                        stageFlags = stage_flags,
+                        pImmutableSamplers = None)
+                    for binding, descriptor_type, count, stage_flags
+                    in bindings]
+                set_layout_createInfo = VkDescriptorSetLayoutCreateInfo(
+                    bindingCount = len(layout_bindings),
+                    pBindings = layout_bindings or None)
+                set_layouts.append(vkCreateDescriptorSetLayout(
+                    self.logical_device, set_layout_createInfo, None))
+
+            push_constant_ranges = [
+                VkPushConstantRange(
+                    stageFlags = stage_flags,
+                    offset = offset,
+                    size = size)
+                for stage_flags, offset, size in push_constants]
+            pipeline_layout_createInfo = VkPipelineLayoutCreateInfo(
+                setLayoutCount = len(set_layouts),
+                pSetLayouts = set_layouts or None,
+                pushConstantRangeCount = len(push_constant_ranges),
+                pPushConstantRanges = push_constant_ranges or None)
+            pipeline_layout = vkCreatePipelineLayout(
+                self.logical_device, pipeline_layout_createInfo, None)
+            logging.info('Created pipeline layout with {0} descriptor set(s) '
+                         'and {1} push constant range(s).'.format(
+                             len(set_layouts), len(push_constant_ranges)))
         except VkError:
-            logging.error('Graphics pipeline failed to create.')
+            logging.error('Pipeline Layout failed to create.')
             exit()
-                    
-        #16. Destroy Vertex and Fragment Shader Modules.
-        vkDestroyShaderModule(self.logical_device, frag_shader_module, None)
-        vkDestroyShaderModule(self.logical_device, vert_shader_module, None)
-        logging.info('Destroyed Vulkan Fragment Shader Module.')
-        logging.info('Destroyed Vulkan Vertex Shader Module.')
+
+        self.pipeline_layouts[description] = (pipeline_layout, set_layouts)
+        return pipeline_layout
 
 
     def _createFramebuffers (self):
@@ -1233,10 +1543,100 @@ class Setup(object):
             logging.error('Command Pool failed to create.')
             exit()
 
+    def _createGpuTimer(self):
+        '''Create the timestamp queries that measure the GPU time of every
+           frame, if gpu_timestamps and the graphics queue supports
+           timestamps.'''
+        if not self.gpu_timestamps:
+            return
+        valid_bits = vkGetPhysicalDeviceQueueFamilyProperties(
+            self.physical_device)[
+                self.queue_families_graphics_index].timestampValidBits
+        if not valid_bits:
+            logging.warning('The graphics queue does not support timestamps: '
+                            'GPU time is not measured.')
+            return
+        self.gpu_timer = gt.GpuTimer(
+            self.logical_device,
+            self.physical_device_properties.limits.timestampPeriod,
+            valid_bits)
+
+
+    def _createCommandRecorder(self):
+        '''Create the threads that record secondary command buffers, if
+           record_threads.'''
+        if self.record_threads:
+            self.command_recorder = cr.CommandRecorder(
+                self.logical_device, self.queue_families_graphics_index,
+                self.record_threads)
+
+
+    def _createFramePools(self):
+        '''Create the command pool of every frame in flight, and its command
+           buffer, for the dynamic-scene mode.
+
+        Notes:
+        - The pools are transient, i.e. their command buffers are short
+          lived, so the driver can optimise their allocation.
+        - Each frame, _drawFrame resets the whole pool of the frame once its
+          fence has signaled, and records its command buffer anew. No command
+          buffer is allocated or freed per frame.'''
+        if not self.dynamic_scene:
+            return
+        createInfo = VkCommandPoolCreateInfo(
+            flags = VK_COMMAND_POOL_CREATE_TRANSIENT_BIT,
+            queueFamilyIndex = self.queue_families_graphics_index)
+        try:
+            for i in range(self.max_frames_in_flight):
+                pool = vkCreateCommandPool(self.logical_device, createInfo,
+                                           None)
+                self.frame_pools.append(pool)
+                allocateInfo = VkCommandBufferAllocateInfo(
+                    commandPool = pool,
+                    level = VK_COMMAND_BUFFER_LEVEL_PRIMARY,
+                    commandBufferCount = 1)
+                self.frame_command_buffers.append(vkAllocateCommandBuffers(
+                    self.logical_device, allocateInfo)[0])
+            logging.info('Created {} transient command pools.'.format(
+                len(self.frame_pools)))
+        except VkError:
+            logging.error('Transient Command Pools failed to create.')
+            exit()
+
+
+    def _recordFrame(self, frame, image_index):
+        '''Reset the command pool of a frame in flight, whose fence has
+           signaled, and record its command buffer for a swapchain image with
+           the current draws. Returns the command buffer.'''
+        command_buffer = self.frame_command_buffers[frame]
+        vkResetCommandPool(self.logical_device, self.frame_pools[frame], 0)
+        # The copy of the indirect draws of this frame is no longer read.
+        if self.indirect_commands is not None:
+            self.indirect_draws.write(self.indirect_commands, frame)
+            self.indirect_draws.copy = frame
+        if self.instances is not None:
+            self.instance_buffer.write(self.instances, frame)
+            self._setInstanceItem(frame)
+        try:
+            self._recordCommandBuffer(
+                command_buffer, image_index,
+                VK_COMMAND_BUFFER_USAGE_ONE_TIME_SUBMIT_BIT)
+        except VkError:
+            logging.error('Command Buffer of frame {} failed to '
+                          'record.'.format(frame))
+            exit()
+        return command_buffer
+
+
     def _createCommandBuffer(self):
         ''' Create Vulkan Command Buffer.
 
-        Steps: (1)Create Command Buffer, (2)Record command buffer '''
+        Steps: (1)Create Command Buffer, (2)Record command buffer
+
+        In dynamic-scene mode, there are none: every frame is recorded by
+        _recordFrame.'''
+        if self.dynamic_scene:
+            return
         
         # Create command buffer
         allocateInfo = VkCommandBufferAllocateInfo(
@@ -1255,65 +1655,24 @@ class Setup(object):
 
         # Record command buffer
         try:
-            for i, command_buffer in enumerate(self.command_buffers):
-                command_buffer_begin_createInfo = VkCommandBufferBeginInfo(
-                    flags = VK_COMMAND_BUFFER_USAGE_SIMULTANEOUS_USE_BIT,
-                    #specifies how we're going to use the command buffer.
-                    pInheritanceInfo = None
-                    #only relevant for secondary command buffers
-                    )
+            # With record_threads, the draws of every framebuffer are
+            # recorded into secondary command buffers on the recording
+            # threads, see commandrecorder.CommandRecorder. They are sorted
+            # before they are split, so that each chunk binds little.
+            draws = self._sceneDraws()
+            secondaries = None
+            if self.command_recorder:
+                secondaries, self.secondary_frees = \
+                    self.command_recorder.record(
+                        [(self.render_pass, framebuffer, draws)
+                         for framebuffer in self.swapchain_framebuffers],
+                        self._recordDraws)
 
-                vkBeginCommandBuffer( command_buffer,
-                                      command_buffer_begin_createInfo )
-
-                # Create render pass
-                render_area = VkRect2D( offset = VkOffset2D(x=0,y=0),
-                                        extent = self.swapchain_imageExtent )
-                # - defines where shader loads and stores will take place.
-                #   The pixels outside this region will have undefined values.
-                #   It should match the size of the attachments for best performance.
-
-                color = VkClearColorValue( float32 = [0., 0., 0., 1.0] )
-                clear_value = VkClearValue( color = color )
-                # - clear values to use for VK_ATTACHMENT_LOAD_OP_CLEAR, which 
-                #   we used as load operation for the color attachment. Here, 
-                #   clear color is black with 100% opacity.
-                # - in float32 the SRGB numerical format is used: [R,G,B,A]
-                #   where each is an unsigned normalized value (0. to 1.)
-
-                render_pass_begin_createInfo = VkRenderPassBeginInfo(
-                    renderPass = self.render_pass,
-                    renderArea = render_area,
-                    framebuffer = self.swapchain_framebuffers[i],
-                    clearValueCount = 1,
-                    pClearValues = [clear_value] )
-
-                # start render pass
-                vkCmdBeginRenderPass( command_buffer,
-                                      render_pass_begin_createInfo,
-                                      VK_SUBPASS_CONTENTS_INLINE ) # see below comment
-                # The render pass commands will be embedded in the primary command buffer
-                # itself and no secondary command buffers will be executed.
-
-                # Bind graphics pipeline
-                vkCmdBindPipeline( command_buffer,
-                                   VK_PIPELINE_BIND_POINT_GRAPHICS,
-                                   self.graphics_pipeline )
-
-                # Draw
-                vkCmdDraw( command_buffer, 3, 1, 0, 0 )
-                #vertexCount: Even though we don't have a vertex buffer, we
-                #             technically still have 3 vertices to draw.
-                #instanceCount: Used for instanced rendering, use 1 if you're not
-                #               doing that.
-                #firstVertex: Used as an offset into the vertex buffer, defines the
-                #             lowest value of gl_VertexIndex.
-                #firstInstance: Used as an offset for instanced rendering, defines
-                #               the lowest value of gl_InstanceIndex.
-
-                # End
-                vkCmdEndRenderPass(command_buffer)
-                vkEndCommandBuffer(command_buffer)
+            for i, command_buffer in enumerate(self.command_buffers):
+                self._recordCommandBuffer(
+                    command_buffer, i,
+                    VK_COMMAND_BUFFER_USAGE_SIMULTANEOUS_USE_BIT,
+                    None if secondaries is None else secondaries[i], draws)
 
             logging.info('Recorded command buffer.')
 
@@ -1322,22 +1681,211 @@ class Setup(object):
             exit()
 
 
-    def _createSemaphores(self):
-        ''' Create 2 semaphores to synchronize the drawing and presentation
-             of images by vkCmdDraw.
+    def _recordCommandBuffer(self, command_buffer, image_index, flags,
+                             secondaries=None, draws=None):
+        '''Record the render pass of a swapchain image into a primary command
+           buffer, with the draws inline, or by executing secondaries, the
+           secondary command buffers of the image.
+
+        flags are the VkCommandBufferUsageFlags of the command buffer. draws
+        defaults to the draws of the scene, sorted, see _sceneDraws.'''
 
-        Need one semaphore to signal that an image has been acquired and is
-        ready for drawing, and another semaphore to signal that drawing has
-        finished and presentation can happen.'''
+        command_buffer_begin_createInfo = VkCommandBufferBeginInfo(
+            flags = flags,
+            #specifies how we're going to use the command buffer.
+            pInheritanceInfo = None
+            #only relevant for secondary command buffers
+            )
+
+        vkBeginCommandBuffer( command_buffer,
+                              command_buffer_begin_createInfo )
+
+        # Time the command buffer on the GPU, see gpuFrameTimes().
+        timed = self.gpu_timer and image_index < self.gpu_timer.slots
+        if timed:
+            self.gpu_timer.begin(command_buffer, image_index)
+
+        # Create render pass
+        render_area = VkRect2D( offset = VkOffset2D(x=0,y=0),
+                                extent = self.swapchain_imageExtent )
+        # - defines where shader loads and stores will take place.
+        #   The pixels outside this region will have undefined values.
+        #   It should match the size of the attachments for best performance.
+
+        color = VkClearColorValue( float32 = [0., 0., 0., 1.0] )
+        clear_value = VkClearValue( color = color )
+        # - clear values to use for VK_ATTACHMENT_LOAD_OP_CLEAR, which 
+        #   we used as load operation for the color attachment. Here, 
+        #   clear color is black with 100% opacity.
+        # - in float32 the SRGB numerical format is used: [R,G,B,A]
+        #   where each is an unsigned normalized value (0. to 1.)
+
+        render_pass_begin_createInfo = VkRenderPassBeginInfo(
+            renderPass = self.render_pass,
+            renderArea = render_area,
+            framebuffer = self.swapchain_framebuffers[image_index],
+            clearValueCount = 1,
+            pClearValues = [clear_value] )
+
+        # start render pass
+        if secondaries is None:
+            contents = VK_SUBPASS_CONTENTS_INLINE
+        else:
+            contents = VK_SUBPASS_CONTENTS_SECONDARY_COMMAND_BUFFERS
+        vkCmdBeginRenderPass( command_buffer,
+                              render_pass_begin_createInfo,
+                              contents ) # see below comment
+        # The render pass commands will be embedded in the primary command buffer
+        # itself and no secondary command buffers will be executed.
+        # REVISED: Unless they were recorded into secondary command
+        # buffers, which the primary command buffer then executes.
+        if secondaries is None:
+            self._recordDraws(command_buffer,
+                              self._sceneDraws() if draws is None else draws)
+        elif secondaries:
+            vkCmdExecuteCommands( command_buffer, len(secondaries),
+                                  secondaries )
+
+        # End
+        vkCmdEndRenderPass(command_buffer)
+        if timed:
+            self.gpu_timer.end(command_buffer, image_index)
+        vkEndCommandBuffer(command_buffer)
+
+
+    def _sceneDraws(self):
+        '''Return the draws of the scene, sorted by their state if
+           sort_draws, see drawbatcher.DrawBatcher.sort.'''
+        if self.sort_draws:
+            return self.draw_batcher.sort(self.draws)
+        return list(self.draws)
+
+
+    def _recordDraws(self, command_buffer, draws):
+        '''Record the draws of the scene, with the state they need, into a
+           primary or secondary command buffer.
+
+        draws is a sequence of drawbatcher.DrawItem. Runs on the recording
+        threads with record_threads.'''
+
+        # Set the dynamic viewport and scissor to the swapchain extent. They
+        # stay set across the pipelines bound below, which all have them
+        # dynamic.
+        viewport = VkViewport(
+            x = 0.,
+            y = 0.,
+            width = float(self.swapchain_imageExtent.width),
+            height = float(self.swapchain_imageExtent.height),
+            minDepth = 0.,
+            maxDepth = 1.)
+        scissor = VkRect2D( offset = VkOffset2D(x=0,y=0),
+                            extent = self.swapchain_imageExtent )
+        vkCmdSetViewport( command_buffer, 0, 1, [viewport] )
+        vkCmdSetScissor( command_buffer, 0, 1, [scissor] )
+
+        # Bind graphics pipelines, descriptor sets and vertex buffers, only
+        # when they change, and draw
+        self.draw_batcher.record(command_buffer, draws,
+                                 self.graphics_pipeline)
+        #The arguments of vkCmdDraw, i.e. DrawItem.args:
+        #vertexCount: Even though we don't have a vertex buffer, we
+        #             technically still have 3 vertices to draw.
+        #instanceCount: Used for instanced rendering, use 1 if you're not
+        #               doing that.
+        #firstVertex: Used as an offset into the vertex buffer, defines the
+        #             lowest value of gl_VertexIndex.
+        #firstInstance: Used as an offset for instanced rendering, defines
+        #               the lowest value of gl_InstanceIndex.
+
+
+    def _createSyncObjects(self):
+        ''' Create the semaphores and fences that synchronize the drawing and
+            presentation of images of every frame in flight.
+
+        Notes:
+        - Each frame in flight needs one semaphore to signal that an image has
+          been acquired and is ready for drawing, and another semaphore to
+          signal that drawing has finished and presentation can happen.
+        - Each frame in flight also needs a fence, so that the CPU waits for
+          the GPU to finish that frame before its semaphores are reused. The
+          fences are created signaled so that the first wait does not block.
+        - images_in_flight holds the index of the frame in flight that is using
+          each swapchain image, or None. It is needed when the swapchain
+          returns images out of order or has fewer images than there are
+          frames in flight.'''
         
-        createInfo = VkSemaphoreCreateInfo()
-        self.semaphore_image_available = vkCreateSemaphore(
-            self.logical_device, createInfo, None)
-        self.semaphore_image_drawn = vkCreateSemaphore(
-            self.logical_device, createInfo, None)
+        semaphore_createInfo = VkSemaphoreCreateInfo()
+        fence_createInfo = VkFenceCreateInfo(flags=VK_FENCE_CREATE_SIGNALED_BIT)
+
+        try:
+            for i in range(self.max_frames_in_flight):
+                self.semaphores_image_available.append( vkCreateSemaphore(
+                    self.logical_device, semaphore_createInfo, None) )
+                self.semaphores_image_drawn.append( vkCreateSemaphore(
+                    self.logical_device, semaphore_createInfo, None) )
+                self.fences_in_flight.append( vkCreateFence(
+                    self.logical_device, fence_createInfo, None) )
+        except VkError:
+            logging.error('Semaphores and/or Fences failed to create.')
+            exit()
+        self.images_in_flight = [None] * len(self.swapchain_images)
+
+        logging.info('Created {} Semaphores for image_available.'.format(
+            self.max_frames_in_flight))
+        logging.info('Created {} Semaphores for image_drawn.'.format(
+            self.max_frames_in_flight))
+        logging.info('Created {} Fences for frames in flight.'.format(
+            self.max_frames_in_flight))
 
-        logging.info('Created Semaphore for image_available.')
-        logging.info('Created Semaphore for image_drawn.')
+
+    def _prepareFrameInfos(self):
+        ''' Build the VkSubmitInfo and VkPresentInfoKHR structs of every frame
+            in flight once, for the "prepared frame" mode of _drawFrame.
+
+        Notes:
+        - The semaphores of a frame in flight never change, and the swapchain
+          changes only when it is recreated. So these structs are rebuilt only
+          at creation and in _recreateSwapChain. Each frame, _drawFrame merely
+          writes the command buffer and the image index into the arrays that
+          the structs point to.
+        - The one-element fence arrays given to vkWaitForFences and
+          vkResetFences are kept too, and the swapchain function pointers are
+          looked up once instead of every frame through self.fnp.'''
+
+        if not self.prepared_frames:
+            return
+
+        wait_stages = [VK_PIPELINE_STAGE_COLOR_ATTACHMENT_OUTPUT_BIT]
+        self.submit_infos = []
+        self.present_infos = []
+        self.fence_arrays = []
+        for i in range(self.max_frames_in_flight):
+            self.submit_infos.append( VkSubmitInfo(
+                waitSemaphoreCount = 1,
+                pWaitSemaphores = [self.semaphores_image_available[i]],
+                pWaitDstStageMask = wait_stages,
+                commandBufferCount = 1,
+                pCommandBuffers = [self.frame_command_buffers[i]
+                                   if self.dynamic_scene
+                                   else self.command_buffers[0]],
+                # pCommandBuffers[0] is overwritten every frame.
+                signalSemaphoreCount = 1,
+                pSignalSemaphores = [self.semaphores_image_drawn[i]]) )
+            self.present_infos.append( VkPresentInfoKHR(
+                waitSemaphoreCount = 1,
+                pWaitSemaphores = [self.semaphores_image_drawn[i]],
+                swapchainCount = 1,
+                pSwapchains = [self.swapchain],
+                pImageIndices = [0],
+                # pImageIndices[0] is overwritten every frame.
+                pResults = None) )
+            self.fence_arrays.append(
+                ffi.new('VkFence[1]', [self.fences_in_flight[i]]) )
+
+        self.acquire_next_image = self.fnp['vkAcquireNextImageKHR']
+        self.queue_present = self.fnp['vkQueuePresentKHR']
+        logging.info('Prepared submit and present infos of {} frames in '
+                     'flight.'.format(self.max_frames_in_flight))
 
 
     def _drawFrame(self):
@@ -1353,12 +1901,37 @@ class Setup(object):
         #  surface, but the surface properties are no longer matched exactly. 
         #  For example, the platform may be simply resizing the image to fit 
         #  the window now.    
+        #REVISED:
+        #- These conditions and window resizes only notify the
+        #  resize_controller. The swapchain is recreated here, at most once per
+        #  frame and only after the resize signals have been quiet for the
+        #  debounce period.
+        #- Returns True if a frame was submitted, False if it was skipped.
+        if not self._serviceResize():
+            self.resize_controller.frameSkipped()
+            return False
+        self._swapPendingPipeline()
+
+        #0. Wait for the GPU to finish the frame that last used this frame's
+        #   semaphores and fence. Up to max_frames_in_flight frames can be
+        #   queued before the CPU has to wait here.
+        frame = self.current_frame
+        if self.prepared_frames:
+            fences = self.fence_arrays[frame]
+            acquire_next_image = self.acquire_next_image
+        else:
+            fences = [self.fences_in_flight[frame]]
+            acquire_next_image = self.fnp['vkAcquireNextImageKHR']
+        vkWaitForFences(self.logical_device, 1, fences, VK_TRUE, UINT64_MAX)
+        self._frameCompleted(frame)
+
+        acquire_start = time.perf_counter()
         try:
             #1. Acquire an available presentable image from swapchain to use,
             #   and retrieve the index of that image
-            image_index = self.fnp['vkAcquireNextImageKHR'](
+            image_index = acquire_next_image(
                 self.logical_device, self.swapchain, UINT64_MAX,
-                self.semaphore_image_available, VK_NULL_HANDLE )
+                self.semaphores_image_available[frame], VK_NULL_HANDLE )
                 # Notes:
                 #-timeout=UINT64_MAX means this function will not return until
                 # an image is acquired from the presentation engine.
@@ -1366,80 +1939,137 @@ class Setup(object):
                 # when an image becomes available, or when the specified number
                 # of nanoseconds have passed (in which case it will return
                 # VK_TIMEOUT). 
-        except VK_ERROR_OUT_OF_DATE_KHR:
+        except VkErrorOutOfDateKhr:
             logging.info(
-                "Acquired swapchain image is out-of-date. Recreate Swapchain!")
-            self._recreateSwapChain()
-        except VK_SUBOPTIMAL_KHR:
-                logging.info(
-                    "Acquired swapchain image is sub-optimal but can be used.")
+                "Acquired swapchain image is out-of-date. Skip frame.")
+            self.swapchain_out_of_date = True
+            self.resize_controller.notify('acquire out-of-date')
+            self.resize_controller.frameSkipped()
+            return False
+        except VkSuboptimalKhr:
+            # The image was acquired, but the vulkan wrapper raises instead of
+            # returning its index, so it cannot be drawn or presented. The
+            # image_available semaphore will still be signaled; replace it so
+            # that the next acquire of this frame waits on a clean semaphore.
+            logging.info(
+                "Acquired swapchain image is sub-optimal. Skip frame.")
+            self._replaceImageAvailableSemaphore(frame)
+            self.swapchain_out_of_date = True
+            self.resize_controller.notify('acquire sub-optimal')
+            self.resize_controller.frameSkipped()
+            return False
         except VkError as e:
             logging.error('VkError: {}'.format(e))
             logging.error("Failed to acquire swapchain image!")
+            self.resize_controller.frameSkipped()
+            return False
         except VkException as e:
             logging.error('VkException: {}'.format(e))
             logging.error("Failed to acquire swapchain image!")
+            self.resize_controller.frameSkipped()
+            return False
 
-        #2. Create info to submit command buffer to queue')
-        wait_semaphores = [self.semaphore_image_available]
-        wait_stages = [VK_PIPELINE_STAGE_COLOR_ATTACHMENT_OUTPUT_BIT]
-        signal_semaphores = [self.semaphore_image_drawn]
-        submitInfo = VkSubmitInfo(
-            waitSemaphoreCount = len(wait_semaphores),
-            pWaitSemaphores = wait_semaphores,
-            pWaitDstStageMask = wait_stages,
-            #- specify which semaphores to wait on before execution begins and
-            #  in which stage(s) of the pipeline to wait. 
-            commandBufferCount = 1,
-            pCommandBuffers = [self.command_buffers[image_index]],
-            #- specify which command buffers to actually submit for execution.
-            #  As mentioned earlier, we should submit the command buffer that 
-            #  binds the swap chain image we just acquired as color attachment.
-            signalSemaphoreCount = len(signal_semaphores),
-            pSignalSemaphores = signal_semaphores)
-            #- specify which semaphores to signal once the command buffer(s)
-            #   have finished execution. In our case we're using the 
-            #   renderFinishedSemaphore for that purpose.
-
-        #3. Submit command buffer to queue
-        vkQueueSubmit(self.graphics_queue, 1, submitInfo, None)
-
-        #4. Setup Subpass Dependencies, see Section 8.4')
-
-        #5 Create info to present command buffer result in swapchain')
+        #   Measure how long acquire blocked, to size the swapchain.
+        self.acquire_tuner.record(time.perf_counter() - acquire_start)
+        if self.adaptive_image_count:
+            self._adaptImageCount()
+
+        #2. Wait for a previous frame that is still using this swapchain image,
+        #   then mark the image as being used by this frame.
+        image_frame = self.images_in_flight[image_index]
+        if image_frame is not None and image_frame != frame:
+            vkWaitForFences(self.logical_device, 1,
+                            [self.fences_in_flight[image_frame]],
+                            VK_TRUE, UINT64_MAX)
+            self._frameCompleted(image_frame)
+        self.images_in_flight[image_index] = frame
+
+        #   In dynamic-scene mode, record the command buffer of this frame
+        #   anew, with the current draws.
+        if self.dynamic_scene:
+            command_buffer = self._recordFrame(frame, image_index)
+        else:
+            command_buffer = self.command_buffers[image_index]
+
+        #3. Create info to submit command buffer to queue')
+        #   In "prepared frame" mode, only the command buffer of the acquired
+        #   image is written into the prebuilt submit info.
+        if self.prepared_frames:
+            submitInfo = self.submit_infos[frame]
+            submitInfo.pCommandBuffers[0] = command_buffer
+        else:
+            wait_semaphores = [self.semaphores_image_available[frame]]
+            wait_stages = [VK_PIPELINE_STAGE_COLOR_ATTACHMENT_OUTPUT_BIT]
+            signal_semaphores = [self.semaphores_image_drawn[frame]]
+            submitInfo = VkSubmitInfo(
+                waitSemaphoreCount = len(wait_semaphores),
+                pWaitSemaphores = wait_semaphores,
+                pWaitDstStageMask = wait_stages,
+                #- specify which semaphores to wait on before execution begins
+                #  and in which stage(s) of the pipeline to wait. 
+                commandBufferCount = 1,
+                pCommandBuffers = [command_buffer],
+                #- specify which command buffers to actually submit for
+                #  execution. As mentioned earlier, we should submit the
+                #  command buffer that binds the swap chain image we just
+                #  acquired as color attachment.
+                signalSemaphoreCount = len(signal_semaphores),
+                pSignalSemaphores = signal_semaphores)
+                #- specify which semaphores to signal once the command
+                #  buffer(s) have finished execution. In our case we're using
+                #  the renderFinishedSemaphore for that purpose.
+
+        #4. Submit command buffer to queue. The fence is signaled when the
+        #   command buffer has finished execution.
+        vkResetFences(self.logical_device, 1, fences)
+        vkQueueSubmit(self.graphics_queue, 1, submitInfo, fences[0])
+        self.frame_serial += 1
+        self.frame_serials[frame] = self.frame_serial
+        self.frame_images[frame] = image_index
+
+        #5. Setup Subpass Dependencies, see Section 8.4')
+
+        #6 Create info to present command buffer result in swapchain')
         #  The last step of drawing a frame is submitting the result back to the
         #  swapchain to have it eventually show up on the screen. Presentation
         #  is configured through a VkPresentInfoKHR structure at the end of the
         #  drawFrame function.
-        presentInfo = VkPresentInfoKHR(
-            waitSemaphoreCount = len(signal_semaphores),
-            pWaitSemaphores = signal_semaphores,
-            # above two parameters specify which semaphores to wait on before
-            #  presentation can happen, just like VkSubmitInfo.
-            swapchainCount = 1,
-            pSwapchains = [self.swapchain],
-            pImageIndices = [image_index],
-            # next two parameters specify the swapchains to present images to and 
-            # the index of the image for each swap chain. This will almost always
-            # be a single one.
-            pResults = None) # Optional
-
-        #6. Queue an image for presentation after queueing all rendering commands
+        if self.prepared_frames:
+            presentInfo = self.present_infos[frame]
+            presentInfo.pImageIndices[0] = image_index
+            queue_present = self.queue_present
+        else:
+            presentInfo = VkPresentInfoKHR(
+                waitSemaphoreCount = len(signal_semaphores),
+                pWaitSemaphores = signal_semaphores,
+                # above two parameters specify which semaphores to wait on
+                # before presentation can happen, just like VkSubmitInfo.
+                swapchainCount = 1,
+                pSwapchains = [self.swapchain],
+                pImageIndices = [image_index],
+                # next two parameters specify the swapchains to present images
+                # to and the index of the image for each swap chain. This will
+                # almost always be a single one.
+                pResults = None) # Optional
+            queue_present = self.fnp['vkQueuePresentKHR']
+
+        #7. Queue an image for presentation after queueing all rendering commands
         #   and transitioning the image to the correct layout
         #   Added: Check if image_index state is out of date due to resizing of
         #          window (same as 'vkAcquireNextImageKHR'.
         try:
-            self.fnp['vkQueuePresentKHR'](self.present_queue, presentInfo)
-        except VK_ERROR_OUT_OF_DATE_KHR:
-            logging.error(
+            queue_present(self.present_queue, presentInfo)
+        except VkErrorOutOfDateKhr:
+            logging.info(
                 "Image in present queue VK_ERROR_OUT_OF_DATE_KHR:"
-                " Recreating Swapchain.")
-            self._recreateSwapChain()
-        except VK_SUBOPTIMAL_KHR:
-            logging.error(
+                " Recreate Swapchain.")
+            self.swapchain_out_of_date = True
+            self.resize_controller.notify('present out-of-date')
+        except VkSuboptimalKhr:
+            logging.info(
                 "Image in present queue VK_SUBOPTIMAL_KHR:"
-                " Recreating swapchain.")
-            self._recreateSwapChain()
+                " Recreate swapchain.")
+            self.resize_controller.notify('present sub-optimal')
         except VkError as e:
             print('VkError: {}'.format(e))
             print("Failed to present swapchain image!")
@@ -1447,7 +2077,529 @@ class Setup(object):
             print('VkException: {}'.format(e))
             print("Failed to present swapchain image!")
 
-        vkQueueWaitIdle(self.present_queue)
+        #8. Advance to the next frame in flight. There is no need to idle the
+        #   present queue; the fences keep the CPU at most
+        #   max_frames_in_flight frames ahead of the GPU.
+        self.current_frame = (self.current_frame + 1) % self.max_frames_in_flight
+        return True
+
+
+    def setPresentProfile(self, profile):
+        '''Switch to another presentation profile of
+           surfaceinfo.PRESENT_PROFILES.
+
+        The swapchain is recreated with the profile's present mode and image
+        count the next time _drawFrame services the resize controller.'''
+        if profile not in si.PRESENT_PROFILES:
+            raise ValueError('Presentation profile must be one of {}'.format(
+                sorted(si.PRESENT_PROFILES)))
+        if profile == self.present_profile:
+            return
+        logging.info('Switch presentation profile from {0} to {1}.'.format(
+            self.present_profile, profile))
+        self.present_profile = profile
+        self.swapchain_image_count = None
+        self.image_count_change = None
+        self.image_count_blocked = set()
+        self.resize_controller.notify('present profile')
+
+
+    def _clampImageCount(self, capabilities, count):
+        '''Clamp a swapchain image count to the surface's minImageCount and
+           maxImageCount. As maxImageCount=0 means no maximum, at most 3
+           images above minImageCount are used then.'''
+        max_count = capabilities.maxImageCount
+        if max_count == 0:
+            max_count = capabilities.minImageCount + 3
+        return max(capabilities.minImageCount, min(max_count, count))
+
+
+    def _adaptImageCount(self):
+        '''Grow the swapchain image count when acquire waits are long, and
+           shrink it when acquire does not wait, within the surface limits.
+
+        Notes:
+        - The count is changed from the requested minImageCount, not from
+          the number of images the driver returned, which may be larger.
+        - Under a FIFO present mode, acquire blocks for about one refresh
+          period once frames keep up with the display, so the count is only
+          grown while the frame rate is below the refresh rate.
+        - The swapchain is recreated through the resize controller, like any
+          other swapchain change; see _checkImageCountChange().'''
+        present_mode = self.surface_info.presentMode(
+            self.physical_device, self.surface, self.present_profile)
+        vsync = present_mode in (VK_PRESENT_MODE_FIFO_KHR,
+                                 VK_PRESENT_MODE_FIFO_RELAXED_KHR)
+        delta = self.acquire_tuner.decision(vsync,
+                                            self.window.getRefreshRate())
+        if not delta or delta in self.image_count_blocked:
+            return
+        capabilities = self.surface_info.capabilities(
+            self.physical_device, self.surface, refresh=False)
+        current = self.swapchain_requested_count
+        count = self._clampImageCount(capabilities, current + delta)
+        if count == current:
+            return
+        self.acquire_tuner.changed(delta)
+        logging.info('Acquire waits: {0}. Change swapchain image count from '
+                     '{1} to {2}.'.format(self.acquire_tuner.last_stats,
+                                          current, count))
+        self.image_count_change = (len(self.swapchain_images),
+                                   self.swapchain_image_count, current,
+                                   delta)
+        self.swapchain_image_count = count
+        self.resize_controller.notify('image count')
+
+
+    def _checkImageCountChange(self):
+        '''After the swapchain is recreated, undo a change of the image count
+           that did not change the number of swapchain images, e.g. as the
+           driver returns more images than requested, and make no further
+           change that way until the number of images changes.'''
+        actual = len(self.swapchain_images)
+        if actual != self.image_count_actual:
+            self.image_count_actual = actual
+            self.image_count_blocked = set()
+        if self.image_count_change is None:
+            return
+        before, request, requested, delta = self.image_count_change
+        self.image_count_change = None
+        if actual == before:
+            logging.info('Swapchain still has {0} images: stop changing its '
+                         'image count by {1}.'.format(actual, delta))
+            self.image_count_blocked.add(delta)
+            self.swapchain_image_count = request
+            self.swapchain_requested_count = requested
+
+
+    def swapchainMetrics(self):
+        '''Return the swapchain image count, present mode and acquire-wait
+           statistics.'''
+        capabilities = self.surface_info.capabilities(
+            self.physical_device, self.surface, refresh=False)
+        return {'present_profile': self.present_profile,
+                'present_mode': self.surface_info.presentMode(
+                    self.physical_device, self.surface,
+                    self.present_profile),
+                'image_count': len(self.swapchain_images),
+                'min_image_count': capabilities.minImageCount,
+                'max_image_count': capabilities.maxImageCount,
+                'adaptive_image_count': self.adaptive_image_count,
+                'acquire_wait': self.acquire_tuner.stats()}
+
+
+    def setIndirectDraws(self, commands):
+        '''Draw commands, with graphics_pipeline, by one indirect draw call.
+
+        commands is a NumPy array of indirectdraw.DRAW_INDIRECT_COMMAND, see
+        indirectdraw.commands, or None to stop drawing them.
+
+        Notes:
+        - The indirect draws are a draw item of the scene, i.e. of draws.
+        - Their buffer is created for the number of commands, rounded up to
+          a power of two, and replaced by a larger one when they outgrow it.
+        - In dynamic-scene mode, commands is kept, and written into the copy
+          of the buffer of each frame in flight as the frame is recorded, so
+          the caller may change it in place between frames.
+        - Otherwise, the command buffers of every swapchain image read the
+          one copy of the buffer, so writing it waits for the device to be
+          idle. They are recorded again only if the buffer is new, or if the
+          draw count changed and the device cannot read it from the buffer,
+          see indirectdraw.IndirectDrawBuffer.reads_count.'''
+        rerecord = False
+        if commands is None or (self.indirect_draws and
+                                len(commands) > self.indirect_draws.max_draws):
+            if self.indirect_draws:
+                self.draws.remove(self.indirect_item)
+                self._retire([self.indirect_draws.destroy])
+                self.indirect_draws = self.indirect_item = None
+                self.indirect_commands = None
+                rerecord = True
+        if commands is not None:
+            if self.indirect_draws is None:
+                self.indirect_draws = self._createIndirectDraws(
+                    1 << max(0, len(commands) - 1).bit_length())
+                self.indirect_item = db.drawItem(self.indirect_draws)
+                self.draws.append(self.indirect_item)
+                rerecord = True
+            if self.dynamic_scene:
+                self.indirect_commands = commands
+                return
+            vkDeviceWaitIdle(self.logical_device)
+            count = self.indirect_draws.counts[0]
+            if self.indirect_draws.write(commands) != count and \
+               not self.indirect_draws.reads_count:
+                rerecord = True
+        if rerecord and not self.dynamic_scene:
+            self._retire(self._detachCommandBuffers())
+            self._createCommandBuffer()
+
+
+    def _createIndirectDraws(self, max_draws):
+        '''Return an indirectdraw.IndirectDrawBuffer of max_draws commands,
+           with a copy per frame in flight in dynamic-scene mode.'''
+        if self.memory_properties is None:
+            self.memory_properties = vkGetPhysicalDeviceMemoryProperties(
+                self.physical_device)
+        count_function = None
+        if self.draw_indirect_count:
+            count_function = vkGetDeviceProcAddr(self.logical_device,
+                                                 ind.COUNT_FUNCTIONS[False])
+        if self.physical_device_features.multiDrawIndirect:
+            max_draw_count = \
+                self.physical_device_properties.limits.maxDrawIndirectCount
+        else:
+            max_draw_count = 1
+        try:
+            indirect_draws = ind.IndirectDrawBuffer(
+                self.logical_device, self.memory_properties, max_draws,
+                copies=self.max_frames_in_flight if self.dynamic_scene else 1,
+                max_draw_count=max_draw_count, count_function=count_function)
+        except VkError:
+            logging.error('Indirect draw buffer failed to create.')
+            exit()
+        logging.info('Created indirect draw buffer of {} commands.'.format(
+            max_draws))
+        return indirect_draws
+
+
+    def setInstances(self, instances):
+        '''Draw the triangle once per instance, with one instanced draw call.
+
+        instances is a NumPy array of instancing.INSTANCE, see
+        instancing.instances and instancing.grid, or None to stop drawing
+        them.
+
+        Notes:
+        - The instances are drawn by a pipeline of instancing.SHADER, i.e.
+          instanced.vert, whose inputs advance per instance. Its SPIR-V is
+          rebuilt from instanced.vert with build_shaders or watch_shaders.
+        - The instanced draw is a draw item of the scene, i.e. of draws.
+        - Their vertex buffer is created for the number of instances,
+          rounded up to a power of two, and replaced by a larger one when
+          they outgrow it.
+        - In dynamic-scene mode, instances is kept, and written into the
+          copy of the buffer of each frame in flight as the frame is
+          recorded, so the caller may change it in place between frames.
+        - Otherwise, the command buffers of every swapchain image read the
+          one copy of the buffer, so writing it waits for the device to be
+          idle. They are recorded again if the instance count changed.'''
+        rerecord = False
+        buffer = self.instance_buffer
+        if instances is None or (buffer and
+                                 len(instances) > buffer.max_instances):
+            if buffer:
+                self._replaceDraw(self.instance_item, None)
+                self._retire([self.instance_buffer.destroy])
+                self.instance_buffer = self.instance_item = None
+                self.instances = None
+                rerecord = True
+        if instances is None:
+            if self.instance_pipeline:
+                self.pipeline_library.unpin(self.instance_pipeline)
+                self.instance_pipeline = None
+        else:
+            if self.instance_pipeline is None:
+                self._createInstancePipeline()
+            if self.instance_buffer is None:
+                self.instance_buffer = self._createInstanceBuffer(
+                    1 << max(0, len(instances) - 1).bit_length())
+            if self.dynamic_scene:
+                self.instances = instances
+                return
+            vkDeviceWaitIdle(self.logical_device)
+            self.instance_buffer.write(instances)
+            rerecord = self._setInstanceItem(0) or rerecord
+        if rerecord and not self.dynamic_scene:
+            self._retire(self._detachCommandBuffers())
+            self._createCommandBuffer()
+
+
+    def _createInstancePipeline(self):
+        '''Get the instanced variant of the graphics pipeline, i.e. with the
+           vertex shader of instancing.SHADER and its inputs per instance,
+           from the pipeline library, and pin it. The inputs of the shader
+           are checked first, so a mismatched shader is never compiled.'''
+        path = os.path.join(self.shader_dir, inst.SHADER)
+        if not os.path.exists(path):
+            raise ValueError('{} is missing. Build it from instanced.vert, '
+                             'e.g. with build_shaders.'.format(path))
+        self.shader_modules.load(path)
+        inst.checkInputs(self.shader_modules.reflection(path))
+        key = self._pipelineKey()
+        shaders = dict(key.shaders)
+        shaders[VK_SHADER_STAGE_VERTEX_BIT] = path
+        key = key._replace(
+            shaders=tuple(sorted(shaders.items())), specialization=(),
+            vertex_input_rate=VK_VERTEX_INPUT_RATE_INSTANCE)
+        try:
+            pipeline = self.pipeline_library.get(key)
+        except VkError:
+            logging.error('Instanced graphics pipeline failed to create.')
+            exit()
+        self.pipeline_library.pin(pipeline)
+        if self.instance_pipeline:
+            self.pipeline_library.unpin(self.instance_pipeline)
+        self.instance_pipeline = pipeline
+
+
+    def _createInstanceBuffer(self, max_instances):
+        '''Return an instancing.InstanceBuffer of max_instances, with a copy
+           per frame in flight in dynamic-scene mode.'''
+        if self.memory_properties is None:
+            self.memory_properties = vkGetPhysicalDeviceMemoryProperties(
+                self.physical_device)
+        try:
+            instance_buffer = inst.InstanceBuffer(
+                self.logical_device, self.memory_properties, max_instances,
+                copies=self.max_frames_in_flight if self.dynamic_scene else 1)
+        except VkError:
+            logging.error('Instance buffer failed to create.')
+            exit()
+        logging.info('Created instance buffer of {} instances.'.format(
+            max_instances))
+        return instance_buffer
+
+
+    def _setInstanceItem(self, copy):
+        '''Make the draw item of the instances of a copy of instance_buffer
+           one of draws. Returns True if it changed.'''
+        item = db.drawItem(
+            (3, self.instance_buffer.counts[copy], 0, 0),
+            pipeline=self.instance_pipeline,
+            vertex_buffers=self.instance_buffer.vertexBuffers(copy))
+        if item == self.instance_item:
+            return False
+        self._replaceDraw(self.instance_item, item)
+        self.instance_item = item
+        return True
+
+
+    def _replaceDraw(self, old, new):
+        '''Replace the draw item old, if it is one of draws, by new, or
+           remove it if new is None. new is appended if old is not found.'''
+        for i, item in enumerate(self.draws):
+            if item is old:
+                if new is None:
+                    del self.draws[i]
+                else:
+                    self.draws[i] = new
+                return
+        if new is not None:
+            self.draws.append(new)
+
+
+    def drawStats(self):
+        '''Return the draws and binds recorded, and the binds elided by
+           recording the draws with only the state changes, see
+           drawbatcher.DrawBatcher.stats. In dynamic-scene mode a record is a
+           frame.'''
+        return self.draw_batcher.stats()
+
+
+    def gpuFrameTimes(self, reset=False):
+        '''Return the GPU time statistics of the frames drawn so far, see
+           gputimer.GpuTimer.stats, or None without gpu_timestamps. reset
+           forgets them afterwards, e.g. after warm-up frames.'''
+        if not self.gpu_timer:
+            return None
+        stats = self.gpu_timer.stats()
+        if reset:
+            self.gpu_timer.reset()
+        return stats
+
+
+    def pipelineCreationReport(self):
+        '''Return how each graphics pipeline so far was created: a dict of
+           the source of the timings, 'feedback' if the device has
+           VK_EXT_pipeline_creation_feedback and 'wall-clock' otherwise, the
+           totals, and the report of each pipeline, see
+           creationfeedback.CreationFeedback.report.'''
+        pipelines = self.pipeline_library.creationReport()
+        hits = [p['cache_hit'] for p in pipelines]
+        return {'source': 'feedback' if self.creation_feedback
+                          else 'wall-clock',
+                'pipelines': pipelines,
+                'total_ms': sum(p['duration_ms'] or 0. for p in pipelines),
+                'cache_hits': hits.count(True),
+                'cache_misses': hits.count(False)}
+
+
+    def requestGraphicsPipeline(self, rebuild=False, **state):
+        '''Switch to another graphics pipeline variant, compiled on a
+           background thread if the library does not have it. Returns the
+           Future of the new VkPipeline.
+
+        Notes:
+        - state changes fields of pipeline_key, see
+          pipelinelibrary.pipelineKey, e.g. cull_mode or blend, or the
+          specialization constants of its shader stages, see _pipelineKey.
+        - rebuild compiles the variant again, e.g. after its shaders changed.
+        - _drawFrame keeps drawing with the current pipeline, and swaps in the
+          new one at the start of the first frame after it is ready.
+        - A newer request supersedes a pending one.'''
+        key = self._pipelineKey(**state)
+        if rebuild:
+            self.pipeline_library.discard(lambda k: k == key)
+        future = self.pipeline_library.request(key)
+        self.pending_pipeline = (key, future)
+        return future
+
+
+    def _swapPendingPipeline(self):
+        '''Swap in the pending graphics pipeline if it is ready.
+
+        The command buffers that bind the old pipeline are retired and
+        recorded again with the new pipeline. The old pipeline stays in the
+        library, unless it was discarded. Shader modules replaced by a
+        reload are retired here once no compile uses them.'''
+        self.pipeline_library.collect()
+        self.shader_modules.releaseStale(self.pipeline_library.compiles())
+        if self.pending_pipeline is None:
+            return
+        key, future = self.pending_pipeline
+        if not future.done():
+            return
+        self.pending_pipeline = None
+        try:
+            pipeline = future.result()
+        except VkError:
+            logging.error('Keeping the current graphics pipeline.')
+            return
+        self.pipeline_key = key
+        if pipeline == self.graphics_pipeline:
+            return
+
+        self._retire(self._detachCommandBuffers())
+        self._usePipeline(pipeline)
+        self._createCommandBuffer()
+        self.pipeline_compiler.mergeCaches()
+        logging.info('Swapped in the new graphics pipeline.')
+
+
+    def reloadChangedShaders(self):
+        '''Rebuild the pipelines whose shaders changed on disk, e.g. while
+           they are being edited. Returns the Future of the new graphics
+           pipeline, or None if it did not change.
+
+        Notes:
+        - Needs watch_shaders. Changed GLSL sources are compiled to SPIR-V
+          first if build_shaders.
+        - Only the pipeline variants that use a changed SPIR-V file are
+          discarded and compiled again, on a background thread. _drawFrame
+          swaps the new graphics pipeline in at a frame boundary; the
+          swapchain, render pass and all else are kept.'''
+        if not self.shader_watcher:
+            return None
+        changed = self.shader_watcher.changes()
+        if not changed:
+            return None
+        spirv = {p for p in changed if p.endswith('.spv')}
+        if self.build_shaders and len(spirv) < len(changed):
+            results = sb.buildShaders(self.shader_dir)
+            spirv.update(r['output'] for r in results
+                         if r['status'] == 'compiled')
+
+        modified = set()
+        for path in spirv:
+            if path not in self.shader_modules.paths:
+                continue # not used by any pipeline
+            try:
+                if self.shader_modules.refresh(path):
+                    modified.add(path)
+            except (OSError, ValueError) as e:
+                logging.error('Shader failed to reload: {}'.format(e))
+        # The replaced modules are retired once the compiles in flight, which
+        # may use them, are done.
+        self.shader_modules.releaseStale(self.pipeline_library.compiles())
+        if not modified:
+            return None
+        logging.info('Reloading shaders {}.'.format(
+            sorted(os.path.basename(p) for p in modified)))
+
+        def uses(key):
+            return any(path in modified for stage, path in key.shaders)
+        self.pipeline_library.discard(uses)
+        key = self.pending_pipeline[0] if self.pending_pipeline else \
+              self.pipeline_key
+        if not uses(key):
+            return None
+        future = self.pipeline_library.request(key)
+        self.pending_pipeline = (key, future)
+        return future
+
+
+    def _discardRenderPassPipelines(self):
+        '''Discard the pipelines of other render pass classes than the
+           current swapchain image format, before their render pass is
+           destroyed. Waits for those still being compiled against it.'''
+        self.pending_pipeline = None
+        render_pass_class = (self.swapchain_imageFormat,)
+        self.pipeline_library.discard(
+            lambda key: key.render_pass_class != render_pass_class, wait=True)
+
+
+    def _serviceResize(self):
+        '''Recreate the swapchain if the resize_controller says it is due.
+
+        Returns False if no frame can be drawn, i.e. the swapchain is out of
+        date and not yet recreated, or the window is minimized.'''
+        if self.resize_controller.due():
+            nw, nh = self.window.getWindowSize()
+            if nw.value == 0 or nh.value == 0:
+                # Minimized window: a swapchain cannot have a zero extent.
+                return False
+            t0 = time.perf_counter()
+            self._recreateSwapChain()
+            self.resize_controller.recreated(time.perf_counter() - t0)
+        return not self.swapchain_out_of_date
+
+
+    def _replaceImageAvailableSemaphore(self, frame):
+        '''Replace the image_available semaphore of a frame in flight with a
+           new one. The old one is destroyed after the swapchain is recreated.'''
+        self.retired_semaphores.append(self.semaphores_image_available[frame])
+        self.semaphores_image_available[frame] = vkCreateSemaphore(
+            self.logical_device, VkSemaphoreCreateInfo(), None)
+
+
+    def _frameCompleted(self, frame):
+        '''Record that the fence of a frame in flight has signaled, and destroy
+           the retired objects that are no longer used by any frame.
+
+        Notes:
+        - Every submit is numbered with frame_serial. Fences of one queue
+          signal in submission order, so once a frame's fence has signaled,
+          every frame submitted up to and including it has finished.'''
+        if self.frame_serials[frame] > self.completed_serial:
+            self.completed_serial = self.frame_serials[frame]
+        image_index = self.frame_images[frame]
+        if self.gpu_timer and image_index is not None and \
+           image_index < self.gpu_timer.slots:
+            self.gpu_timer.collect(image_index)
+        self.frame_images[frame] = None
+        self._releaseRetired()
+
+
+    def _retire(self, destroy_functions):
+        '''Destroy objects once the frames submitted so far have finished.
+
+        destroy_functions is a list of callables that each destroy one object.
+        They are called in order.'''
+        if destroy_functions:
+            self.retired_objects.append((self.frame_serial, destroy_functions))
+
+
+    def _releaseRetired(self):
+        '''Call the destroy functions of the retired objects whose frames have
+           all finished.'''
+        while self.retired_objects and \
+              self.retired_objects[0][0] <= self.completed_serial:
+            serial, destroy_functions = self.retired_objects.pop(0)
+            for destroy in destroy_functions:
+                destroy()
+            logging.info('Destroyed {0} objects retired after frame '
+                         '{1}.'.format(len(destroy_functions), serial))
 
 
     def cleanup1(self):
@@ -1455,22 +2607,93 @@ class Setup(object):
         
         print('========= Function _cleanup1() Activated ==============')
 
+        vkDeviceWaitIdle(self.logical_device)
+        self.completed_serial = self.frame_serial
+        self._releaseRetired()
+        self.pending_pipeline = None
+        if self.pipeline_compiler:
+            self.pipeline_compiler.shutdown()
+        if self.pipeline_library:
+            self.pipeline_library.destroy()
+            self.graphics_pipeline = None
+
         self._cleanSwapChain()
+        self._cleanRenderPass()
+
+        if self.pipeline_layouts:
+            for pipeline_layout, set_layouts in self.pipeline_layouts.values():
+                vkDestroyPipelineLayout( self.logical_device,
+                                         pipeline_layout, None )
+                for set_layout in set_layouts:
+                    vkDestroyDescriptorSetLayout( self.logical_device,
+                                                  set_layout, None )
+            self.pipeline_layouts = {}
+            logging.info('Destroyed Vulkan Pipeline Layouts.')
         
-        if self.semaphore_image_drawn:
-            vkDestroySemaphore( self.logical_device,
-                                self.semaphore_image_drawn, None )
-            logging.info('Destroyed Vulkan Semaphore for image_drawn.')
-
-        if self.semaphore_image_available:
-            vkDestroySemaphore( self.logical_device,
-                                self.semaphore_image_available, None )
-            logging.info('Destroyed Vulkan Semaphore for image_available.')
+        if self.fences_in_flight:
+            for f in self.fences_in_flight:
+                vkDestroyFence( self.logical_device, f, None )
+            self.fences_in_flight = []
+            logging.info('Destroyed Vulkan Fences for frames in flight.')
+
+        if self.semaphores_image_drawn:
+            for s in self.semaphores_image_drawn:
+                vkDestroySemaphore( self.logical_device, s, None )
+            self.semaphores_image_drawn = []
+            logging.info('Destroyed Vulkan Semaphores for image_drawn.')
+
+        if self.retired_semaphores:
+            for s in self.retired_semaphores:
+                vkDestroySemaphore( self.logical_device, s, None )
+            self.retired_semaphores = []
+
+        if self.semaphores_image_available:
+            for s in self.semaphores_image_available:
+                vkDestroySemaphore( self.logical_device, s, None )
+            self.semaphores_image_available = []
+            logging.info('Destroyed Vulkan Semaphores for image_available.')
 
         if self.command_pool:
             vkDestroyCommandPool( self.logical_device, self.command_pool, None )
             logging.info('Destroyed Vulkan Command Pool.')
 
+        if self.frame_pools:
+            for pool in self.frame_pools:
+                vkDestroyCommandPool( self.logical_device, pool, None )
+            self.frame_pools = []
+            self.frame_command_buffers = []
+            logging.info('Destroyed Vulkan transient Command Pools.')
+
+        if self.command_recorder:
+            logging.info('Command recorder: {}'.format(
+                self.command_recorder.stats()))
+            self.command_recorder.destroy()
+            self.command_recorder = None
+
+        if self.gpu_timer:
+            self.gpu_timer.destroy()
+            self.gpu_timer = None
+
+        if self.indirect_draws:
+            self.indirect_draws.destroy()
+            self.indirect_draws = None
+            logging.info('Destroyed indirect draw buffer.')
+
+        if self.instance_buffer:
+            self.instance_buffer.destroy()
+            self.instance_buffer = None
+            logging.info('Destroyed instance buffer.')
+
+        if self.shader_watcher:
+            self.shader_watcher.close()
+
+        if self.shader_modules:
+            self.shader_modules.destroy()
+
+        if self.pipeline_cache:
+            self.pipeline_cache.save()
+            self.pipeline_cache.destroy()
+            self.pipeline_cache = None
 
         vkDeviceWaitIdle(self.logical_device)
         logging.info('All outstanding queue operations for all queues in Logical'
@@ -1494,7 +2717,11 @@ class Setup(object):
 
     def _cleanSwapChain(self):
         '''Function to destroy the swapchain object and all objects that depend
-            on the swapchain or can affect window size.'''
+            on the swapchain or can affect window size.
+
+        Notes:
+        - The render pass, pipeline layout and graphics pipelines do not
+          depend on the window size; see _cleanRenderPass.'''
 
         print('========= Function _cleanSwapChain() Activated ==============')
 
@@ -1506,23 +2733,9 @@ class Setup(object):
 
         # Free existing command buffers
         if self.command_pool:
-            vkFreeCommandBuffers( self.logical_device, self.command_pool,
-                                  len(self.command_buffers), self.command_buffers )
+            for destroy in self._detachCommandBuffers():
+                destroy()
             #logging.info('Free existing Command Buffers.')
-            
-        if self.graphics_pipeline:
-            vkDestroyPipeline( self.logical_device,
-                               self.graphics_pipeline, None )
-            #logging.info('Destroyed Vulkan Graphics Pipeline.')
-
-        if self.pipeline_layout:
-            vkDestroyPipelineLayout( self.logical_device,
-                                     self.pipeline_layout, None )
-            #logging.info('Destroyed Vulkan Pipeline Layout.')
-
-        if self.render_pass:
-            vkDestroyRenderPass( self.logical_device, self.render_pass, None )
-            #logging.info('Destroyed Vulkan Render Pass.')
 
         if self.swapchain_imageViews:
             for i in self.swapchain_imageViews:
@@ -1533,22 +2746,128 @@ class Setup(object):
         if self.swapchain:
             self.fnp['vkDestroySwapchainKHR']( self.logical_device,
                                                self.swapchain, None )
+            self.swapchain = None
             #logging.info('Destroyed Vulkan Swapchain.')
 
 
+    def _cleanRenderPass(self):
+        '''Function to destroy the render pass. The graphics pipelines that
+            were created for it belong to the pipeline library.'''
+
+        if self.render_pass:
+            vkDestroyRenderPass( self.logical_device, self.render_pass, None )
+            self.render_pass = None
+            #logging.info('Destroyed Vulkan Render Pass.')
+
+
     def _recreateSwapChain(self):
         '''Function to recreate swapchain and all of the creation functions for
-           the objects that depend on the swapchain or the window size.'''
-        vkDeviceWaitIdle(self.logical_device)
-        logging.info('All outstanding queue operations for all queues in Logical')
+           the objects that depend on the swapchain or the window size.
 
-        self._cleanSwapChain()
+        Notes:
+        - Only the swapchain, its image views, the framebuffers and the
+          command buffers follow the new extent.
+        - The render pass is recreated only if the swapchain image format has
+          changed, e.g. after the window moved to another display. A render
+          pass with another attachment format is not compatible with the
+          graphics pipeline, so only then is the pipeline recreated too.'''
+        old_imageFormat = self.swapchain_imageFormat
+
+        if self.deferred_retirement:
+            # No device-wide idle: the old swapchain is passed as oldSwapchain
+            # and its objects are retired, i.e. destroyed once the frames
+            # that were submitted with them have finished.
+            retired = self._detachSwapChain()
+            self._createSwapChain()
+            self._retire(retired)
+        else:
+            vkDeviceWaitIdle(self.logical_device)
+            logging.info('All outstanding queue operations for all queues in Logical')
+            self.completed_serial = self.frame_serial
+            self._releaseRetired()
+            self._cleanSwapChain()
+            self._createSwapChain()
 
-        self._createSwapChain()
         self._createImageviews()
-        self._createRenderPass()
-        self._createGraphicsPipeline()
+        if self.swapchain_imageFormat != old_imageFormat:
+            logging.info('Swapchain image format changed: recreate render '
+                         'pass and graphics pipeline.')
+            self._discardRenderPassPipelines()
+            if self.deferred_retirement:
+                self._retire(self._detachRenderPass())
+            else:
+                self._cleanRenderPass()
+            self._createRenderPass()
+            self._createGraphicsPipeline()
+            if self.instance_buffer:
+                self._createInstancePipeline()
+                self._setInstanceItem(0)
         self._createFramebuffers()
         #self._createCommandPool()
         self._createCommandBuffer()
+        self.images_in_flight = [None] * len(self.swapchain_images)
+        self._prepareFrameInfos()
+        self.swapchain_out_of_date = False
+        self.acquire_tuner.reset()
+        self._checkImageCountChange()
+
+        # Semaphores of images that were acquired but never presented are
+        # released with the old swapchain.
+        self._retire([partial(vkDestroySemaphore, self.logical_device, s, None)
+                      for s in self.retired_semaphores])
+        self.retired_semaphores = []
+        if not self.deferred_retirement:
+            self._releaseRetired()
+
+
+    def _detachSwapChain(self):
+        '''Detach the objects that depend on the swapchain from Setup, except
+           the swapchain handle which is still needed as oldSwapchain.
+
+        Returns the functions to destroy the detached objects and the
+        swapchain, in the same order as _cleanSwapChain.'''
+        device = self.logical_device
+        destroy_functions = self._detachCommandBuffers()
+        destroy_functions.extend(
+            partial(vkDestroyFramebuffer, device, f, None)
+            for f in self.swapchain_framebuffers)
+        destroy_functions.extend(
+            partial(vkDestroyImageView, device, i, None)
+            for i in self.swapchain_imageViews)
+        if self.swapchain:
+            destroy_functions.append(partial(
+                self.fnp['vkDestroySwapchainKHR'], device, self.swapchain,
+                None))
+
+        self.swapchain_framebuffers = []
+        self.swapchain_imageViews = []
+        return destroy_functions
+
+
+    def _detachCommandBuffers(self):
+        '''Detach the primary command buffers, and the secondary command
+           buffers they execute, from Setup. Returns the functions to free
+           them.'''
+        destroy_functions = []
+        if self.command_buffers:
+            destroy_functions.append(partial(
+                vkFreeCommandBuffers, self.logical_device, self.command_pool,
+                len(self.command_buffers), self.command_buffers))
+        destroy_functions.extend(self.secondary_frees)
+        self.command_buffers = None
+        self.secondary_frees = []
+        return destroy_functions
+
+
+    def _detachRenderPass(self):
+        '''Detach the render pass from Setup.
+
+        Returns the functions to destroy it, as _cleanRenderPass does.'''
+        device = self.logical_device
+        destroy_functions = []
+        if self.render_pass:
+            destroy_functions.append(partial(
+                vkDestroyRenderPass, device, self.render_pass, None))
+        self.render_pass = None
+        return destroy_functions
 